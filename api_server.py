@@ -92,6 +92,12 @@ async def startup_event():
     except Exception as e:
         print(f"初始化分析协调器失败: {str(e)}")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """应用关闭时释放协调器资源（共享内存段等）"""
+    if coordinator is not None:
+        coordinator.close()
+
 @app.get("/")
 async def root():
     """根路径"""
@@ -172,6 +178,14 @@ async def get_results():
     
     return analysis_status["results"]
 
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """获取数据缓存统计信息"""
+    if coordinator is None:
+        raise HTTPException(status_code=503, detail="分析协调器未初始化")
+    
+    return coordinator.data_loader.cache_stats()
+
 @app.get("/api/industries")
 async def get_industries():
     """获取所有行业列表"""
@@ -10,6 +10,15 @@ from .base_agent import BaseAgent, SiliconFlowChat
 # 配置日志
 logger = logging.getLogger(__name__)
 
+# 对齐到季度的宏观序列：GDP为季度流量，CPI/PPI取月度同比的季度均值
+MACRO_SERIES = [
+    {"file": "macro_economic_data", "time_col": "季度", "value_col": "国内生产总值", "how": "sum"},
+    {"file": "cpi_data", "time_col": "统计期间", "value_col": "CPI当月同比", "how": "mean",
+     "filters": {"数据频率": "M"}},
+    {"file": "ppi_data", "time_col": "统计期间", "value_col": "PPI当月同比", "how": "mean",
+     "filters": {"数据频率": "M"}},
+]
+
 
 class MacroAgent(BaseAgent):
     """宏观经济分析智能体"""
@@ -44,6 +53,21 @@ class MacroAgent(BaseAgent):
                 "error": f"获取宏观经济数据失败: {str(e)}"
             }
             
+        # 将不同频率的宏观序列对齐到季度，便于比较和计算相关性
+        aligned_summary = ""
+        if hasattr(self.data_query, "align_series"):
+            try:
+                panel = self.data_query.align_series(MACRO_SERIES, target_freq="Q").dropna(how="all")
+                aligned_summary = f"""
+        季度对齐后的宏观指标:
+        {panel.tail(12).to_string()}
+        
+        对齐指标相关系数:
+        {panel.corr().round(3).to_string()}
+        """
+            except Exception as e:
+                logger.warning(f"宏观序列频率对齐失败: {str(e)}")
+        
         # 构建提示词
         user_prompt = f"""
         作为宏观经济分析专家，请分析以下GDP、CPI和PPI数据与新能源汽车行业的关系。
@@ -56,7 +80,7 @@ class MacroAgent(BaseAgent):
         
         PPI数据概览:
         {ppi_data.get('summary', '')}
-        
+        {aligned_summary}
         请关注：
         1. GDP增长与新能源汽车行业发展的相关性
         2. CPI变化对消费者购买新能源汽车意愿的影响
@@ -5,7 +5,8 @@ from datetime import datetime
 from pathlib import Path
 
 from src.agents import MacroAgent, FinanceAgent, MarketAgent, ForecastAgent, ReportAgent, PolicyNewsAgent
-from src.tools import MappedDataLoader, DataQuery, DataAnalyzer, ChartGenerator
+from src.tools import MappedDataLoader, SharedDatasetStore, DataQuery, DataAnalyzer, ChartGenerator
+from src.tools.mapped_data_loader import DEFAULT_CACHE_DIR
 from src.utils import (
     load_config, 
     load_env_variables, 
@@ -44,13 +45,31 @@ class AnalysisCoordinator:
         self.env_vars = load_env_variables(str(env_file))
         
         # 初始化数据工具
+        # 相对路径的缓存目录按项目根目录解析，不随启动时的工作目录变化
+        cache_dir = self.env_vars.get("DATA_CACHE_DIR", DEFAULT_CACHE_DIR)
+        if cache_dir and not os.path.isabs(cache_dir):
+            cache_dir = str(project_root / cache_dir)
+        shared_store = None
+        if self.env_vars.get("DATA_SHARED_MEMORY", "false").lower() == "true":
+            # 多个API worker通过共享内存共用一份已加载的数据
+            shared_store = SharedDatasetStore(registry_dir=os.path.join(cache_dir, "shared"))
+            # 首个启动的worker负责在退出时删除共享内存段
+            shared_store.claim_ownership()
+        self.shared_store = shared_store
         self.data_loader = MappedDataLoader(
             data_root_path=self.env_vars.get("DATA_ROOT_PATH", "../数据"),
-            mapping_config_path=self.env_vars.get("DATA_MAPPING_CONFIG", "config/data_mapping.yaml")
+            mapping_config_path=self.env_vars.get("DATA_MAPPING_CONFIG", "config/data_mapping.yaml"),
+            cache_dir=cache_dir,
+            cache_max_bytes=self._parse_cache_budget(self.env_vars.get("DATA_CACHE_MAX_MB")),
+            cache_policy=self.env_vars.get("DATA_CACHE_POLICY", "lru").lower(),
+            pinned_files=[f.strip() for f in self.env_vars.get("DATA_CACHE_PINNED", "").split(",") if f.strip()],
+            compact=self.env_vars.get("DATA_COMPACT_DTYPES", "false").lower() == "true",
+            float32=self.env_vars.get("DATA_FLOAT32", "false").lower() == "true",
+            shared_store=shared_store
         )
         self.data_query = DataQuery(self.data_loader)
         self.data_analyzer = DataAnalyzer(self.data_loader)
-        self.chart_generator = ChartGenerator(output_dir="output")
+        self.chart_generator = ChartGenerator(output_dir="output", correlation_service=self.data_loader.correlations)
         
         # 初始化智能体
         model_name = self.config["project"]["llm_models"]["main_llm"]["model_name"]
@@ -101,15 +120,34 @@ class AnalysisCoordinator:
         
         logger.info("分析协调器初始化完成")
     
-    def load_data(self, data_files: Optional[List[str]] = None) -> Dict[str, Any]:
+    def close(self):
+        """释放协调器持有的资源，本进程为共享数据所有者时删除共享内存段"""
+        if self.shared_store is not None:
+            self.shared_store.release()
+    
+    @staticmethod
+    def _parse_cache_budget(value: Optional[str]) -> Optional[int]:
+        """将以MB为单位的缓存预算配置转换为字节数"""
+        if not value:
+            return None
+        try:
+            return int(float(value) * 1024 * 1024)
+        except ValueError:
+            logger.warning(f"无效的缓存预算配置: {value}，不限制缓存大小")
+            return None
+    
+    def load_data(self, data_files: Optional[List[str]] = None, max_workers: Optional[int] = None,
+                  mode: Optional[str] = None) -> Dict[str, Any]:
         """
         加载数据
         
         Args:
             data_files: 要加载的数据文件列表，如果为None则加载所有数据
+            max_workers: 并行加载的工作数，为None时读取DATA_PRELOAD_WORKERS配置
+            mode: 预加载模式（thread/process/sequential），为None时读取DATA_PRELOAD_MODE配置
             
         Returns:
-            数据加载结果
+            数据加载结果，每个文件包含load_time加载耗时（秒）
         """
         logger.info("开始加载数据...")
         
@@ -124,23 +162,22 @@ class AnalysisCoordinator:
                 "政策法规数据.csv"
             ]
         
-        load_results = {}
-        
-        for file_name in data_files:
+        if max_workers is None and self.env_vars.get("DATA_PRELOAD_WORKERS"):
             try:
-                data = self.data_loader.load_data(file_name)
-                load_results[file_name] = {
-                    "status": "success",
-                    "shape": data.shape,
-                    "columns": data.columns.tolist()
-                }
-                logger.info(f"成功加载数据: {file_name} -> {self.data_loader._resolve_file_name(file_name)}, 形状: {data.shape}")
-            except Exception as e:
-                load_results[file_name] = {
-                    "status": "error",
-                    "error": str(e)
-                }
-                logger.error(f"加载数据失败: {file_name}, 错误: {str(e)}")
+                max_workers = int(self.env_vars["DATA_PRELOAD_WORKERS"])
+            except ValueError:
+                logger.warning(f"无效的预加载工作数配置: {self.env_vars['DATA_PRELOAD_WORKERS']}，使用默认值")
+        if mode is None:
+            mode = self.env_vars.get("DATA_PRELOAD_MODE", "thread").lower()
+        
+        load_results = self.data_loader.preload(data_files, max_workers=max_workers, mode=mode)
+        
+        for file_name, result in load_results.items():
+            if result["status"] == "success":
+                logger.info(f"成功加载数据: {file_name} -> {self.data_loader._resolve_file_name(file_name)}, "
+                            f"形状: {result['shape']}, 耗时: {result['load_time']:.2f}秒")
+            else:
+                logger.error(f"加载数据失败: {file_name}, 错误: {result['error']}")
         
         return load_results
     
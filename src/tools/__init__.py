@@ -1,7 +1,10 @@
 from .data_loader import DataLoader
 from .mapped_data_loader import MappedDataLoader
+from .ingest_cache import IngestCache
+from .data_cache import DataCache
+from .shared_store import SharedDatasetStore
 from .data_query import DataQuery
 from .data_analyzer import DataAnalyzer, ChartGenerator
 from .web_search import WebSearchTool
 
-__all__ = ['DataLoader', 'MappedDataLoader', 'DataQuery', 'DataAnalyzer', 'ChartGenerator', 'WebSearchTool']
\ No newline at end of file
+__all__ = ['DataLoader', 'MappedDataLoader', 'IngestCache', 'DataCache', 'SharedDatasetStore', 'DataQuery', 'DataAnalyzer', 'ChartGenerator', 'WebSearchTool']
\ No newline at end of file
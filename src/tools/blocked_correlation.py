@@ -0,0 +1,143 @@
+"""
+分块相关性计算模块，将列集合切分为若干块，在线程池中并行计算各块之间成对完整样本的
+Pearson/Spearman相关系数，结果以float32组装；也可只保留每列相关性最强的k个变量，
+不生成完整的稠密矩阵
+"""
+
+import os
+import logging
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .streaming_aggregates import pairwise_moments, correlation_from_moments
+
+logger = logging.getLogger(__name__)
+
+# 支持分块计算的相关系数方法
+BLOCKED_METHODS = ("pearson", "spearman")
+
+# 每块的默认列数
+DEFAULT_TILE_SIZE = 128
+
+
+def prepare_values(df: pd.DataFrame, method: str = "pearson") -> np.ndarray:
+    """
+    将数值列转换为参与计算的浮点数组
+
+    Spearman先将各列在自身的非空值中排名（并列取平均名次），再按Pearson计算；
+    各列减去均值，减小平方和累加时的数值误差。
+
+    Args:
+        df: 数值列数据
+        method: 相关系数方法
+
+    Returns:
+        形状为 (n, p) 的浮点数组，缺失值为NaN
+    """
+    if method not in BLOCKED_METHODS:
+        raise ValueError(f"分块计算不支持的相关系数方法 {method}，仅支持: {list(BLOCKED_METHODS)}")
+    frame = df.rank(method="average") if method == "spearman" else df
+    values = frame.to_numpy(dtype=np.float64, na_value=np.nan)
+    with warnings.catch_warnings():
+        # 全为缺失值的列会触发 "Mean of empty slice" 警告，平移量取0即可
+        warnings.simplefilter("ignore", RuntimeWarning)
+        shift = np.nan_to_num(np.nanmean(values, axis=0)) if len(values) else 0.0
+    return values - shift
+
+
+def _tiles(size: int, tile_size: int) -> List[Tuple[int, int]]:
+    """列区间 [start, stop) 列表"""
+    return [(start, min(start + tile_size, size)) for start in range(0, size, max(1, tile_size))]
+
+
+def _workers(workers: Optional[int]) -> int:
+    return workers or os.cpu_count() or 1
+
+
+def blocked_correlation(values: np.ndarray, tile_size: int = DEFAULT_TILE_SIZE,
+                        workers: Optional[int] = None) -> np.ndarray:
+    """
+    分块计算相关性矩阵
+
+    只计算上三角的块，每块写入结果及其转置位置；矩阵乘法释放GIL，各块在线程池中并行。
+
+    Args:
+        values: prepare_values 的结果
+        tile_size: 每块的列数
+        workers: 线程数，为None时使用CPU核数
+
+    Returns:
+        形状为 (p, p) 的float32相关性矩阵，样本不足或方差为零时为NaN
+    """
+    size = values.shape[1]
+    result = np.empty((size, size), dtype=np.float32)
+    tiles = _tiles(size, tile_size)
+    pairs = [(rows, cols) for i, rows in enumerate(tiles) for cols in tiles[i:]]
+
+    def compute(pair: Tuple[Tuple[int, int], Tuple[int, int]]) -> None:
+        (r0, r1), (c0, c1) = pair
+        block = correlation_from_moments(pairwise_moments(values[:, r0:r1], values[:, c0:c1]))
+        result[r0:r1, c0:c1] = block
+        result[c0:c1, r0:r1] = block.T
+
+    with ThreadPoolExecutor(max_workers=_workers(workers)) as pool:
+        list(pool.map(compute, pairs))
+
+    diagonal = np.arange(size)
+    result[diagonal, diagonal] = np.where(np.isnan(result[diagonal, diagonal]), np.nan, 1.0)
+    logger.info(f"已分块计算 {size} 列的相关性矩阵，共 {len(pairs)} 块")
+    return result
+
+
+def top_correlations(values: np.ndarray, columns: List[str], k: int, tile_size: int = DEFAULT_TILE_SIZE,
+                     workers: Optional[int] = None) -> pd.DataFrame:
+    """
+    计算每列相关系数绝对值最大的k个其他列
+
+    按行块计算该块与全部列的相关系数，立即只保留每行的前k个，
+    同时存在的中间结果只有线程数个 (块列数, p) 的数组。
+
+    Args:
+        values: prepare_values 的结果
+        columns: 与 values 各列对应的列名
+        k: 每列保留的变量数
+        tile_size: 每块的列数
+        workers: 线程数，为None时使用CPU核数
+
+    Returns:
+        包含 var1、var2、correlation（float32）的数据，按 var1 的列顺序、
+        同一 var1 内按相关系数绝对值从大到小排列；相关系数为NaN的变量不保留
+    """
+    size = values.shape[1]
+    keep = min(k, size - 1)
+    if keep <= 0:
+        return pd.DataFrame({"var1": pd.Series([], dtype=object), "var2": pd.Series([], dtype=object),
+                             "correlation": pd.Series([], dtype=np.float32)})
+
+    def compute(tile: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray]:
+        r0, r1 = tile
+        strip = correlation_from_moments(pairwise_moments(values[:, r0:r1], values)).astype(np.float32)
+        # 不与自身比较
+        strip[np.arange(r1 - r0), np.arange(r0, r1)] = np.nan
+        score = np.nan_to_num(np.abs(strip), nan=-1.0)
+        picked = np.argpartition(-score, keep - 1, axis=1)[:, :keep]
+        order = np.argsort(-np.take_along_axis(score, picked, axis=1), axis=1, kind="stable")
+        picked = np.take_along_axis(picked, order, axis=1)
+        return picked, np.take_along_axis(strip, picked, axis=1)
+
+    with ThreadPoolExecutor(max_workers=_workers(workers)) as pool:
+        strips = list(pool.map(compute, _tiles(size, tile_size)))
+
+    partners = np.concatenate([picked for picked, _ in strips])
+    correlations = np.concatenate([corr for _, corr in strips])
+    names = np.asarray(columns, dtype=object)
+    valid = ~np.isnan(correlations)
+    return pd.DataFrame({
+        "var1": np.repeat(names, keep).reshape(size, keep)[valid],
+        "var2": names[partners][valid],
+        "correlation": correlations[valid],
+    })
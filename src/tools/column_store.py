@@ -0,0 +1,160 @@
+"""
+内存映射列存储模块，将宽表的每一列保存为独立的定长数组文件，按需映射读取所需的列和行
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import logging
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from .shared_store import encode_column, decode_column
+
+logger = logging.getLogger(__name__)
+
+# 列存储格式版本，结构变化时递增以使旧存储失效
+STORE_VERSION = 2
+
+RowSelector = Union[Sequence[int], np.ndarray, pd.Series]
+
+
+class ColumnStore:
+    """
+    内存映射列存储
+
+    每个源文件对应一个目录，其中每列保存为一个或多个 .npy 文件（字符串列为字典编码），
+    读取时以 mmap_mode='r' 打开，只有实际访问的列和行所在的页会被读入内存。
+    """
+
+    def __init__(self, store_dir: str = ".cache/data/columns"):
+        """
+        初始化列存储
+
+        Args:
+            store_dir: 列存储根目录
+        """
+        self.store_dir = Path(store_dir)
+        self._meta_cache: Dict[str, Dict[str, Any]] = {}
+
+    def _entry_dir(self, source_path: Path) -> Path:
+        """根据源文件的规范路径确定存储目录"""
+        canonical = str(Path(source_path).resolve())
+        return self.store_dir / hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:20]
+
+    def load_meta(self, source_path: Path, signature: Dict[str, int]) -> Optional[Dict[str, Any]]:
+        """
+        读取列存储的描述信息
+
+        Returns:
+            描述信息；不存在、格式过期或与源文件签名不一致时返回None
+        """
+        entry_dir = self._entry_dir(source_path)
+        meta = self._meta_cache.get(str(entry_dir))
+        if meta is None:
+            meta_file = entry_dir / "meta.json"
+            if not meta_file.exists():
+                return None
+            try:
+                with open(meta_file, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"读取列存储描述失败: {meta_file}, 错误: {str(e)}")
+                return None
+        if meta.get("store_version") != STORE_VERSION or meta.get("signature") != signature:
+            self._meta_cache.pop(str(entry_dir), None)
+            return None
+        self._meta_cache[str(entry_dir)] = meta
+        return meta
+
+    def build(self, source_path: Path, df: pd.DataFrame, signature: Dict[str, int]) -> Dict[str, Any]:
+        """
+        将数据写入列存储
+
+        先写入临时目录，完成后整体替换，读取方不会看到写了一半的存储。
+
+        Args:
+            source_path: 源文件路径
+            df: 源文件的全部数据
+            signature: 解析前获取的源文件签名
+
+        Returns:
+            描述信息
+        """
+        entry_dir = self._entry_dir(source_path)
+        tmp_dir = entry_dir.with_name(f"{entry_dir.name}.{os.getpid()}.tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir(parents=True)
+
+        columns = []
+        for index, col in enumerate(df.columns):
+            spec, arrays = encode_column(df[col])
+            spec["name"] = str(col)
+            spec["files"] = []
+            for part, array in enumerate(arrays):
+                file_name = f"c{index}_{part}.npy"
+                np.save(tmp_dir / file_name, array, allow_pickle=False)
+                spec["files"].append(file_name)
+            columns.append(spec)
+
+        meta = {
+            "store_version": STORE_VERSION,
+            "source_path": str(Path(source_path).resolve()),
+            "signature": signature,
+            "rows": int(len(df)),
+            "columns": columns
+        }
+        with open(tmp_dir / "meta.json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.replace(tmp_dir, entry_dir)
+        self._meta_cache[str(entry_dir)] = meta
+        logger.info(f"已写入列存储: {source_path} -> {entry_dir.name}, {len(columns)} 列, {len(df)} 行")
+        return meta
+
+    def read(self, source_path: Path, meta: Dict[str, Any], columns: Optional[List[str]] = None,
+             rows: Optional[RowSelector] = None) -> pd.DataFrame:
+        """
+        从列存储读取指定的列和行
+
+        Args:
+            source_path: 源文件路径
+            meta: load_meta 返回的描述信息
+            columns: 需要的列，为None时读取全部列
+            rows: 行位置数组或布尔掩码，为None时读取全部行
+
+        Returns:
+            数据，只包含所需的列和行
+        """
+        entry_dir = self._entry_dir(source_path)
+        specs = meta["columns"]
+        if columns is not None:
+            wanted = set(columns)
+            specs = [spec for spec in specs if spec["name"] in wanted]
+
+        positions = None
+        if rows is not None:
+            positions = np.asarray(rows)
+            if positions.dtype == bool:
+                positions = np.flatnonzero(positions)
+
+        index = pd.RangeIndex(meta["rows"]) if positions is None else pd.Index(positions)
+        data = {}
+        for spec in specs:
+            buffers = [np.load(entry_dir / file_name, mmap_mode="r", allow_pickle=False)
+                       for file_name in spec["files"]]
+            if positions is not None:
+                # 只读取所需行所在的页；字典本身不按行选取
+                buffers[0] = buffers[0][positions]
+            data[spec["name"]] = decode_column(spec, buffers, index)
+
+        return pd.DataFrame(data, index=index)
+
+    def column_names(self, meta: Dict[str, Any]) -> List[str]:
+        """列存储中的全部列名"""
+        return [spec["name"] for spec in meta["columns"]]
@@ -0,0 +1,220 @@
+"""
+相关性服务模块，数据查询、数据分析和图表生成共用同一份相关性矩阵缓存，
+缓存键为数据集的规范缓存键、列组合和相关系数方法，数据集版本号变化后重新计算，缓存总量受内存预算限制；
+强相关变量对由上三角掩码一次筛出，列数较多时分块并行计算
+"""
+
+import json
+import logging
+import threading
+from typing import Callable, Dict, List, Any, Optional
+
+import numpy as np
+import pandas as pd
+
+from .data_cache import DataCache
+from .streaming_aggregates import CorrelationAccumulator
+from .blocked_correlation import (
+    BLOCKED_METHODS, DEFAULT_TILE_SIZE, blocked_correlation, prepare_values, top_correlations
+)
+
+logger = logging.getLogger(__name__)
+
+# 支持的相关系数方法
+CORRELATION_METHODS = ("pearson", "spearman", "kendall")
+
+# 数值列数达到该值时改用分块并行计算
+BLOCKED_MIN_COLUMNS = 64
+
+# 相关性矩阵缓存的默认内存预算（字节）
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+
+
+def numeric_frame(df: pd.DataFrame, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    选取参与相关性计算的数值列
+
+    Args:
+        df: 数据
+        columns: 指定的列，为None时使用全部数值列
+
+    Returns:
+        数值列数据，指定列时按指定的顺序
+    """
+    numeric_df = df.select_dtypes(include=[np.number])
+    if columns:
+        numeric_cols = [col for col in columns if col in numeric_df.columns]
+        if not numeric_cols:
+            raise ValueError("指定的列中没有数值型列")
+        numeric_df = numeric_df[numeric_cols]
+    return numeric_df
+
+
+def find_high_correlations(corr_matrix: pd.DataFrame, threshold: float = 0.7,
+                           strict: bool = False) -> List[Dict[str, Any]]:
+    """
+    找出相关系数绝对值达到阈值的变量对
+
+    Args:
+        corr_matrix: 相关性矩阵
+        threshold: 阈值
+        strict: 为True时要求绝对值大于阈值，否则大于等于阈值
+
+    Returns:
+        变量对列表，按矩阵上三角的行优先顺序排列
+    """
+    values = corr_matrix.to_numpy(dtype=np.float64)
+    rows, cols = np.triu_indices(len(corr_matrix.columns), k=1)
+    upper = values[rows, cols]
+    with np.errstate(invalid="ignore"):
+        matched = np.abs(upper) > threshold if strict else np.abs(upper) >= threshold
+    names = corr_matrix.columns
+    return [{"var1": names[i], "var2": names[j], "correlation": float(value)}
+            for i, j, value in zip(rows[matched], cols[matched], upper[matched])]
+
+
+class CorrelationService:
+    """
+    相关性矩阵服务
+
+    同一数据集、列组合和方法的矩阵只计算一次，逻辑名与实际文件名指向同一文件时共用缓存条目，
+    数据集追加新行或源文件变化后重新计算；缓存超出内存预算时按LRU淘汰；
+    流式计算与一次性计算的结果一致，共用同一缓存条目。数值列数达到 blocked_min_columns 的
+    pearson/spearman矩阵分块并行计算，结果为float32；分块计算的spearman在各列自身的非空值中排名，
+    缺失值位置不同的列对与 DataFrame.corr 按每对完整样本重新排名的结果略有差异。
+    """
+
+    def __init__(self, data_loader: Any, tile_size: int = DEFAULT_TILE_SIZE, workers: Optional[int] = None,
+                 blocked_min_columns: int = BLOCKED_MIN_COLUMNS, max_bytes: Optional[int] = DEFAULT_CACHE_BYTES):
+        """
+        初始化相关性服务
+
+        Args:
+            data_loader: MappedDataLoader 实例
+            tile_size: 分块计算时每块的列数
+            workers: 分块计算的线程数，为None时使用CPU核数
+            blocked_min_columns: 改用分块计算的最少数值列数
+            max_bytes: 缓存的内存预算（字节），为None时不限制
+        """
+        self.data_loader = data_loader
+        self.tile_size = tile_size
+        self.workers = workers
+        self.blocked_min_columns = blocked_min_columns
+        # 缓存的矩阵及其对应的数据集版本号
+        self._cache = DataCache(max_bytes=max_bytes, on_evict=self._on_evict)
+        self._versions: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _on_evict(self, key: str) -> None:
+        self._versions.pop(key, None)
+
+    def _dataset_key(self, file_name: str, columns: Optional[List[str]]) -> List[Any]:
+        """
+        数据集部分的缓存键
+
+        使用加载器的规范缓存键（由实际文件路径确定）和实际加载的列，
+        逻辑名与实际文件名指向同一文件且列相同时得到相同的键。
+        """
+        cache_key = getattr(self.data_loader, "_cache_key", None)
+        if cache_key is None:
+            return [file_name, list(columns) if columns else None]
+        resolved, _ = cache_key(file_name, self.data_loader._resolve_file_name(file_name), {})
+        return [resolved, self.data_loader._requested_columns(file_name, list(columns) if columns else None)]
+
+    def _version(self, file_name: str) -> Any:
+        get_version = getattr(self.data_loader, "get_dataset_version", None)
+        return get_version(file_name) if get_version is not None else None
+
+    def matrix(self, file_name: str, columns: Optional[List[str]] = None, method: str = "pearson",
+               streaming: bool = False, chunksize: int = 100_000) -> pd.DataFrame:
+        """
+        获取相关性矩阵
+
+        Args:
+            file_name: 数据文件名
+            columns: 参与计算的列，为None时使用全部数值列
+            method: 相关系数方法，pearson/spearman/kendall
+            streaming: 是否按数据块流式累计（仅支持pearson）
+            chunksize: 流式模式下每个数据块的行数
+
+        Returns:
+            相关性矩阵
+        """
+        if method not in CORRELATION_METHODS:
+            raise ValueError(f"不支持的相关系数方法 {method}，仅支持: {list(CORRELATION_METHODS)}")
+        if streaming and method != "pearson":
+            raise ValueError("流式计算仅支持pearson相关系数")
+        key = json.dumps(self._dataset_key(file_name, columns) + [method], ensure_ascii=False)
+
+        def compute() -> pd.DataFrame:
+            if streaming:
+                return self._streaming_matrix(file_name, columns, chunksize)
+            numeric_df = numeric_frame(self.data_loader.load_data(file_name, columns=columns), columns)
+            if method in BLOCKED_METHODS and numeric_df.shape[1] >= self.blocked_min_columns:
+                corr = blocked_correlation(prepare_values(numeric_df, method), self.tile_size, self.workers)
+                return pd.DataFrame(corr, index=numeric_df.columns, columns=numeric_df.columns)
+            return numeric_df.corr(method=method)
+
+        return self._cached(key, file_name, compute, "相关性矩阵")
+
+    def top_correlations(self, file_name: str, columns: Optional[List[str]] = None, method: str = "pearson",
+                         k: int = 10) -> pd.DataFrame:
+        """
+        获取每列相关系数绝对值最大的k个其他列，分块计算，不生成完整的相关性矩阵
+
+        Args:
+            file_name: 数据文件名
+            columns: 参与计算的列，为None时使用全部数值列
+            method: 相关系数方法，pearson/spearman
+            k: 每列保留的变量数
+
+        Returns:
+            包含 var1、var2、correlation 的数据，格式见 blocked_correlation.top_correlations
+        """
+        if method not in BLOCKED_METHODS:
+            raise ValueError(f"top_k 模式不支持的相关系数方法 {method}，仅支持: {list(BLOCKED_METHODS)}")
+        if k < 1:
+            raise ValueError("top_k 需要大于0")
+        key = json.dumps(self._dataset_key(file_name, columns) + [method, "top", k], ensure_ascii=False)
+
+        def compute() -> pd.DataFrame:
+            numeric_df = numeric_frame(self.data_loader.load_data(file_name, columns=columns), columns)
+            return top_correlations(prepare_values(numeric_df, method), numeric_df.columns.tolist(), k,
+                                    self.tile_size, self.workers)
+
+        return self._cached(key, file_name, compute, "相关变量排名")
+
+    def _cached(self, key: str, file_name: str, compute: Callable[[], pd.DataFrame],
+                description: str) -> pd.DataFrame:
+        """按数据集版本号校验的缓存"""
+        version = self._version(file_name)
+        with self._lock:
+            cached = self._cache.get(key)
+            cached_version = self._versions.get(key)
+        if cached is not None and version is not None and cached_version == version:
+            logger.info(f"从缓存中获取{description}: {file_name}")
+            return cached.copy()
+
+        result = compute()
+
+        # 首次计算时数据集才完成摄取，按计算后的版本号缓存；计算期间版本变化时不缓存
+        loaded_version = self._version(file_name)
+        if loaded_version is not None and version in (None, loaded_version):
+            with self._lock:
+                if self._cache.put(key, result):
+                    self._versions[key] = loaded_version
+        return result.copy()
+
+    def _streaming_matrix(self, file_name: str, columns: Optional[List[str]],
+                          chunksize: int) -> pd.DataFrame:
+        """逐块累计成对矩计算相关性矩阵"""
+        accumulator = None
+        for chunk in self.data_loader.load_data_iter(file_name, chunksize=chunksize, columns=columns):
+            if accumulator is None:
+                # 以首个数据块的类型确定数值列
+                accumulator = CorrelationAccumulator(numeric_frame(chunk, columns).columns.tolist())
+            accumulator.update(chunk)
+
+        if accumulator is None:
+            return pd.DataFrame()
+        return accumulator.result()
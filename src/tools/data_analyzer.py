@@ -11,6 +11,10 @@ import logging
 from pathlib import Path
 import json
 
+from .streaming_aggregates import SummaryAccumulator
+from .time_columns import infer_datetime_format, parse_datetime
+from .correlation_service import numeric_frame, find_high_correlations
+
 # 配置日志
 logger = logging.getLogger(__name__)
 
@@ -18,12 +22,36 @@ logger = logging.getLogger(__name__)
 plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei']
 plt.rcParams['axes.unicode_minus'] = False
 
+def _parse_time_column(df: pd.DataFrame, time_col: str) -> pd.Series:
+    """推断格式后一次性解析时间列"""
+    fmt = infer_datetime_format(df[time_col])
+    if fmt is None:
+        raise ValueError(f"无法解析日期列 {time_col} 的格式")
+    return parse_datetime(df[time_col], fmt)
+
+
 class DataAnalyzer:
     """数据分析工具，提供各种数据分析功能"""
     
     def __init__(self, data_query):
         self.data_query = data_query
     
+    def _with_datetime(self, file_name: str, df: pd.DataFrame, time_col: str) -> pd.DataFrame:
+        """
+        返回时间列为datetime类型的数据，不修改缓存中的原始数据
+        
+        优先复用数据加载器中已解析的时间列，加载器不支持时才在本地解析。
+        """
+        if pd.api.types.is_datetime64_any_dtype(df[time_col]):
+            return df
+        loader = getattr(self.data_query, "data_loader", self.data_query)
+        parsed = None
+        if hasattr(loader, "get_datetime_column"):
+            parsed = loader.get_datetime_column(file_name, time_col)
+        if parsed is None:
+            parsed = _parse_time_column(df, time_col)
+        return df.assign(**{time_col: parsed})
+    
     def analyze_trend(self, file_name: str, time_col: str, value_cols: List[str], 
                     method: str = 'linear') -> Dict[str, Any]:
         """分析数据趋势"""
@@ -35,18 +63,7 @@ class DataAnalyzer:
         df = data_result["data"]
         
         # 确保时间列是datetime类型
-        if not pd.api.types.is_datetime64_any_dtype(df[time_col]):
-            # 尝试多种日期格式
-            try:
-                df[time_col] = pd.to_datetime(df[time_col], format='%Y/%m/%d')
-            except:
-                try:
-                    df[time_col] = pd.to_datetime(df[time_col], format='%Y-%m-%d')
-                except:
-                    try:
-                        df[time_col] = pd.to_datetime(df[time_col], format='ISO8601')
-                    except:
-                        df[time_col] = pd.to_datetime(df[time_col], format='mixed')
+        df = self._with_datetime(file_name, df, time_col)
         
         # 按时间排序
         df = df.sort_values(time_col)
@@ -119,19 +136,7 @@ class DataAnalyzer:
         df = data_result["data"]
         
         # 确保时间列是datetime类型
-        if not pd.api.types.is_datetime64_any_dtype(df[time_col]):
-            try:
-                # 尝试多种日期格式
-                df[time_col] = pd.to_datetime(df[time_col], format='%Y/%m/%d')
-            except:
-                try:
-                    df[time_col] = pd.to_datetime(df[time_col], format='%Y-%m-%d')
-                except:
-                    try:
-                        df[time_col] = pd.to_datetime(df[time_col])
-                    except Exception as e:
-                        logger.error(f"无法解析日期格式: {e}")
-                        raise ValueError(f"无法解析日期列 {time_col} 的格式")
+        df = self._with_datetime(file_name, df, time_col)
         
         # 提取时间特征
         if period == 'year':
@@ -168,8 +173,7 @@ class DataAnalyzer:
         df = data_result["data"]
         
         # 确保时间列是datetime类型
-        if not pd.api.types.is_datetime64_any_dtype(df[time_col]):
-            df[time_col] = pd.to_datetime(df[time_col])
+        df = self._with_datetime(file_name, df, time_col)
         
         # 提取两个时期的数据
         start1, end1 = period1
@@ -276,6 +280,7 @@ class DataAnalyzer:
             return {"error": data_result["error"]}
         
         df = data_result["data"]
+        requested_columns = columns
         
         # 如果没有指定列，使用所有数值列
         if columns is None:
@@ -286,21 +291,19 @@ class DataAnalyzer:
         if missing_cols:
             return {"error": f"列不存在: {missing_cols}"}
         
-        # 计算相关性矩阵
-        corr_matrix = df[columns].corr()
+        # 计算相关性矩阵，加载器提供相关性服务时与数据查询、图表生成共用缓存
+        loader = getattr(self.data_query, "data_loader", self.data_query)
+        service = getattr(loader, "correlations", None)
+        if service is not None:
+            corr_matrix = service.matrix(file_name, requested_columns)
+        else:
+            corr_matrix = numeric_frame(df, columns).corr()
         
         # 找出强相关关系（|r| > 0.7）
-        strong_correlations = []
-        for i in range(len(corr_matrix.columns)):
-            for j in range(i+1, len(corr_matrix.columns)):
-                corr_val = corr_matrix.iloc[i, j]
-                if abs(corr_val) > 0.7:
-                    strong_correlations.append({
-                        "var1": corr_matrix.columns[i],
-                        "var2": corr_matrix.columns[j],
-                        "correlation": corr_val,
-                        "strength": "强正相关" if corr_val > 0.7 else "强负相关"
-                    })
+        strong_correlations = [
+            dict(pair, strength="强正相关" if pair["correlation"] > 0.7 else "强负相关")
+            for pair in find_high_correlations(corr_matrix, 0.7, strict=True)
+        ]
         
         return {
             "correlation_matrix": corr_matrix.to_dict(),
@@ -357,8 +360,19 @@ class DataAnalyzer:
         else:
             return {"error": f"不支持的异常值检测方法: {method}"}
     
-    def generate_summary_report(self, file_name: str) -> Dict[str, Any]:
-        """生成数据摘要报告"""
+    def generate_summary_report(self, file_name: str, streaming: bool = False,
+                                chunksize: int = 100_000) -> Dict[str, Any]:
+        """
+        生成数据摘要报告
+        
+        Args:
+            file_name: 数据文件名
+            streaming: 是否按数据块流式统计，数值列统计不含分位数
+            chunksize: 流式模式下每个数据块的行数
+        """
+        if streaming:
+            return self._streaming_summary_report(file_name, chunksize)
+        
         data_result = self.data_query.get_data_summary(file_name)
         
         if data_result["status"] == "error":
@@ -384,7 +398,7 @@ class DataAnalyzer:
         numeric_stats = df[numeric_cols].describe().to_dict() if numeric_cols else {}
         
         # 分类列统计
-        categorical_cols = df.select_dtypes(include=['object', 'category']).columns.tolist()
+        categorical_cols = df.select_dtypes(include=['object', 'string', 'category']).columns.tolist()
         categorical_stats = {}
         for col in categorical_cols:
             value_counts = df[col].value_counts().head(10).to_dict()
@@ -400,14 +414,54 @@ class DataAnalyzer:
             "numeric_stats": numeric_stats,
             "categorical_stats": categorical_stats
         }
+    
+    def _streaming_summary_report(self, file_name: str, chunksize: int) -> Dict[str, Any]:
+        """逐块累计统计量生成数据摘要报告"""
+        data_loader = getattr(self.data_query, "data_loader", self.data_query)
+        if not hasattr(data_loader, "load_data_iter"):
+            return {"error": "当前数据加载器不支持流式加载"}
+        
+        accumulator = SummaryAccumulator()
+        try:
+            for chunk in data_loader.load_data_iter(file_name, chunksize=chunksize):
+                accumulator.update(chunk)
+        except Exception as e:
+            logger.error(f"流式读取数据文件 {file_name} 失败: {str(e)}")
+            return {"error": f"读取数据文件失败: {str(e)}"}
+        
+        columns = accumulator.columns or []
+        missing_values = accumulator.missing if accumulator.missing is not None else pd.Series(dtype=int)
+        missing_percentage = (missing_values / accumulator.rows) * 100 if accumulator.rows else missing_values
+        
+        return {
+            "info": {
+                "file_name": file_name,
+                "shape": (accumulator.rows, len(columns)),
+                "columns": columns,
+                "dtypes": accumulator.dtypes,
+                "memory_usage": accumulator.memory_usage
+            },
+            "missing_values": missing_values.to_dict(),
+            "missing_percentage": missing_percentage.to_dict(),
+            "numeric_stats": accumulator.numeric_stats(),
+            "categorical_stats": accumulator.categorical_stats()
+        }
 
 
 class ChartGenerator:
     """图表生成工具，支持matplotlib和plotly两种方式"""
     
-    def __init__(self, output_dir: str = "./output"):
+    def __init__(self, output_dir: str = "./output", correlation_service: Optional[Any] = None):
+        """
+        初始化图表生成工具
+        
+        Args:
+            output_dir: 图表输出目录
+            correlation_service: 相关性服务（CorrelationService），提供时热力图使用其缓存的矩阵
+        """
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(exist_ok=True)
+        self.correlation_service = correlation_service
     
     def generate_trend_chart(self, file_name: str, time_col: str, value_cols: List[str], 
                            title: str = "", engine: str = "plotly", 
@@ -433,7 +487,7 @@ class ChartGenerator:
         
         # 确保时间列是datetime类型
         if not pd.api.types.is_datetime64_any_dtype(df[time_col]):
-            df[time_col] = pd.to_datetime(df[time_col])
+            df[time_col] = _parse_time_column(df, time_col)
         
         # 按时间排序
         df = df.sort_values(time_col)
@@ -492,32 +546,10 @@ class ChartGenerator:
                                    title: str = "", engine: str = "plotly",
                                    save_path: Optional[str] = None) -> str:
         """生成相关性热力图"""
-        # 尝试多个可能的路径
-        possible_paths = [
-            f"../数据/{file_name}",
-            f"data/{file_name}",
-            file_name
-        ]
-        
-        df = None
-        for path in possible_paths:
-            try:
-                df = pd.read_csv(path)
-                break
-            except FileNotFoundError:
-                continue
-        
-        if df is None:
-            raise FileNotFoundError(f"无法找到数据文件: {file_name}")
-        
-        # 只选择数值列
-        numeric_df = df.select_dtypes(include=[np.number])
-        
-        if columns:
-            numeric_df = numeric_df[columns]
-        
-        # 计算相关性矩阵
-        corr_matrix = numeric_df.corr()
+        if self.correlation_service is not None:
+            corr_matrix = self.correlation_service.matrix(file_name, columns)
+        else:
+            corr_matrix = self._read_correlation_matrix(file_name, columns)
         
         if engine == "plotly":
             fig = px.imshow(
@@ -556,6 +588,28 @@ class ChartGenerator:
             plt.close()
             return str(save_path)
     
+    def _read_correlation_matrix(self, file_name: str, columns: Optional[List[str]]) -> pd.DataFrame:
+        """未提供相关性服务时直接读取文件计算相关性矩阵"""
+        # 尝试多个可能的路径
+        possible_paths = [
+            f"../数据/{file_name}",
+            f"data/{file_name}",
+            file_name
+        ]
+        
+        df = None
+        for path in possible_paths:
+            try:
+                df = pd.read_csv(path)
+                break
+            except FileNotFoundError:
+                continue
+        
+        if df is None:
+            raise FileNotFoundError(f"无法找到数据文件: {file_name}")
+        
+        return numeric_frame(df, columns).corr()
+    
     def generate_distribution_chart(self, file_name: str, column: str,
                                  title: str = "", engine: str = "plotly",
                                  save_path: Optional[str] = None) -> str:
@@ -669,7 +723,7 @@ class ChartGenerator:
             raise ValueError(f"列不存在: {group_col} 或 {value_col}")
         
         # 按组计算平均值
-        grouped = df.groupby(group_col)[value_col].mean().reset_index()
+        grouped = df.groupby(group_col, observed=True)[value_col].mean().reset_index()
         
         if engine == "plotly":
             fig = px.bar(
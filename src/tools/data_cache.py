@@ -0,0 +1,219 @@
+"""
+数据缓存模块，提供带内存预算、LRU/LFU淘汰和热点数据固定功能的DataFrame缓存
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Callable, Hashable, Iterator, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_POLICIES = ('lru', 'lfu')
+
+
+def estimate_size(value: Any) -> int:
+    """估算缓存对象占用的字节数"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    return 0
+
+
+class DataCache:
+    """
+    带内存预算的数据缓存
+
+    条目大小按 memory_usage(deep=True) 计算，总量超出预算时按LRU或LFU策略淘汰
+    未固定的条目。接口与字典兼容，可直接替换原有的 data_cache 字典。
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None, policy: str = 'lru',
+                 on_evict: Optional[Callable[[Hashable], None]] = None):
+        """
+        初始化数据缓存
+
+        Args:
+            max_bytes: 内存预算（字节），为None时不限制
+            policy: 淘汰策略，'lru' 或 'lfu'
+            on_evict: 条目被淘汰时的回调，参数为被淘汰的键
+        """
+        if policy not in SUPPORTED_POLICIES:
+            raise ValueError(f"不支持的缓存淘汰策略: {policy}，仅支持: {SUPPORTED_POLICIES}")
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.on_evict = on_evict
+
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self._access_counts: Dict[Hashable, int] = {}
+        self._pinned = set()
+        self._lock = threading.RLock()
+
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(list(self._entries))
+
+    def __getitem__(self, key: Hashable) -> Any:
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                raise KeyError(key)
+            return self._touch(key)
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        self.put(key, value)
+
+    def __delitem__(self, key: Hashable) -> None:
+        with self._lock:
+            if key not in self._entries:
+                raise KeyError(key)
+            self._remove(key)
+
+    def _touch(self, key: Hashable) -> Any:
+        """记录一次命中并更新访问顺序"""
+        self.hits += 1
+        self._access_counts[key] = self._access_counts.get(key, 0) + 1
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def _remove(self, key: Hashable) -> Any:
+        """移除条目并更新内存占用"""
+        value = self._entries.pop(key)
+        self.current_bytes -= self._sizes.pop(key, 0)
+        self._access_counts.pop(key, None)
+        return value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """获取缓存条目，统计命中和未命中次数"""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            return self._touch(key)
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """读取缓存条目，不计入命中统计也不更新访问顺序"""
+        with self._lock:
+            return self._entries.get(key, default)
+
+    def put(self, key: Hashable, value: Any) -> bool:
+        """
+        写入缓存条目，必要时淘汰其他条目
+
+        Returns:
+            是否已缓存；单个条目超过整个预算时不缓存
+        """
+        size = estimate_size(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            if self.max_bytes is not None and size > self.max_bytes and key not in self._pinned:
+                logger.warning(f"数据 {key} 占用 {size / 1024 / 1024:.1f}MB，超过缓存预算，不缓存")
+                return False
+
+            self._entries[key] = value
+            self._sizes[key] = size
+            self._access_counts.setdefault(key, 0)
+            self.current_bytes += size
+            self._evict(exclude=key)
+            return True
+
+    def _evict(self, exclude: Optional[Hashable] = None) -> None:
+        """淘汰条目直到内存占用不超过预算"""
+        if self.max_bytes is None:
+            return
+        while self.current_bytes > self.max_bytes:
+            candidates = [key for key in self._entries if key not in self._pinned and key != exclude]
+            if not candidates:
+                break
+            if self.policy == 'lfu':
+                # 访问次数最少者优先，次数相同时淘汰最久未使用的
+                victim = min(candidates, key=lambda k: self._access_counts.get(k, 0))
+            else:
+                victim = candidates[0]
+            size = self._sizes.get(victim, 0)
+            self._remove(victim)
+            self.evictions += 1
+            logger.info(f"缓存淘汰数据: {victim}, 释放 {size / 1024 / 1024:.1f}MB")
+            if self.on_evict is not None:
+                self.on_evict(victim)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """移除并返回缓存条目"""
+        with self._lock:
+            if key not in self._entries:
+                return default
+            return self._remove(key)
+
+    def keys(self):
+        return list(self._entries.keys())
+
+    def values(self):
+        return list(self._entries.values())
+
+    def items(self):
+        return list(self._entries.items())
+
+    def clear(self) -> None:
+        """清空缓存（固定标记保留）"""
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._access_counts.clear()
+            self.current_bytes = 0
+
+    def pin(self, key: Hashable) -> None:
+        """固定条目，使其不会被淘汰；可在条目加载前调用"""
+        with self._lock:
+            self._pinned.add(key)
+
+    def unpin(self, key: Hashable) -> None:
+        """取消固定条目，并在超出预算时立即淘汰"""
+        with self._lock:
+            self._pinned.discard(key)
+            self._evict()
+
+    def resize(self, max_bytes: Optional[int]) -> None:
+        """调整内存预算"""
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "policy": self.policy,
+                "max_bytes": self.max_bytes,
+                "current_bytes": self.current_bytes,
+                "entry_count": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "pinned": [str(key) for key in self._pinned],
+                "entries": {
+                    str(key): {
+                        "bytes": self._sizes.get(key, 0),
+                        "accesses": self._access_counts.get(key, 0),
+                        "pinned": key in self._pinned
+                    }
+                    for key in self._entries
+                }
+            }
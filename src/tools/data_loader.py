@@ -5,6 +5,11 @@ from typing import Dict, List, Optional, Union, Any
 import logging
 from pathlib import Path
 
+from .data_cache import DataCache
+from .filter_compiler import apply_filters
+from .ratio_engine import compute_ratios
+from .correlation_service import numeric_frame, find_high_correlations
+
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -12,17 +17,19 @@ logger = logging.getLogger(__name__)
 class DataLoader:
     """数据加载器，负责加载和管理各种数据源"""
     
-    def __init__(self, data_root_path: str = "../数据"):
+    def __init__(self, data_root_path: str = "../数据", cache_max_bytes: Optional[int] = None,
+                 cache_policy: str = "lru"):
         self.data_root_path = Path(data_root_path)
-        self.data_cache = {}
+        self.data_cache = DataCache(max_bytes=cache_max_bytes, policy=cache_policy)
         
     def load_data(self, file_name: str, **kwargs) -> pd.DataFrame:
         """加载指定的数据文件"""
         file_path = self.data_root_path / file_name
         
-        if file_name in self.data_cache:
+        cached = self.data_cache.get(file_name)
+        if cached is not None:
             logger.info(f"从缓存中加载数据: {file_name}")
-            return self.data_cache[file_name]
+            return cached
         
         if not file_path.exists():
             logger.error(f"数据文件不存在: {file_path}")
@@ -45,12 +52,13 @@ class DataLoader:
             logger.error(f"加载数据失败: {file_name}, 错误: {str(e)}")
             raise
     
+    def cache_stats(self) -> Dict[str, Any]:
+        """获取内存数据缓存的统计信息"""
+        return self.data_cache.stats()
+    
     def get_data_info(self, file_name: str) -> Dict[str, Any]:
         """获取数据文件的基本信息"""
-        if file_name not in self.data_cache:
-            self.load_data(file_name)
-        
-        df = self.data_cache[file_name]
+        df = self.load_data(file_name)
         return {
             "shape": df.shape,
             "columns": df.columns.tolist(),
@@ -61,10 +69,7 @@ class DataLoader:
     
     def get_data_summary(self, file_name: str) -> Dict[str, Any]:
         """获取数据文件的摘要统计信息"""
-        if file_name not in self.data_cache:
-            self.load_data(file_name)
-        
-        df = self.data_cache[file_name]
+        df = self.load_data(file_name)
         numeric_cols = df.select_dtypes(include=[np.number]).columns
         
         summary = {
@@ -73,7 +78,7 @@ class DataLoader:
         }
         
         # 对于分类变量的摘要
-        categorical_cols = df.select_dtypes(include=['object']).columns
+        categorical_cols = df.select_dtypes(include=['object', 'string', 'category']).columns
         for col in categorical_cols:
             summary["categorical_summary"][col] = {
                 "unique_count": df[col].nunique(),
@@ -95,33 +100,14 @@ class DataQuery:
         """查询数据"""
         df = self.data_loader.load_data(file_name)
         
+        # 应用行过滤：全部条件编译为一个组合掩码，只生成一次结果
+        if filters:
+            df = apply_filters(df, filters)
+        
         # 应用列过滤
         if columns:
             df = df[columns]
         
-        # 应用行过滤
-        if filters:
-            for col, condition in filters.items():
-                if isinstance(condition, dict):
-                    if 'eq' in condition:
-                        df = df[df[col] == condition['eq']]
-                    elif 'ne' in condition:
-                        df = df[df[col] != condition['ne']]
-                    elif 'gt' in condition:
-                        df = df[df[col] > condition['gt']]
-                    elif 'lt' in condition:
-                        df = df[df[col] < condition['lt']]
-                    elif 'gte' in condition:
-                        df = df[df[col] >= condition['gte']]
-                    elif 'lte' in condition:
-                        df = df[df[col] <= condition['lte']]
-                    elif 'in' in condition:
-                        df = df[df[col].isin(condition['in'])]
-                    elif 'contains' in condition:
-                        df = df[df[col].str.contains(condition['contains'], na=False)]
-                else:
-                    df = df[df[col] == condition]
-        
         # 应用限制
         if limit:
             df = df.head(limit)
@@ -154,73 +140,19 @@ class DataQuery:
         """计算相关性矩阵"""
         df = self.data_loader.load_data(file_name)
         
-        # 只选择数值列
-        numeric_df = df.select_dtypes(include=[np.number])
-        
-        if columns:
-            # 确保指定的列都是数值型
-            numeric_cols = [col for col in columns if col in numeric_df.columns]
-            if not numeric_cols:
-                raise ValueError("指定的列中没有数值型列")
-            numeric_df = numeric_df[numeric_cols]
-        
         # 计算相关性矩阵
-        corr_matrix = numeric_df.corr()
+        corr_matrix = numeric_frame(df, columns).corr()
         
         return {
             "correlation_matrix": corr_matrix.to_dict(),
-            "high_correlations": self._find_high_correlations(corr_matrix)
+            "high_correlations": find_high_correlations(corr_matrix)
         }
     
-    def _find_high_correlations(self, corr_matrix: pd.DataFrame, threshold: float = 0.7) -> List[Dict]:
-        """找出高相关性的变量对"""
-        high_corr = []
-        
-        for i in range(len(corr_matrix.columns)):
-            for j in range(i+1, len(corr_matrix.columns)):
-                corr_val = corr_matrix.iloc[i, j]
-                if abs(corr_val) >= threshold:
-                    high_corr.append({
-                        "var1": corr_matrix.columns[i],
-                        "var2": corr_matrix.columns[j],
-                        "correlation": corr_val
-                    })
-        
-        return high_corr
-    
     def compute_financial_ratios(self, file_name: str, company_col: str, 
                                 period_col: str, ratio_definitions: Dict[str, Dict]) -> pd.DataFrame:
-        """计算财务比率"""
+        """计算财务比率，定义格式见 ratio_engine.normalize_definitions"""
         df = self.data_loader.load_data(file_name)
-        
-        results = []
-        
-        for company, group in df.groupby(company_col):
-            for _, row in group.iterrows():
-                ratios = {}
-                
-                for ratio_name, definition in ratio_definitions.items():
-                    try:
-                        numerator = row[definition['numerator']]
-                        denominator = row[definition['denominator']]
-                        
-                        # 处理除零情况
-                        if denominator == 0:
-                            ratios[ratio_name] = np.nan
-                        else:
-                            ratios[ratio_name] = numerator / denominator
-                    except KeyError as e:
-                        logger.warning(f"缺少计算比率所需的列: {e}")
-                        ratios[ratio_name] = np.nan
-                
-                result_row = {
-                    company_col: company,
-                    period_col: row[period_col],
-                    **ratios
-                }
-                results.append(result_row)
-        
-        return pd.DataFrame(results)
+        return compute_ratios(df, company_col, period_col, ratio_definitions)
     
     def aggregate_by_period(self, file_name: str, group_cols: List[str], 
                            agg_cols: List[str], agg_funcs: List[str]) -> pd.DataFrame:
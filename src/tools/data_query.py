@@ -4,9 +4,11 @@
 
 import os
 import pandas as pd
-from typing import Dict, Any, Optional, Union
+from typing import Dict, List, Any, Optional, Union
 import logging
 
+from .sql_engine import SQLParams
+
 logger = logging.getLogger(__name__)
 
 
@@ -30,6 +32,29 @@ class DataQuery:
             from .mapped_data_loader import MappedDataLoader
             self.data_loader = MappedDataLoader(data_root_path=data_dir)
             self.data_dir = self.data_loader.data_root_path
+        self._query = None
+    
+    def _mapped_query(self) -> Any:
+        """加载器对应的 mapped_data_loader.DataQuery，SQL查询、频率对齐和公司连接委托给它"""
+        if self._query is None:
+            from .mapped_data_loader import DataQuery as MappedDataQuery
+            self._query = MappedDataQuery(self.data_loader)
+        return self._query
+    
+    def sql(self, query: str, params: SQLParams = None) -> pd.DataFrame:
+        """使用SQL查询映射数据集，见 mapped_data_loader.DataQuery.sql"""
+        return self._mapped_query().sql(query, params)
+    
+    def align_series(self, series: List[Dict[str, Any]], target_freq: str = "M",
+                     start: Optional[str] = None, end: Optional[str] = None) -> pd.DataFrame:
+        """将不同频率的多个时间序列对齐到同一频率，见 mapped_data_loader.DataQuery.align_series"""
+        return self._mapped_query().align_series(series, target_freq, start, end)
+    
+    def join_companies(self, base: str, others: Dict[str, List[str]],
+                       base_columns: Optional[List[str]] = None,
+                       period_col: Optional[str] = None) -> pd.DataFrame:
+        """按证券代码连接多个公司数据集，见 mapped_data_loader.DataQuery.join_companies"""
+        return self._mapped_query().join_companies(base, others, base_columns, period_col)
     
     def get_data_summary(self, file_name: str) -> Dict[str, Any]:
         """
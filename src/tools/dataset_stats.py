@@ -0,0 +1,111 @@
+"""
+数据集统计模块，在摄取时计算结构和统计信息，写入清单后供信息和摘要查询直接使用
+"""
+
+import logging
+from typing import Dict, List, Any, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 分类列记录的高频取值数量
+DEFAULT_TOP_N = 10
+
+
+def _scalar(value: Any) -> Any:
+    """将NumPy/pandas标量转换为可JSON序列化的Python值"""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        return str(pd.Timestamp(value))
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _is_categorical(series: pd.Series) -> bool:
+    """与摘要统计一致：object、str和category类型的列视为分类列"""
+    dtype = series.dtype
+    return (pd.api.types.is_object_dtype(dtype) or isinstance(dtype, pd.CategoricalDtype)
+            or (pd.api.types.is_string_dtype(dtype) and not pd.api.types.is_numeric_dtype(dtype)))
+
+
+def compute_dataset_stats(df: pd.DataFrame, top_n: int = DEFAULT_TOP_N) -> Dict[str, Any]:
+    """
+    计算数据集的结构和统计信息
+
+    Args:
+        df: 完整数据
+        top_n: 分类列记录的高频取值数量
+
+    Returns:
+        包含行数、索引内存占用和各列统计（类型、缺失数、内存占用、最值、
+        数值列的describe结果、分类列的唯一值数量和高频取值）的字典
+    """
+    memory = df.memory_usage(deep=True)
+    columns = {}
+    for col in df.columns:
+        series = df[col]
+        info = {
+            "dtype": str(series.dtype),
+            "null_count": int(series.isnull().sum()),
+            "memory_bytes": int(memory[col]),
+        }
+        if pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+            info["describe"] = {stat: _scalar(value) for stat, value in series.describe().items()}
+            info["min"] = info["describe"]["min"]
+            info["max"] = info["describe"]["max"]
+        elif pd.api.types.is_datetime64_any_dtype(series.dtype):
+            info["min"] = _scalar(series.min())
+            info["max"] = _scalar(series.max())
+        elif _is_categorical(series):
+            counts = series.value_counts()
+            info["unique_count"] = int(series.nunique())
+            info["top_values"] = {str(key): int(value) for key, value in counts.head(top_n).items()}
+        columns[str(col)] = info
+
+    return {
+        "rows": int(len(df)),
+        "index_bytes": int(memory["Index"]) if "Index" in memory.index else 0,
+        "columns": columns,
+    }
+
+
+def select_columns(stats: Dict[str, Any], columns: Optional[List[str]]) -> List[str]:
+    """按源文件列顺序选出统计信息中存在的列"""
+    if columns is None:
+        return list(stats["columns"])
+    wanted = set(columns)
+    return [col for col in stats["columns"] if col in wanted]
+
+
+def data_info_from_stats(stats: Dict[str, Any], columns: Optional[List[str]] = None) -> Dict[str, Any]:
+    """由统计信息构造与 get_data_info 相同结构的结果"""
+    selected = select_columns(stats, columns)
+    column_stats = stats["columns"]
+    return {
+        "shape": (stats["rows"], len(selected)),
+        "columns": selected,
+        "dtypes": {col: pd.api.types.pandas_dtype(column_stats[col]["dtype"]) for col in selected},
+        "null_counts": {col: column_stats[col]["null_count"] for col in selected},
+        "memory_usage": stats["index_bytes"] + sum(column_stats[col]["memory_bytes"] for col in selected)
+    }
+
+
+def data_summary_from_stats(stats: Dict[str, Any], columns: Optional[List[str]] = None) -> Dict[str, Any]:
+    """由统计信息构造与 get_data_summary 相同结构的结果"""
+    selected = select_columns(stats, columns)
+    column_stats = stats["columns"]
+    return {
+        "numeric_summary": {col: column_stats[col]["describe"]
+                            for col in selected if "describe" in column_stats[col]},
+        "categorical_summary": {
+            col: {
+                "unique_count": column_stats[col]["unique_count"],
+                "top_values": column_stats[col]["top_values"]
+            }
+            for col in selected if "top_values" in column_stats[col]
+        }
+    }
@@ -0,0 +1,72 @@
+"""
+数据类型压缩模块，在不丢失信息的前提下缩小DataFrame的内存占用
+"""
+
+import logging
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 唯一值占比不超过该阈值的字符串列转换为分类类型
+DEFAULT_CATEGORY_RATIO = 0.5
+
+
+def _is_text(series: pd.Series) -> bool:
+    """判断是否为字符串列（object或str类型）"""
+    return pd.api.types.is_object_dtype(series.dtype) or pd.api.types.is_string_dtype(series.dtype)
+
+
+def _compact_float(series: pd.Series, float32: bool) -> pd.Series:
+    """float64列在float32模式下或可无损表示时转换为float32"""
+    if series.dtype != np.float64:
+        return series
+    converted = series.astype(np.float32)
+    if float32:
+        return converted
+    values = series.to_numpy()
+    if np.array_equal(converted.to_numpy().astype(np.float64), values, equal_nan=True):
+        return converted
+    return series
+
+
+def compact_dtypes(df: pd.DataFrame, float32: bool = False,
+                   category_ratio: float = DEFAULT_CATEGORY_RATIO,
+                   name: Optional[str] = None) -> pd.DataFrame:
+    """
+    压缩DataFrame各列的数据类型
+
+    整数列按取值范围降级到最小的整数类型；浮点列仅在可无损表示时降级为float32，
+    开启float32模式时全部降级；唯一值占比较低的字符串列转换为分类类型。
+
+    Args:
+        df: 原始数据
+        float32: 是否将所有float64列降级为float32（可能损失精度）
+        category_ratio: 字符串列唯一值数量与行数之比不超过该值时转换为分类类型
+        name: 数据集名称，用于日志
+
+    Returns:
+        压缩后的数据
+    """
+    before = int(df.memory_usage(deep=True).sum())
+    compacted = {}
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_bool_dtype(series.dtype):
+            compacted[col] = series
+        elif pd.api.types.is_integer_dtype(series.dtype):
+            compacted[col] = pd.to_numeric(series, downcast='integer')
+        elif pd.api.types.is_float_dtype(series.dtype):
+            compacted[col] = _compact_float(series, float32)
+        elif _is_text(series) and len(series) > 0 and series.nunique() <= category_ratio * len(series):
+            compacted[col] = series.astype('category')
+        else:
+            compacted[col] = series
+    result = pd.DataFrame(compacted, index=df.index)
+
+    after = int(result.memory_usage(deep=True).sum())
+    logger.info(f"数据类型压缩{f' {name}' if name else ''}: "
+                f"{before / 1024 / 1024:.2f}MB -> {after / 1024 / 1024:.2f}MB")
+    return result
@@ -0,0 +1,120 @@
+"""
+文件编码探测模块，基于有限字节样本一次性判定CSV文件编码
+"""
+
+import os
+import codecs
+import shutil
+import logging
+from pathlib import Path
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+# 默认每个样本读取的字节数
+DEFAULT_SAMPLE_SIZE = 64 * 1024
+
+# 按优先级排列的候选编码，gb18030 是 gbk/gb2312 的超集，作为最终兜底
+CANDIDATE_ENCODINGS = ['utf-8', 'gbk', 'gb18030']
+
+
+def _read_samples(file_path: Path, sample_size: int) -> List[bytes]:
+    """读取文件头部、中部和尾部的字节样本，小文件直接整体读取"""
+    file_size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as f:
+        if file_size <= sample_size * 3:
+            return [f.read()]
+        samples = [f.read(sample_size)]
+        for offset in (file_size // 2, file_size - sample_size):
+            f.seek(offset)
+            samples.append(f.read(sample_size))
+    return samples
+
+
+def _trim_to_lines(sample: bytes, align_start: bool, at_eof: bool) -> bytes:
+    """
+    将样本裁剪到完整行边界
+
+    换行符在UTF-8和GBK中都不会出现在多字节字符内部，
+    按换行裁剪可以避免样本边界截断多字节字符造成误判。
+    """
+    if align_start:
+        first_newline = sample.find(b'\n')
+        sample = sample[first_newline + 1:] if first_newline >= 0 else b''
+    if not at_eof:
+        last_newline = sample.rfind(b'\n')
+        if last_newline >= 0:
+            sample = sample[:last_newline + 1]
+    return sample
+
+
+def _can_decode(samples: List[bytes], encoding: str) -> bool:
+    """判断所有样本能否用指定编码解码"""
+    for sample in samples:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            # final=False 允许样本末尾存在不完整的多字节字符
+            decoder.decode(sample, final=False)
+        except UnicodeDecodeError:
+            return False
+    return True
+
+
+def detect_encoding(file_path: Path, sample_size: int = DEFAULT_SAMPLE_SIZE) -> str:
+    """
+    根据有限字节样本探测文件编码
+
+    Args:
+        file_path: 文件路径
+        sample_size: 每个样本的字节数
+
+    Returns:
+        探测到的编码名称
+    """
+    samples = _read_samples(file_path, sample_size)
+    head = samples[0]
+
+    if head.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if head.startswith(codecs.BOM_UTF16_LE) or head.startswith(codecs.BOM_UTF16_BE):
+        return 'utf-16'
+
+    # 最后一个样本总是读到文件末尾，其余样本需要裁剪到完整行
+    trimmed = [
+        _trim_to_lines(sample, align_start=index > 0, at_eof=index == len(samples) - 1)
+        for index, sample in enumerate(samples)
+    ]
+
+    for encoding in CANDIDATE_ENCODINGS:
+        if _can_decode(trimmed, encoding):
+            return encoding
+
+    logger.warning(f"无法从样本判定文件编码，使用 {CANDIDATE_ENCODINGS[-1]}: {file_path}")
+    return CANDIDATE_ENCODINGS[-1]
+
+
+def fallback_encoding(encoding: str) -> str:
+    """样本之外出现解码错误时使用的后备编码"""
+    return 'gb18030' if encoding != 'gb18030' else 'utf-8'
+
+
+def transcode_to_utf8(source_path: Path, target_path: Path, encoding: str) -> Path:
+    """
+    将文件转码为UTF-8副本
+
+    Args:
+        source_path: 源文件路径
+        target_path: UTF-8副本路径
+        encoding: 源文件编码
+
+    Returns:
+        UTF-8副本路径
+    """
+    target_path = Path(target_path)
+    tmp_path = target_path.with_suffix(f"{target_path.suffix}.{os.getpid()}.tmp")
+    with open(source_path, 'r', encoding=encoding, newline='') as src, \
+            open(tmp_path, 'w', encoding='utf-8', newline='') as dst:
+        shutil.copyfileobj(src, dst, 1 << 20)
+    os.replace(tmp_path, target_path)
+    logger.info(f"已将 {source_path} 从 {encoding} 转码为UTF-8: {target_path}")
+    return target_path
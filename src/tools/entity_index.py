@@ -0,0 +1,410 @@
+"""
+实体索引模块，为公司基本信息和各面板数据共享的证券代码建立持久化的实体字典，
+将代码、简称和全称映射为稠密整数编号，并为每个数据集保存各实体的行位置，
+跨文件的公司连接由预先计算的行位置直接取数，不再每次重新哈希连接
+"""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Any, Optional
+
+import numpy as np
+import pandas as pd
+
+from .partitioned_store import normalize_code
+
+logger = logging.getLogger(__name__)
+
+# 实体索引存储格式版本，结构变化时递增以使旧存储失效
+ENTITY_STORE_VERSION = 1
+
+# 默认的实体列
+DEFAULT_CODE_COL = "证券代码"
+
+# 实体编号与期间编号组合键中期间编号所占的位数
+PERIOD_BITS = 20
+
+
+def normalize_period(value: Any) -> str:
+    """规范化期间取值，使 2020、2020.0 和 '2020' 视为同一期间"""
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        return pd.Timestamp(value).isoformat()
+    return normalize_code(value)
+
+
+class EntityDictionary:
+    """
+    实体字典
+
+    每个证券代码对应一个稠密整数编号，编号只追加不变更；简称和全称映射到对应代码的编号。
+    期间取值同样编号，用于按“实体×期间”连接。
+    """
+
+    def __init__(self):
+        self.codes: List[str] = []
+        self._code_ids: Dict[str, int] = {}
+        self.short_names: Dict[str, int] = {}
+        self.full_names: Dict[str, int] = {}
+        self.periods: List[str] = []
+        self._period_ids: Dict[str, int] = {}
+        # 已读取名称的数据集及其版本号
+        self.sources: Dict[str, Any] = {}
+        self.changed = False
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def add(self, code: Any) -> int:
+        """登记证券代码，返回其编号"""
+        key = normalize_code(code)
+        entity_id = self._code_ids.get(key)
+        if entity_id is None:
+            entity_id = self._code_ids[key] = len(self.codes)
+            self.codes.append(key)
+            self.changed = True
+        return entity_id
+
+    def encode(self, values: pd.Series) -> np.ndarray:
+        """
+        将一列证券代码编码为实体编号，未登记的代码自动登记
+
+        每个不同的代码只查找一次，缺失值编码为-1。
+        """
+        codes, uniques = pd.factorize(values, use_na_sentinel=True)
+        mapped = np.array([self.add(value) for value in uniques] + [-1], dtype=np.int32)
+        return mapped[codes]
+
+    def encode_periods(self, values: pd.Series) -> np.ndarray:
+        """将一列期间取值编码为期间编号，缺失值编码为-1"""
+        codes, uniques = pd.factorize(values, use_na_sentinel=True)
+        mapped = []
+        for value in uniques:
+            key = normalize_period(value)
+            period_id = self._period_ids.get(key)
+            if period_id is None:
+                period_id = self._period_ids[key] = len(self.periods)
+                self.periods.append(key)
+                self.changed = True
+            mapped.append(period_id)
+        return np.array(mapped + [-1], dtype=np.int64)[codes]
+
+    def add_names(self, codes: pd.Series, short_names: Optional[pd.Series] = None,
+                  full_names: Optional[pd.Series] = None) -> None:
+        """登记代码对应的简称和全称"""
+        ids = self.encode(codes)
+        for names, target in ((short_names, self.short_names), (full_names, self.full_names)):
+            if names is None:
+                continue
+            for name, entity_id in zip(names.tolist(), ids.tolist()):
+                if entity_id >= 0 and isinstance(name, str) and name.strip() \
+                        and target.get(name.strip()) != entity_id:
+                    target[name.strip()] = entity_id
+                    self.changed = True
+
+    def resolve(self, identifier: Any) -> Optional[int]:
+        """由证券代码、简称或全称查找实体编号，未登记时返回None"""
+        if isinstance(identifier, str):
+            text = identifier.strip()
+            for names in (self.short_names, self.full_names):
+                if text in names:
+                    return names[text]
+        return self._code_ids.get(normalize_code(identifier))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"codes": self.codes, "short_names": self.short_names, "full_names": self.full_names,
+                "periods": self.periods, "sources": self.sources}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "EntityDictionary":
+        dictionary = cls()
+        dictionary.codes = list(data.get("codes", []))
+        dictionary._code_ids = {code: i for i, code in enumerate(dictionary.codes)}
+        dictionary.short_names = dict(data.get("short_names", {}))
+        dictionary.full_names = dict(data.get("full_names", {}))
+        dictionary.periods = list(data.get("periods", []))
+        dictionary._period_ids = {period: i for i, period in enumerate(dictionary.periods)}
+        dictionary.sources = dict(data.get("sources", {}))
+        return dictionary
+
+
+class EntityPositions:
+    """
+    数据集中各实体的行位置
+
+    ids 为每行的实体编号；按编号稳定排序的行位置和各编号的偏移量组成压缩行索引，
+    同一实体的行位置连续存放并保持原有顺序。
+    """
+
+    def __init__(self, ids: np.ndarray, periods: Optional[np.ndarray] = None):
+        self.ids = ids.astype(np.int32, copy=False)
+        size = int(self.ids.max()) + 1 if len(self.ids) else 0
+        order = np.argsort(self.ids, kind="stable").astype(np.int64, copy=False)
+        missing = int((self.ids < 0).sum())
+        self.order = order[missing:]
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(self.ids[self.ids >= 0], minlength=size))])
+        self.periods = periods
+        self._period_keys: Optional[np.ndarray] = None
+        self._period_order: Optional[np.ndarray] = None
+
+    @property
+    def size(self) -> int:
+        """覆盖的实体编号数量"""
+        return len(self.offsets) - 1
+
+    def rows(self, entity_ids: List[int]) -> np.ndarray:
+        """实体的全部行位置（升序）"""
+        slices = [self.order[self.offsets[i]:self.offsets[i + 1]] for i in entity_ids if 0 <= i < self.size]
+        if not slices:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(slices))
+
+    def first_rows(self, entity_ids: np.ndarray) -> np.ndarray:
+        """每个实体编号对应的首行位置，没有对应行时为-1"""
+        first = np.full(self.size + 1, -1, dtype=np.int64)
+        present = np.flatnonzero(np.diff(self.offsets) > 0)
+        first[present] = self.order[self.offsets[present]]
+        lookup = np.where((entity_ids >= 0) & (entity_ids < self.size), entity_ids, self.size)
+        return first[lookup]
+
+    def period_rows(self, entity_ids: np.ndarray, period_ids: np.ndarray) -> np.ndarray:
+        """每个（实体编号, 期间编号）对应的首行位置，没有对应行时为-1"""
+        if self.periods is None:
+            raise ValueError("该行位置索引未包含期间列")
+        if self._period_keys is None:
+            keys = (self.ids.astype(np.int64) << PERIOD_BITS) | self.periods
+            keys[(self.ids < 0) | (self.periods < 0)] = -1
+            self._period_order = np.argsort(keys, kind="stable")
+            self._period_keys = keys[self._period_order]
+        wanted = (entity_ids.astype(np.int64) << PERIOD_BITS) | period_ids
+        wanted[(entity_ids < 0) | (period_ids < 0)] = -2
+        rows = np.full(len(wanted), -1, dtype=np.int64)
+        if len(self._period_keys) == 0:
+            return rows
+        found = np.minimum(np.searchsorted(self._period_keys, wanted, side="left"), len(self._period_keys) - 1)
+        matched = self._period_keys[found] == wanted
+        rows[matched] = self._period_order[found[matched]]
+        return rows
+
+
+class EntityIndex:
+    """
+    跨数据集的实体索引
+
+    映射配置中声明了 entity 名称列（short_name_col、full_name_col）的数据集提供简称和全称；
+    各数据集的实体列由 entity.code_col、partition.code_col 确定，默认为“证券代码”。
+    实体字典和各数据集的行位置写入缓存目录，数据集版本号变化后重新计算。
+    """
+
+    def __init__(self, data_loader: Any, store_dir: Optional[str] = None):
+        """
+        初始化实体索引
+
+        Args:
+            data_loader: MappedDataLoader 实例
+            store_dir: 持久化目录，为None时只保存在内存中
+        """
+        self.data_loader = data_loader
+        self.store_dir = Path(store_dir) if store_dir else None
+        self._dictionary: Optional[EntityDictionary] = None
+        self._positions: Dict[tuple, tuple] = {}
+        self._lock = threading.RLock()
+
+    def _config(self, file_name: str) -> Dict[str, Any]:
+        mapping = self.data_loader.file_mapping.get(file_name)
+        return mapping if isinstance(mapping, dict) else {}
+
+    def entity_column(self, file_name: str) -> str:
+        """数据集的实体列"""
+        config = self._config(file_name)
+        return (config.get("entity") or {}).get("code_col") \
+            or (config.get("partition") or {}).get("code_col") or DEFAULT_CODE_COL
+
+    def _version(self, file_name: str) -> Any:
+        get_version = getattr(self.data_loader, "get_dataset_version", None)
+        return get_version(file_name) if get_version is not None else None
+
+    def _save_dictionary(self) -> None:
+        """持久化实体字典"""
+        dictionary = self._dictionary
+        if self.store_dir is None or not dictionary.changed:
+            return
+        target = self.store_dir / "dictionary.json"
+        tmp_file = target.with_name(f"dictionary.{os.getpid()}.tmp")
+        try:
+            self.store_dir.mkdir(parents=True, exist_ok=True)
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump({"store_version": ENTITY_STORE_VERSION, **dictionary.to_dict()}, f, ensure_ascii=False)
+            os.replace(tmp_file, target)
+            dictionary.changed = False
+        except OSError as e:
+            logger.warning(f"写入实体字典失败: {target}, 错误: {str(e)}")
+
+    def dictionary(self) -> EntityDictionary:
+        """
+        获取实体字典
+
+        首次调用时读取持久化的字典，并从声明了名称列的数据集中登记简称和全称；
+        这些数据集的版本号变化后重新登记。
+        """
+        with self._lock:
+            if self._dictionary is None:
+                self._dictionary = EntityDictionary()
+                meta_file = self.store_dir / "dictionary.json" if self.store_dir is not None else None
+                if meta_file is not None and meta_file.exists():
+                    try:
+                        with open(meta_file, "r", encoding="utf-8") as f:
+                            data = json.load(f)
+                        if data.get("store_version") == ENTITY_STORE_VERSION:
+                            self._dictionary = EntityDictionary.from_dict(data)
+                    except (OSError, ValueError) as e:
+                        logger.warning(f"读取实体字典失败: {meta_file}, 错误: {str(e)}")
+
+            dictionary = self._dictionary
+            for file_name, config in self.data_loader.file_mapping.items():
+                entity = config.get("entity") if isinstance(config, dict) else None
+                if not entity or not (entity.get("short_name_col") or entity.get("full_name_col")):
+                    continue
+                version = self._version(file_name)
+                if version is not None and dictionary.sources.get(file_name) == version:
+                    continue
+                code_col = self.entity_column(file_name)
+                name_cols = [entity.get("short_name_col"), entity.get("full_name_col")]
+                try:
+                    df = self.data_loader.load_data(file_name, columns=[code_col] + [c for c in name_cols if c])
+                except Exception as e:
+                    logger.warning(f"读取实体名称失败: {file_name}, 错误: {str(e)}")
+                    continue
+                if code_col not in df.columns:
+                    logger.warning(f"{file_name} 缺少实体列 {code_col}，未登记名称")
+                    continue
+                dictionary.add_names(df[code_col], *[df[col] if col in df.columns else None for col in name_cols])
+                dictionary.sources[file_name] = self._version(file_name)
+                dictionary.changed = True
+                logger.info(f"已从 {file_name} 登记实体名称，共 {len(dictionary)} 个实体")
+            self._save_dictionary()
+            return dictionary
+
+    def _positions_file(self, file_name: str, period_col: Optional[str]) -> Optional[Path]:
+        if self.store_dir is None:
+            return None
+        key = json.dumps([file_name, self.entity_column(file_name), period_col], ensure_ascii=False)
+        return self.store_dir / f"{hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]}.npz"
+
+    def positions(self, file_name: str, period_col: Optional[str] = None) -> EntityPositions:
+        """
+        获取数据集各实体的行位置，行位置与 load_data 返回的行顺序一致
+
+        Args:
+            file_name: 逻辑文件名或实际文件名
+            period_col: 同时编码的期间列，用于按“实体×期间”连接
+
+        Returns:
+            行位置索引
+        """
+        with self._lock:
+            dictionary = self.dictionary()
+            version = self._version(file_name)
+            key = (file_name, period_col)
+            cached = self._positions.get(key)
+            if cached is not None and version is not None and cached[0] == version:
+                return cached[1]
+
+            stored = self._positions_file(file_name, period_col)
+            if version is not None and stored is not None and stored.exists():
+                try:
+                    with np.load(stored) as data:
+                        if int(data["store_version"]) == ENTITY_STORE_VERSION and int(data["version"]) == version \
+                                and int(data["entities"]) <= len(dictionary) \
+                                and int(data["periods"]) <= len(dictionary.periods):
+                            positions = EntityPositions(data["ids"], data["period_ids"] if period_col else None)
+                            self._positions[key] = (version, positions)
+                            return positions
+                except (OSError, ValueError, KeyError) as e:
+                    logger.warning(f"读取实体行位置失败: {stored}, 错误: {str(e)}")
+
+            code_col = self.entity_column(file_name)
+            columns = [code_col] + ([period_col] if period_col else [])
+            df = self.data_loader.load_data(file_name, columns=columns)
+            missing = [col for col in columns if col not in df.columns]
+            if missing:
+                raise ValueError(f"数据文件 {file_name} 中不存在列: {missing}")
+            ids = dictionary.encode(df[code_col])
+            period_ids = dictionary.encode_periods(df[period_col]) if period_col else None
+            positions = EntityPositions(ids, period_ids)
+            self._save_dictionary()
+            version = self._version(file_name)
+            if version is not None:
+                self._positions[key] = (version, positions)
+                if stored is not None:
+                    tmp_file = stored.with_name(f"{stored.stem}.{os.getpid()}.tmp.npz")
+                    try:
+                        self.store_dir.mkdir(parents=True, exist_ok=True)
+                        np.savez(tmp_file, store_version=ENTITY_STORE_VERSION, version=version,
+                                 entities=len(dictionary), periods=len(dictionary.periods), ids=ids,
+                                 period_ids=period_ids if period_ids is not None else np.empty(0, dtype=np.int64))
+                        os.replace(tmp_file, stored)
+                    except OSError as e:
+                        logger.warning(f"写入实体行位置失败: {stored}, 错误: {str(e)}")
+            logger.info(f"已建立实体行位置: {file_name}, {len(ids)} 行")
+            return positions
+
+    def rows(self, file_name: str, entities: List[Any]) -> np.ndarray:
+        """
+        获取指定实体在数据集中的行位置
+
+        Args:
+            file_name: 逻辑文件名或实际文件名
+            entities: 证券代码、简称或全称
+
+        Returns:
+            行位置（升序），与 load_data 返回的行顺序一致
+        """
+        dictionary = self.dictionary()
+        ids = [dictionary.resolve(entity) for entity in entities]
+        unknown = [entity for entity, entity_id in zip(entities, ids) if entity_id is None]
+        if unknown:
+            logger.warning(f"未登记的实体: {unknown}")
+        return self.positions(file_name).rows([entity_id for entity_id in ids if entity_id is not None])
+
+    def join(self, base: str, others: Dict[str, List[str]], base_columns: Optional[List[str]] = None,
+             period_col: Optional[str] = None) -> pd.DataFrame:
+        """
+        以基准数据集的行为准连接其他数据集的列（左连接）
+
+        其他数据集按实体（指定 period_col 且数据集包含该列时按“实体×期间”）取首个匹配行，
+        匹配行由预先计算的行位置确定，没有匹配行时为缺失值。
+
+        Args:
+            base: 基准数据集
+            others: 其他数据集到所需列的映射
+            base_columns: 基准数据集的列，为None时使用映射配置中声明的列
+            period_col: 期间列，需要在各数据集中同名
+
+        Returns:
+            基准数据集的行加上其他数据集的列，与已有列重名的列加“数据集.”前缀
+        """
+        base_positions = self.positions(base, period_col)
+        result = self.data_loader.load_data(base, columns=base_columns)
+        if len(result) != len(base_positions.ids):
+            raise ValueError(f"数据集 {base} 的行数与实体行位置不一致")
+
+        for other, columns in others.items():
+            frame = self.data_loader.load_data(other, columns=list(dict.fromkeys(
+                list(columns) + ([period_col] if period_col else []))))
+            if period_col and period_col in frame.columns:
+                rows = self.positions(other, period_col).period_rows(base_positions.ids, base_positions.periods)
+            else:
+                # 没有期间列的数据集（如公司基本信息）每个实体一行，只按实体连接
+                rows = self.positions(other).first_rows(base_positions.ids)
+            absent = [col for col in columns if col not in frame.columns]
+            if absent:
+                logger.warning(f"数据文件 {other} 中不存在列: {absent}，已忽略")
+            gathered = frame[[col for col in columns if col in frame.columns]].reset_index(drop=True).reindex(rows)
+            gathered.index = result.index
+            gathered.columns = [f"{other}.{col}" if col in result.columns else col for col in gathered.columns]
+            result = pd.concat([result, gathered], axis=1)
+        return result
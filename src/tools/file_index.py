@@ -0,0 +1,153 @@
+"""
+文件解析索引模块，为数据根目录建立文件名索引，避免每次解析逻辑文件名时遍历目录
+"""
+
+import os
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# 子串匹配的候选文件后缀，与原有的 *.csv 查找保持一致
+SUBSTRING_SUFFIXES = ('.csv',)
+
+
+def _bigrams(text: str) -> Set[str]:
+    """生成字符串的二元字符组"""
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class FileIndex:
+    """
+    数据根目录的文件名索引
+
+    支持精确匹配、忽略大小写匹配和基于二元字符组的子串匹配。
+    每次查询前只检查一次目录修改时间，目录内容变化时自动重建索引。
+    """
+
+    def __init__(self, root: Path):
+        """
+        初始化文件索引
+
+        Args:
+            root: 数据根目录
+        """
+        self.root = Path(root)
+        self._lock = threading.RLock()
+        self._mtime_ns: Optional[int] = None
+        self._names: Set[str] = set()
+        self._lower: Dict[str, List[str]] = {}
+        self._bigram_index: Dict[str, Set[str]] = {}
+        self._match_cache: Dict[str, Optional[str]] = {}
+
+    def _directory_mtime(self) -> Optional[int]:
+        """获取目录修改时间，目录不存在时返回None"""
+        try:
+            return os.stat(self.root).st_mtime_ns
+        except OSError:
+            return None
+
+    def _ensure_fresh(self) -> None:
+        """目录修改时间变化时重建索引"""
+        mtime_ns = self._directory_mtime()
+        if self._mtime_ns is not None and mtime_ns == self._mtime_ns:
+            return
+        with self._lock:
+            if self._mtime_ns is not None and mtime_ns == self._mtime_ns:
+                return
+            self._rebuild(mtime_ns)
+
+    def _rebuild(self, mtime_ns: Optional[int]) -> None:
+        """扫描数据根目录并重建索引"""
+        names = set()
+        if mtime_ns is not None:
+            with os.scandir(self.root) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        names.add(entry.name)
+
+        lower: Dict[str, List[str]] = {}
+        bigram_index: Dict[str, Set[str]] = {}
+        for name in sorted(names):
+            lowered = name.lower()
+            lower.setdefault(lowered, []).append(name)
+            if lowered.endswith(SUBSTRING_SUFFIXES):
+                for gram in _bigrams(lowered):
+                    bigram_index.setdefault(gram, set()).add(name)
+
+        self._names = names
+        self._lower = lower
+        self._bigram_index = bigram_index
+        self._match_cache = {}
+        # 目录不存在时用0标记已扫描，目录创建后修改时间变化会触发重建
+        self._mtime_ns = mtime_ns if mtime_ns is not None else 0
+        logger.debug(f"已重建文件索引: {self.root}, 文件数: {len(names)}")
+
+    def files(self, suffixes: Optional[tuple] = None) -> List[str]:
+        """
+        列出索引中的文件名
+
+        Args:
+            suffixes: 只返回这些后缀（小写）的文件，为None时返回全部
+
+        Returns:
+            按名称排序的文件名列表
+        """
+        self._ensure_fresh()
+        names = sorted(self._names)
+        if suffixes is None:
+            return names
+        return [name for name in names if name.lower().endswith(suffixes)]
+
+    def __contains__(self, name: str) -> bool:
+        self._ensure_fresh()
+        return name in self._names
+
+    def resolve(self, query: str) -> Optional[str]:
+        """
+        将查询名解析为数据根目录中的实际文件名
+
+        依次尝试精确匹配、忽略大小写匹配和子串匹配。子串匹配到多个文件时，
+        选择名称最短者，长度相同时按字典序，并记录警告。
+
+        Args:
+            query: 查询的文件名或名称片段
+
+        Returns:
+            实际文件名，找不到时返回None
+        """
+        self._ensure_fresh()
+        if query in self._names:
+            return query
+
+        with self._lock:
+            if query in self._match_cache:
+                return self._match_cache[query]
+
+            lowered = query.lower()
+            exact = self._lower.get(lowered)
+            if exact:
+                match = exact[0]
+            else:
+                match = self._substring_match(lowered, query)
+            self._match_cache[query] = match
+            return match
+
+    def _substring_match(self, lowered: str, query: str) -> Optional[str]:
+        """通过二元字符组索引查找包含查询串的文件"""
+        grams = _bigrams(lowered)
+        if grams:
+            candidate_sets = [self._bigram_index.get(gram, set()) for gram in grams]
+            candidates = set.intersection(*candidate_sets)
+        else:
+            candidates = {name for names in self._bigram_index.values() for name in names}
+
+        matches = sorted((name for name in candidates if lowered in name.lower()),
+                         key=lambda name: (len(name), name))
+        if not matches:
+            return None
+        if len(matches) > 1:
+            logger.warning(f"逻辑名 {query} 匹配到多个文件: {matches}，选择 {matches[0]}")
+        return matches[0]
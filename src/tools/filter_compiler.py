@@ -0,0 +1,251 @@
+"""
+过滤条件编译模块，将 query_data 的过滤条件（全部运算符及 $and/$or 组合）编译为一个组合掩码，
+按估计的选择性排序求值，最后只生成一次结果数据
+"""
+
+import logging
+from typing import Dict, List, Any, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 支持的比较运算符
+OPERATORS = ("eq", "ne", "gt", "gte", "lt", "lte", "in", "contains")
+
+# 逻辑组合键
+AND_KEY = "$and"
+OR_KEY = "$or"
+
+# 没有统计信息时各运算符的默认选择性（满足条件的行占比）
+DEFAULT_SELECTIVITY = {
+    "eq": 0.05,
+    "ne": 0.95,
+    "gt": 0.5,
+    "gte": 0.5,
+    "lt": 0.5,
+    "lte": 0.5,
+    "in": 0.05,
+    "contains": 0.25,
+}
+
+
+def _condition_items(condition: Any) -> List[Tuple[str, Any]]:
+    """将单列的过滤条件展开为 (运算符, 取值) 列表，同一字典中的多个运算符同时生效"""
+    if isinstance(condition, dict):
+        return list(condition.items())
+    if isinstance(condition, (list, tuple, set)):
+        return [("in", list(condition))]
+    return [("eq", condition)]
+
+
+def column_conditions(filters: Optional[Dict[str, Any]]) -> List[Tuple[str, str, Any]]:
+    """
+    取出顶层与其他条件以AND组合的单列条件
+
+    这些条件对结果是必要条件，可用于分区裁剪和索引查找；$and 组内的条件同样展开，$or 组不展开。
+
+    Returns:
+        (列名, 运算符, 取值) 列表
+    """
+    conditions = []
+    for key, condition in (filters or {}).items():
+        if key == AND_KEY:
+            for group in condition:
+                conditions.extend(column_conditions(group))
+        elif key != OR_KEY:
+            conditions.extend((key, op, value) for op, value in _condition_items(condition)
+                              if op in OPERATORS)
+    return conditions
+
+
+def filter_columns(filters: Optional[Dict[str, Any]]) -> List[str]:
+    """过滤条件中引用的全部列（包括 $and/$or 组内的列），按首次出现的顺序"""
+    columns = []
+    for key, condition in (filters or {}).items():
+        if key in (AND_KEY, OR_KEY):
+            for group in condition:
+                columns.extend(filter_columns(group))
+        else:
+            columns.append(key)
+    return list(dict.fromkeys(columns))
+
+
+class Predicate:
+    """单列上的一个比较条件"""
+
+    def __init__(self, column: str, op: str, value: Any):
+        self.column = column
+        self.op = op
+        self.value = value
+
+    def selectivity(self, stats: Optional[Dict[str, Any]]) -> float:
+        """估计满足条件的行占比，有统计信息时使用唯一值数量和取值范围"""
+        estimate = DEFAULT_SELECTIVITY[self.op]
+        column_stats = (stats or {}).get("columns", {}).get(self.column)
+        if not column_stats:
+            return estimate
+        if self.op in ("eq", "ne", "in") and column_stats.get("unique_count"):
+            single = 1.0 / column_stats["unique_count"]
+            if self.op == "eq":
+                return single
+            if self.op == "ne":
+                return 1.0 - single
+            return min(1.0, single * len(self.value))
+        if self.op in ("gt", "gte", "lt", "lte") and column_stats.get("min") is not None \
+                and column_stats.get("max") is not None:
+            try:
+                low, high, bound = float(column_stats["min"]), float(column_stats["max"]), float(self.value)
+            except (TypeError, ValueError):
+                return estimate
+            if high <= low:
+                return estimate
+            above = min(1.0, max(0.0, (high - bound) / (high - low)))
+            return above if self.op in ("gt", "gte") else 1.0 - above
+        return estimate
+
+    def evaluate(self, df: pd.DataFrame, positions: Optional[np.ndarray]) -> np.ndarray:
+        """对指定行位置（为None时全部行）求值，返回布尔数组"""
+        series = df[self.column]
+        if positions is not None:
+            series = series.take(positions)
+        if self.op == "eq":
+            result = series == self.value
+        elif self.op == "ne":
+            result = series != self.value
+        elif self.op == "gt":
+            result = series > self.value
+        elif self.op == "gte":
+            result = series >= self.value
+        elif self.op == "lt":
+            result = series < self.value
+        elif self.op == "lte":
+            result = series <= self.value
+        elif self.op == "in":
+            result = series.isin(self.value)
+        else:
+            result = series.str.contains(self.value, na=False)
+        return result.to_numpy(dtype=bool, na_value=False)
+
+
+class Group:
+    """以AND或OR组合的条件组"""
+
+    def __init__(self, kind: str, children: List[Any], stats: Optional[Dict[str, Any]] = None):
+        self.kind = kind
+        self.children = children
+        self.stats = stats
+
+    def selectivity(self, stats: Optional[Dict[str, Any]]) -> float:
+        estimates = [child.selectivity(stats) for child in self.children]
+        if not estimates:
+            return 1.0 if self.kind == "and" else 0.0
+        if self.kind == "and":
+            return float(np.prod(estimates))
+        return min(1.0, float(sum(estimates)))
+
+    def evaluate(self, df: pd.DataFrame, positions: Optional[np.ndarray]) -> np.ndarray:
+        """
+        对指定行位置求值
+
+        AND组按选择性从高到低依次求值，每个条件只在前面条件保留下来的行上计算；
+        OR组按满足比例从大到小求值，每个条件只在尚未满足的行上计算。
+        没有条件的AND组全部满足，没有条件的OR组全部不满足。
+        """
+        size = len(df) if positions is None else len(positions)
+        if not self.children:
+            return np.full(size, self.kind == "and", dtype=bool)
+
+        if self.kind == "and":
+            ordered = sorted(self.children, key=lambda child: child.selectivity(self.stats))
+            alive = None
+            for child in ordered:
+                rows = positions if alive is None else (alive if positions is None else positions[alive])
+                matched = child.evaluate(df, rows)
+                alive = np.flatnonzero(matched) if alive is None else alive[matched]
+                if len(alive) == 0:
+                    break
+            mask = np.zeros(size, dtype=bool)
+            mask[alive] = True
+            return mask
+
+        ordered = sorted(self.children, key=lambda child: -child.selectivity(self.stats))
+        mask = np.zeros(size, dtype=bool)
+        for child in ordered:
+            pending = np.flatnonzero(~mask)
+            if len(pending) == 0:
+                break
+            rows = pending if positions is None else positions[pending]
+            mask[pending[child.evaluate(df, rows)]] = True
+        return mask
+
+
+class CompiledFilter:
+    """编译后的过滤条件"""
+
+    def __init__(self, root: Group):
+        self.root = root
+
+    def mask(self, df: pd.DataFrame, positions: Optional[np.ndarray] = None) -> np.ndarray:
+        """计算组合掩码"""
+        return self.root.evaluate(df, positions)
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        """筛选满足条件的行，结果只生成一次"""
+        if not self.root.children:
+            return df
+        return df.take(np.flatnonzero(self.mask(df)))
+
+
+def _compile_node(filters: Dict[str, Any], columns: Optional[pd.Index],
+                  stats: Optional[Dict[str, Any]], kind: str = "and") -> Group:
+    """将过滤条件字典编译为条件组，字典内各项以AND组合"""
+    children = []
+    for key, condition in filters.items():
+        if key in (AND_KEY, OR_KEY):
+            if not isinstance(condition, (list, tuple)):
+                raise ValueError(f"{key} 的取值需要是过滤条件列表")
+            groups = [_compile_node(group, columns, stats) for group in condition]
+            if key == OR_KEY:
+                # 条件全部被跳过的分支不能当作恒满足，否则整个 $or 组匹配全部行
+                groups = [group for group, source in zip(groups, condition) if group.children or not source]
+            children.append(Group("and" if key == AND_KEY else "or", groups, stats))
+            continue
+        if columns is not None and key not in columns:
+            logger.warning(f"过滤列 {key} 在数据中不存在，跳过")
+            continue
+        for op, value in _condition_items(condition):
+            if op not in OPERATORS:
+                logger.warning(f"不支持的过滤运算符 {op}（列 {key}），已忽略")
+                continue
+            children.append(Predicate(key, op, value))
+    return Group(kind, children, stats)
+
+
+def compile_filters(filters: Optional[Dict[str, Any]], columns: Optional[pd.Index] = None,
+                    stats: Optional[Dict[str, Any]] = None) -> CompiledFilter:
+    """
+    编译过滤条件
+
+    过滤条件格式：{列名: 取值} 表示等于，列表表示属于；{列名: {运算符: 取值, ...}}
+    中的全部运算符同时生效（例如 {'gte': 2015, 'lte': 2020}）；
+    {'$and': [条件, ...]} 和 {'$or': [条件, ...]} 可任意嵌套，顶层各项以AND组合。
+
+    Args:
+        filters: 过滤条件
+        columns: 数据的列，数据中不存在的过滤列会被跳过
+        stats: 数据集统计信息（dataset_stats 的结果），用于估计选择性
+
+    Returns:
+        编译后的过滤条件
+    """
+    return CompiledFilter(_compile_node(filters or {}, columns, stats))
+
+
+def apply_filters(df: pd.DataFrame, filters: Optional[Dict[str, Any]],
+                  stats: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+    """按过滤条件筛选行"""
+    if not filters:
+        return df
+    return compile_filters(filters, df.columns, stats).apply(df)
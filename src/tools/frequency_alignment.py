@@ -0,0 +1,254 @@
+"""
+频率对齐模块，将不同频率的宏观和行业时间序列（季度GDP、月度CPI/PPI、月度销量等）
+一次对齐到同一目标频率，支持向量化的重采样、as-of对齐和季度与月度之间的分摊，
+对齐后的面板按序列组合和目标频率缓存
+"""
+
+import json
+import logging
+import threading
+from typing import Dict, List, Any, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .filter_compiler import apply_filters, filter_columns
+
+logger = logging.getLogger(__name__)
+
+# 支持的频率，按从细到粗排列
+FREQUENCY_ORDER = {"D": 0, "M": 1, "Q": 2, "Y": 3}
+
+# 对齐方式：sum 为流量（降频求和，升频平均分摊），mean/first/last/min/max 为存量或比率
+# （降频按方式聚合，升频重复取值），asof 取每个目标期末已经可得的最新观测值
+ALIGN_METHODS = ("sum", "mean", "first", "last", "min", "max", "asof")
+
+
+def infer_frequency(times: pd.Series) -> Optional[str]:
+    """根据相邻观测的时间间隔中位数推断序列频率，观测不足两个时返回None"""
+    unique = np.unique(times.dropna().to_numpy())
+    if len(unique) < 2:
+        return None
+    days = np.median(np.diff(unique)) / np.timedelta64(1, "D")
+    if days <= 1.5:
+        return "D"
+    if days <= 31.5:
+        return "M"
+    if days <= 92.5:
+        return "Q"
+    return "Y"
+
+
+def period_ordinals(times: pd.Series, freq: str) -> np.ndarray:
+    """将时间转换为指定频率的期间序号，时间缺失的位置为NaT对应的整数"""
+    return times.dt.to_period(freq).array.asi8
+
+
+def _convert_ordinals(ordinals: np.ndarray, source: str, target: str, how: str) -> np.ndarray:
+    """将源频率的期间序号转换为目标频率中对应的首个（how='start'）或最后一个（how='end'）期间序号"""
+    periods = pd.PeriodIndex(pd.arrays.PeriodArray(ordinals, dtype=pd.PeriodDtype(source)))
+    return periods.asfreq(target, how=how).asi8
+
+
+def normalize_series(specs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    规范化序列定义
+
+    每个序列定义包含 file（数据文件）、time_col（时间列）、value_col 或 value_cols（取值列），
+    可选 how（对齐方式，默认mean）、filters（过滤条件，如 {'数据频率': 'M'}）、
+    frequency（源频率 D/M/Q/Y，默认按数据推断）和 name（单个取值列时的输出列名）。
+    """
+    normalized = []
+    for spec in specs:
+        value_cols = spec.get("value_cols") or ([spec["value_col"]] if spec.get("value_col") else [])
+        if not spec.get("file") or not spec.get("time_col") or not value_cols:
+            raise ValueError(f"序列定义需要 file、time_col 和 value_col: {spec}")
+        how = spec.get("how", "mean")
+        if how not in ALIGN_METHODS:
+            raise ValueError(f"不支持的对齐方式 {how}，仅支持: {list(ALIGN_METHODS)}")
+        frequency = spec.get("frequency")
+        if frequency is not None and frequency not in FREQUENCY_ORDER:
+            raise ValueError(f"不支持的频率 {frequency}，仅支持: {list(FREQUENCY_ORDER)}")
+        names = [spec["name"]] if spec.get("name") and len(value_cols) == 1 else list(value_cols)
+        normalized.append({
+            "file": spec["file"],
+            "time_col": spec["time_col"],
+            "value_cols": list(value_cols),
+            "names": names,
+            "how": how,
+            "filters": spec.get("filters") or None,
+            "frequency": frequency,
+        })
+
+    # 不同序列的同名列加上文件名前缀
+    counts: Dict[str, int] = {}
+    for spec in normalized:
+        for name in spec["names"]:
+            counts[name] = counts.get(name, 0) + 1
+    for spec in normalized:
+        spec["names"] = [f"{spec['file']}.{name}" if counts[name] > 1 else name for name in spec["names"]]
+    return normalized
+
+
+def align_values(times: pd.Series, values: np.ndarray, source: Optional[str], target: str,
+                 how: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    将一个序列（可含多列取值）对齐到目标频率
+
+    Args:
+        times: 观测时间（datetime64）
+        values: 形状为 (n, k) 的浮点取值
+        source: 源频率，为None时视为与目标频率相同
+        target: 目标频率
+        how: 对齐方式
+
+    Returns:
+        (目标期间序号, 形状为 (m, k) 的取值)；asof 方式返回观测值可得的期间，由调用方向后填充
+    """
+    valid = times.notna().to_numpy()
+    times, values = times[valid], values[valid]
+    order = np.argsort(times.to_numpy(), kind="stable")
+    times, values = times.iloc[order], values[order]
+    source = source or target
+
+    if FREQUENCY_ORDER[source] > FREQUENCY_ORDER[target]:
+        # 升频：每个源期间展开为其包含的全部目标期间
+        own = period_ordinals(times, source)
+        if how == "asof":
+            # 观测值在源期间结束时才可得
+            return _convert_ordinals(own, source, target, "end"), values
+        start = _convert_ordinals(own, source, target, "start")
+        counts = _convert_ordinals(own, source, target, "end") - start + 1
+        codes = np.repeat(start, counts) + (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts))
+        expanded = np.repeat(values, counts, axis=0)
+        if how == "sum":
+            expanded = expanded / np.repeat(counts, counts)[:, None]
+        return codes, expanded
+
+    codes = period_ordinals(times, target)
+    grouped = pd.DataFrame(values).groupby(codes, sort=True)
+    result = grouped.last() if how == "asof" else grouped.agg(how)
+    if how == "sum":
+        # 期间内全部为缺失值时保持缺失，不记为0
+        result = result.where(grouped.count() > 0)
+    return result.index.to_numpy(dtype=np.int64), result.to_numpy(dtype=np.float64)
+
+
+class FrequencyAligner:
+    """
+    多序列频率对齐工具
+
+    对齐结果以目标频率的期间为索引、各序列为列，缓存键为序列组合、目标频率和时间范围，
+    相关数据集的版本号变化（追加新行、源文件变化）后重新计算。
+    """
+
+    def __init__(self, data_loader: Any):
+        """
+        初始化频率对齐工具
+
+        Args:
+            data_loader: MappedDataLoader 实例
+        """
+        self.data_loader = data_loader
+        self._cache: Dict[str, Tuple[Tuple[Any, ...], pd.DataFrame]] = {}
+        self._lock = threading.Lock()
+
+    def _versions(self, specs: List[Dict[str, Any]]) -> Optional[Tuple[Any, ...]]:
+        """各序列所在数据集的版本号，无法获取时返回None（不缓存）"""
+        get_version = getattr(self.data_loader, "get_dataset_version", None)
+        if get_version is None:
+            return None
+        versions = tuple(get_version(spec["file"]) for spec in specs)
+        return None if None in versions else versions
+
+    def _load_series(self, spec: Dict[str, Any]) -> Tuple[pd.Series, np.ndarray]:
+        """加载一个序列的时间和取值，应用过滤条件"""
+        columns = list(dict.fromkeys([spec["time_col"]] + spec["value_cols"] + filter_columns(spec["filters"])))
+        df = self.data_loader.load_data(spec["file"], columns=columns)
+        missing = [col for col in [spec["time_col"]] + spec["value_cols"] if col not in df.columns]
+        if missing:
+            raise ValueError(f"数据文件 {spec['file']} 中不存在列: {missing}")
+        if spec["filters"]:
+            df = apply_filters(df, spec["filters"])
+
+        parsed = self.data_loader.get_datetime_column(spec["file"], spec["time_col"])
+        if parsed is None:
+            parsed = pd.to_datetime(df[spec["time_col"]], errors="coerce")
+        times = parsed.loc[df.index]
+        values = df[spec["value_cols"]].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64)
+        return times, values
+
+    def align(self, series: List[Dict[str, Any]], target_freq: str = "M",
+              start: Optional[Any] = None, end: Optional[Any] = None) -> pd.DataFrame:
+        """
+        将多个序列对齐到同一频率
+
+        Args:
+            series: 序列定义列表，格式见 normalize_series
+            target_freq: 目标频率，D/M/Q/Y
+            start: 起始时间（包含其所在期间），为None时从最早的观测开始
+            end: 结束时间（包含其所在期间），为None时到最晚的观测结束
+
+        Returns:
+            以目标频率期间（PeriodIndex）为索引、各序列取值为列的面板
+        """
+        if target_freq not in FREQUENCY_ORDER:
+            raise ValueError(f"不支持的目标频率 {target_freq}，仅支持: {list(FREQUENCY_ORDER)}")
+        specs = normalize_series(series)
+        key = json.dumps([specs, target_freq, None if start is None else str(start),
+                          None if end is None else str(end)], ensure_ascii=False, sort_keys=True)
+        versions = self._versions(specs)
+        with self._lock:
+            cached = self._cache.get(key)
+        if cached is not None and versions is not None and cached[0] == versions:
+            logger.info(f"从缓存中获取对齐面板: {[spec['file'] for spec in specs]} -> {target_freq}")
+            return cached[1].copy(deep=False)
+
+        aligned = []
+        for spec in specs:
+            times, values = self._load_series(spec)
+            source = spec["frequency"] or infer_frequency(times)
+            codes, rows = align_values(times, values, source, target_freq, spec["how"])
+            aligned.append((spec, codes, rows))
+
+        panel = self._assemble(aligned, target_freq, start, end)
+        # 首次对齐时数据集才完成摄取，按加载后的版本号缓存；加载期间版本变化时不缓存
+        loaded_versions = self._versions(specs)
+        if loaded_versions is not None and versions in (None, loaded_versions):
+            with self._lock:
+                self._cache[key] = (loaded_versions, panel)
+        logger.info(f"已对齐 {len(specs)} 个序列到频率 {target_freq}，面板形状: {panel.shape}")
+        return panel.copy(deep=False)
+
+    @staticmethod
+    def _assemble(aligned: List[Tuple[Dict[str, Any], np.ndarray, np.ndarray]], target_freq: str,
+                  start: Optional[Any], end: Optional[Any]) -> pd.DataFrame:
+        """将各序列的期间序号和取值放入统一的期间网格"""
+        names = [name for spec, _, _ in aligned for name in spec["names"]]
+        observed = [codes for _, codes, _ in aligned if len(codes)]
+        if not observed:
+            return pd.DataFrame(columns=names, index=pd.PeriodIndex([], freq=target_freq, name="period"))
+        lower = min(int(codes.min()) for codes in observed)
+        upper = max(int(codes.max()) for codes in observed)
+        if start is not None:
+            lower = pd.Period(pd.Timestamp(start), freq=target_freq).ordinal
+        if end is not None:
+            upper = pd.Period(pd.Timestamp(end), freq=target_freq).ordinal
+        grid = np.arange(lower, max(lower, upper + 1), dtype=np.int64)
+
+        columns = {}
+        for spec, codes, rows in aligned:
+            block = np.full((len(grid), len(spec["names"])), np.nan)
+            if spec["how"] == "asof":
+                # 每个期间取期末已可得的最新观测值，包括网格起点之前的观测
+                position = np.searchsorted(codes, grid, side="right") - 1
+                has_value = position >= 0
+                block[has_value] = rows[position[has_value]]
+            else:
+                inside = (codes >= lower) & (codes <= upper)
+                block[codes[inside] - lower] = rows[inside]
+            for i, name in enumerate(spec["names"]):
+                columns[name] = block[:, i]
+
+        index = pd.PeriodIndex(pd.arrays.PeriodArray(grid, dtype=pd.PeriodDtype(target_freq)), name="period")
+        return pd.DataFrame(columns, index=index)
@@ -0,0 +1,458 @@
+"""
+数据摄取缓存模块，将解析后的数据文件以列式格式（Parquet）持久化到本地缓存目录
+"""
+
+import os
+import json
+import hashlib
+import logging
+from pathlib import Path
+from typing import Dict, List, Any, Iterator, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 清单格式版本，结构变化时递增以使旧缓存失效
+MANIFEST_VERSION = 1
+
+# 增量分片数量超过该值时合并进主副本
+MAX_DELTA_PARTS = 16
+
+
+class IngestCache:
+    """列式摄取缓存，按源文件路径、大小、修改时间和内容哈希管理缓存副本"""
+
+    def __init__(self, cache_dir: str = ".cache/data"):
+        """
+        初始化摄取缓存，缓存目录在首次写入时创建
+
+        Args:
+            cache_dir: 缓存目录路径
+        """
+        self.cache_dir = Path(cache_dir)
+
+    def _entry_id(self, source_path: Path) -> str:
+        """根据源文件的规范路径生成缓存条目ID"""
+        canonical = str(Path(source_path).resolve())
+        return hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:20]
+
+    def manifest_path(self, source_path: Path) -> Path:
+        """获取源文件对应的清单文件路径"""
+        return self.cache_dir / f"{self._entry_id(source_path)}.json"
+
+    def data_path(self, source_path: Path) -> Path:
+        """获取源文件对应的列式数据文件路径"""
+        return self.cache_dir / f"{self._entry_id(source_path)}.parquet"
+
+    def part_path(self, source_path: Path, version: int) -> Path:
+        """获取追加数据对应的增量分片路径"""
+        return self.cache_dir / f"{self._entry_id(source_path)}.v{version}.parquet"
+
+    @staticmethod
+    def file_signature(source_path: Path) -> Dict[str, int]:
+        """获取文件签名（大小和修改时间）"""
+        stat = os.stat(source_path)
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    @staticmethod
+    def content_hash(source_path: Path, chunk_size: int = 1 << 20) -> str:
+        """流式计算文件内容哈希"""
+        digest = hashlib.sha1()
+        with open(source_path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def prefix_and_content_hash(source_path: Path, prefix_size: int, total_size: int,
+                                chunk_size: int = 1 << 20) -> Dict[str, Any]:
+        """
+        一次读取同时计算文件前 prefix_size 字节和前 total_size 字节的内容哈希
+
+        Returns:
+            包含 prefix_hash、content_hash 和 prefix_ends_with_newline 的字典
+        """
+        digest = hashlib.sha1()
+        last_byte = b""
+        position = 0
+        prefix_hash = None
+        with open(source_path, "rb") as f:
+            for limit in (prefix_size, total_size):
+                while position < limit:
+                    chunk = f.read(min(chunk_size, limit - position))
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    position += len(chunk)
+                    last_byte = chunk[-1:]
+                if prefix_hash is None:
+                    prefix_hash = digest.copy().hexdigest()
+                    prefix_last_byte = last_byte
+        return {
+            "prefix_hash": prefix_hash,
+            "content_hash": digest.hexdigest(),
+            "prefix_ends_with_newline": prefix_last_byte == b"\n"
+        }
+
+    def load_manifest(self, source_path: Path) -> Optional[Dict[str, Any]]:
+        """读取源文件的清单，不存在或格式过期时返回None"""
+        manifest_file = self.manifest_path(source_path)
+        if not manifest_file.exists():
+            return None
+        try:
+            with open(manifest_file, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取缓存清单失败: {manifest_file}, 错误: {str(e)}")
+            return None
+        if manifest.get("manifest_version") != MANIFEST_VERSION:
+            return None
+        return manifest
+
+    def save_manifest(self, source_path: Path, manifest: Dict[str, Any]) -> None:
+        """原子地写入源文件的清单"""
+        manifest_file = self.manifest_path(source_path)
+        manifest["manifest_version"] = MANIFEST_VERSION
+        tmp_file = manifest_file.with_suffix(f".json.{os.getpid()}.tmp")
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2, default=str)
+        os.replace(tmp_file, manifest_file)
+
+    def validate(self, source_path: Path) -> Optional[Dict[str, Any]]:
+        """
+        校验缓存清单是否仍与源文件一致
+
+        大小和修改时间一致时直接视为有效；否则重新计算内容哈希，
+        内容未变（例如仅被touch）时刷新签名后继续使用缓存。
+
+        Returns:
+            有效的清单，源文件已变化时返回None
+        """
+        manifest = self.load_manifest(source_path)
+        if manifest is None:
+            return None
+
+        signature = self.file_signature(source_path)
+        if (signature["size"] == manifest.get("size")
+                and signature["mtime_ns"] == manifest.get("mtime_ns")):
+            return manifest
+
+        if signature["size"] == manifest.get("size") and \
+                self.content_hash(source_path) == manifest.get("content_hash"):
+            manifest.update(signature)
+            self.save_manifest(source_path, manifest)
+            logger.info(f"源文件内容未变化，刷新缓存签名: {source_path}")
+            return manifest
+
+        logger.info(f"源文件已变化，缓存失效: {source_path}")
+        return None
+
+    def update_manifest(self, source_path: Path, fields: Dict[str, Any],
+                        signature: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+        """
+        更新源文件清单中的字段
+
+        清单缺失或源文件已变化时会基于当前文件重建清单，旧字段随之丢弃，
+        旧的列式副本和增量分片一并删除，数据版本号在旧清单的基础上递增。
+
+        Args:
+            source_path: 源文件路径
+            fields: 要写入的字段
+            signature: 解析前获取的文件签名
+
+        Returns:
+            更新后的清单
+        """
+        manifest = self.validate(source_path)
+        if manifest is None:
+            previous = self.load_manifest(source_path)
+            # 旧副本对应变化前的内容，保留会使之后的部分列写入合并进过期的列
+            self.data_path(source_path).unlink(missing_ok=True)
+            self._remove_parts((previous or {}).get("parts", []))
+            manifest = self._new_manifest(source_path, previous, signature)
+        manifest.update(fields)
+        self.save_manifest(source_path, manifest)
+        return manifest
+
+    def _new_manifest(self, source_path: Path, previous: Optional[Dict[str, Any]],
+                      signature: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+        """基于当前文件新建清单，数据版本号在旧清单的基础上递增"""
+        version = (previous or {}).get("version", 0) + 1
+        return {
+            "source_path": str(Path(source_path).resolve()),
+            "content_hash": self.content_hash(source_path),
+            **(signature or self.file_signature(source_path)),
+            "version": version,
+            "base_version": version,
+            "parts": []
+        }
+
+    def transcoded_path(self, source_path: Path) -> Path:
+        """获取源文件UTF-8转码副本的路径"""
+        return self.cache_dir / f"{self._entry_id(source_path)}.utf8{Path(source_path).suffix}"
+
+    def lookup(self, source_path: Path, columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+        """
+        读取源文件的列式缓存副本
+
+        Args:
+            source_path: 源文件路径
+            columns: 需要的列，为None时需要全部列
+
+        Returns:
+            缓存数据；指定列时只返回缓存中已有的那部分列。
+            缓存缺失、失效、不完整或不含任何所需列时返回None
+        """
+        manifest = self.validate(source_path)
+        if manifest is None:
+            return None
+
+        if not self.data_path(source_path).exists():
+            return None
+
+        if columns is None:
+            if not manifest.get("complete", False):
+                return None
+            read_columns = None
+        else:
+            stored = set(manifest.get("columns", []))
+            read_columns = [col for col in columns if col in stored]
+            if not read_columns:
+                return None
+        return self._read_stored(source_path, manifest, read_columns)
+
+    def data_files(self, source_path: Path, manifest: Dict[str, Any]) -> List[Path]:
+        """主副本及其后追加的各增量分片，按行顺序排列"""
+        return [self.data_path(source_path)] + [self.cache_dir / part["file"]
+                                                 for part in manifest.get("parts", [])]
+
+    def _read_stored(self, source_path: Path, manifest: Dict[str, Any],
+                     columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+        """读取主副本和全部增量分片并按行拼接"""
+        frames = []
+        for data_file in self.data_files(source_path, manifest):
+            try:
+                frames.append(pd.read_parquet(data_file, columns=columns))
+            except Exception as e:
+                logger.warning(f"读取列式缓存失败: {data_file}, 错误: {str(e)}")
+                return None
+        if len(frames) == 1:
+            return frames[0]
+        return pd.concat(frames, ignore_index=True)
+
+    def iter_batches(self, source_path: Path, columns: Optional[List[str]] = None,
+                     batch_size: int = 100_000) -> Optional[Iterator[pd.DataFrame]]:
+        """
+        按批次流式读取列式缓存副本
+
+        Returns:
+            批次迭代器；缓存缺失、失效或不包含全部所需列时返回None
+        """
+        manifest = self.validate(source_path)
+        if manifest is None or not self.data_path(source_path).exists():
+            return None
+        if columns is None:
+            if not manifest.get("complete", False):
+                return None
+        elif not set(columns) <= set(manifest.get("columns", [])):
+            return None
+
+        import pyarrow.parquet as pq
+
+        def batches() -> Iterator[pd.DataFrame]:
+            for data_file in self.data_files(source_path, manifest):
+                parquet_file = pq.ParquetFile(data_file)
+                for batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+                    yield batch.to_pandas()
+
+        return batches()
+
+    def store(self, source_path: Path, df: pd.DataFrame,
+              signature: Optional[Dict[str, int]] = None, complete: bool = True,
+              content_hash: Optional[str] = None) -> bool:
+        """
+        写入源文件的列式缓存副本及清单
+
+        写入部分列时，只有已有清单的内容哈希和签名与解析前获取的一致，新列才会合并进已有副本，
+        否则已有副本可能对应变化前的内容，直接以新列覆盖。
+        写入的数据覆盖全部行，已有的增量分片随之合并进主副本。
+
+        Args:
+            source_path: 源文件路径
+            df: 解析后的数据
+            signature: 解析前获取的文件签名，避免解析期间文件变化导致缓存错配
+            complete: df是否包含源文件的全部列
+            content_hash: 解析前有效清单中的内容哈希，为None时不与已有副本合并
+
+        Returns:
+            是否写入成功
+        """
+        signature = signature or self.file_signature(source_path)
+        data_file = self.data_path(source_path)
+        previous = self.load_manifest(source_path)
+
+        if not complete and content_hash is not None:
+            manifest = self.validate(source_path)
+            if manifest is not None and data_file.exists() \
+                    and manifest.get("content_hash") == content_hash \
+                    and manifest.get("size") == signature["size"] \
+                    and manifest.get("mtime_ns") == signature["mtime_ns"]:
+                existing = self._read_stored(source_path, manifest)
+                if existing is not None and len(existing) == len(df):
+                    new_columns = [col for col in df.columns if col not in existing.columns]
+                    df = pd.concat([existing, df[new_columns]], axis=1)
+                    complete = manifest.get("complete", False)
+
+        tmp_file = data_file.with_suffix(f".parquet.{os.getpid()}.tmp")
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            df.to_parquet(tmp_file, index=False)
+            os.replace(tmp_file, data_file)
+        except Exception as e:
+            logger.warning(f"写入列式缓存失败: {source_path}, 错误: {str(e)}")
+            if tmp_file.exists():
+                tmp_file.unlink()
+            return False
+
+        # 副本刚刚写入，清单失效时直接新建，不能经由 update_manifest 删除副本
+        manifest = self.validate(source_path)
+        if manifest is None:
+            manifest = self._new_manifest(source_path, previous, signature)
+        manifest.update({
+            "rows": int(len(df)),
+            "columns": [str(col) for col in df.columns],
+            "complete": complete,
+            "parts": []
+        })
+        manifest["base_version"] = manifest["version"]
+        self.save_manifest(source_path, manifest)
+        self._remove_parts((previous or {}).get("parts", []))
+        logger.info(f"已写入列式缓存: {source_path} -> {data_file.name}")
+        return True
+
+    def _remove_parts(self, parts: List[Dict[str, Any]]) -> None:
+        """删除不再被清单引用的增量分片"""
+        for part in parts:
+            (self.cache_dir / part["file"]).unlink(missing_ok=True)
+
+    def detect_append(self, source_path: Path) -> Optional[Dict[str, Any]]:
+        """
+        检测源文件自上次摄取后是否只在末尾追加了内容
+
+        文件变大、旧内容以完整行结束，且前缀（旧文件长度的字节）的哈希与清单中
+        记录的内容哈希一致时，视为仅追加。
+
+        Returns:
+            追加信息（旧清单、新内容的起始字节偏移、当前签名和内容哈希）；
+            文件未变化、不是仅追加或没有可用的清单时返回None
+        """
+        manifest = self.load_manifest(source_path)
+        if manifest is None or not self.data_path(source_path).exists():
+            return None
+        offset = manifest.get("size")
+        signature = self.file_signature(source_path)
+        if not offset or signature["size"] <= offset:
+            return None
+
+        hashes = self.prefix_and_content_hash(source_path, offset, signature["size"])
+        if hashes["prefix_hash"] != manifest.get("content_hash") or not hashes["prefix_ends_with_newline"]:
+            return None
+        return {
+            "manifest": manifest,
+            "offset": offset,
+            "signature": signature,
+            "content_hash": hashes["content_hash"]
+        }
+
+    def append(self, source_path: Path, tail: pd.DataFrame, growth: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        将新追加的行写为增量分片并更新清单
+
+        数据版本号加一；统计信息随之失效，转码副本需要重新生成。
+        增量分片数量超过 MAX_DELTA_PARTS 时合并进主副本。
+
+        Args:
+            source_path: 源文件路径
+            tail: 新追加的行，列与已缓存的列一致
+            growth: detect_append 返回的追加信息
+
+        Returns:
+            更新后的清单
+        """
+        manifest = dict(growth["manifest"])
+        version = manifest.get("version", 1) + 1
+        part_file = self.part_path(source_path, version)
+        tmp_file = part_file.with_suffix(f".parquet.{os.getpid()}.tmp")
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tail.to_parquet(tmp_file, index=False)
+        os.replace(tmp_file, part_file)
+
+        manifest.update(growth["signature"])
+        manifest.pop("stats", None)
+        manifest.update({
+            "content_hash": growth["content_hash"],
+            "rows": manifest.get("rows", 0) + int(len(tail)),
+            "version": version,
+            "transcoded": False,
+            "parts": manifest.get("parts", []) + [{
+                "file": part_file.name,
+                "version": version,
+                "start_row": manifest.get("rows", 0),
+                "rows": int(len(tail))
+            }]
+        })
+        manifest.setdefault("base_version", version - 1)
+        self.save_manifest(source_path, manifest)
+        logger.info(f"已追加 {len(tail)} 行到列式缓存: {source_path}, 版本 {version}")
+
+        if len(manifest["parts"]) > MAX_DELTA_PARTS:
+            self.compact_parts(source_path)
+            manifest = self.load_manifest(source_path)
+        return manifest
+
+    def compact_parts(self, source_path: Path) -> bool:
+        """将增量分片合并进主副本，之前版本的增量随之不可再查询"""
+        manifest = self.validate(source_path)
+        if manifest is None or not manifest.get("parts"):
+            return False
+        df = self._read_stored(source_path, manifest)
+        if df is None:
+            return False
+        return self.store(source_path, df, signature={"size": manifest["size"], "mtime_ns": manifest["mtime_ns"]},
+                          complete=manifest.get("complete", False))
+
+    def changes_since(self, source_path: Path, version: int,
+                      columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+        """
+        获取指定版本之后追加的行
+
+        Args:
+            source_path: 源文件路径
+            version: 调用方已有数据对应的版本号
+            columns: 需要的列，为None时返回已缓存的全部列
+
+        Returns:
+            追加的行，索引为行在源文件中的位置；调用方已是最新版本时返回空数据。
+            该版本之后源文件发生过非追加的变化、增量已合并或缓存失效时返回None，调用方需要全量重新加载
+        """
+        manifest = self.validate(source_path)
+        if manifest is None or version < manifest.get("base_version", manifest.get("version", 0)):
+            return None
+        parts = [part for part in manifest.get("parts", []) if part["version"] > version]
+        if columns is not None:
+            columns = [col for col in columns if col in manifest.get("columns", [])]
+        if not parts:
+            return pd.DataFrame(columns=columns if columns is not None else manifest.get("columns", []))
+
+        frames = []
+        for part in parts:
+            try:
+                frame = pd.read_parquet(self.cache_dir / part["file"], columns=columns)
+            except Exception as e:
+                logger.warning(f"读取增量分片失败: {part['file']}, 错误: {str(e)}")
+                return None
+            frame.index = pd.RangeIndex(part["start_row"], part["start_row"] + part["rows"])
+            frames.append(frame)
+        return pd.concat(frames)
@@ -1,22 +1,141 @@
+import io
 import os
+import json
+import hashlib
+import time
+import threading
 import pandas as pd
 import numpy as np
 import yaml
-from typing import Dict, List, Optional, Union, Any
+from typing import Dict, List, Optional, Union, Any, Tuple, Iterator
 import logging
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+from .ingest_cache import IngestCache
+from .data_cache import DataCache
+from .file_index import FileIndex
+from .dtype_compaction import compact_dtypes
+from .time_columns import infer_datetime_format, parse_datetime, SortedTimeView
+from .shared_store import SharedDatasetStore
+from .column_store import ColumnStore
+from .partitioned_store import PartitionedStore, DEFAULT_BUCKETS, year_of
+from .secondary_index import IndexSet, OPERATOR_INDEX
+from .filter_compiler import apply_filters, compile_filters, column_conditions, filter_columns
+from .dataset_stats import (
+    compute_dataset_stats, data_info_from_stats, data_summary_from_stats, select_columns
+)
+from .encoding_detector import detect_encoding, fallback_encoding, transcode_to_utf8
+from .streaming_aggregates import GroupedAggregator
+from .rollup_cubes import RollupCube, RollupStore, cube_key, covers
+from .sql_engine import SQLEngine, SQLParams
+from .frequency_alignment import FrequencyAligner
+from .entity_index import EntityIndex
+from .correlation_service import CorrelationService, find_high_correlations
+from .ratio_engine import RatioStore, compute_ratios, definitions_key, normalize_definitions, source_columns
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 默认的磁盘缓存目录，位于项目根目录下，与进程的工作目录无关
+DEFAULT_CACHE_DIR = str(Path(__file__).resolve().parents[2] / ".cache" / "data")
+
+def _load_as_arrow(loader_config: Dict[str, Any], file_name: str) -> Tuple[bytes, bool]:
+    """
+    在子进程中加载数据文件，并以Arrow IPC格式返回
+    
+    Args:
+        loader_config: 构造 MappedDataLoader 的参数
+        file_name: 逻辑文件名或实际文件名
+        
+    Returns:
+        (Arrow IPC字节串, 是否包含全部列)
+    """
+    import pyarrow as pa
+    
+    loader = MappedDataLoader(**loader_config)
+    df = loader.load_data(file_name)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes(), loader._requested_columns(file_name, None) is None
+
+
 class MappedDataLoader:
     """数据加载器，支持文件名映射，负责加载和管理各种数据源"""
     
-    def __init__(self, data_root_path: str = "data", mapping_config_path: str = "config/data_mapping.yaml"):
+    def __init__(self, data_root_path: str = "data", mapping_config_path: str = "config/data_mapping.yaml",
+                 cache_dir: Optional[str] = DEFAULT_CACHE_DIR, transcode_sources: bool = False,
+                 cache_max_bytes: Optional[int] = None, cache_policy: str = "lru",
+                 pinned_files: Optional[List[str]] = None, compact: bool = False,
+                 float32: bool = False, shared_store: Optional[SharedDatasetStore] = None):
+        """
+        初始化数据加载器
+        
+        Args:
+            data_root_path: 数据根目录
+            mapping_config_path: 文件映射配置路径
+            cache_dir: 列式摄取缓存目录，为None时禁用磁盘缓存；默认位于项目根目录下，
+                各类缓存的子目录在首次写入时创建
+            transcode_sources: 是否在摄取时将非UTF-8编码的CSV一次性转码为UTF-8副本
+            cache_max_bytes: 内存数据缓存的字节预算，为None时不限制
+            cache_policy: 内存数据缓存的淘汰策略，'lru' 或 'lfu'
+            pinned_files: 固定在内存缓存中、不会被淘汰的数据文件
+            compact: 是否在加载后压缩数据类型（数值降级、低基数字符串转为分类类型）
+            float32: 压缩时是否将所有float64列降级为float32
+            shared_store: 跨进程共享的数据集存储，加载时优先连接其他进程已发布的数据
+        """
         self.data_root_path = Path(data_root_path)
-        self.data_cache = {}
+        self.mapping_config_path = mapping_config_path
+        self.cache_dir = cache_dir
+        self.file_index = FileIndex(self.data_root_path)
+        # 内存缓存以规范物理路径和加载参数为键，逻辑文件名作为别名指向同一条目
+        self.data_cache = DataCache(max_bytes=cache_max_bytes, policy=cache_policy,
+                                    on_evict=self._on_cache_evict)
+        self._cache_aliases = {}
+        self._pinned_aliases = set(pinned_files or [])
         self.file_mapping = {}
+        self.transcode_sources = transcode_sources
+        self.compact = compact
+        self.float32 = float32
+        self.shared_store = shared_store
+        # 已加载全部列的缓存条目，以及各源文件的表头列名
+        self._complete_entries = set()
+        self._source_columns_cache = {}
+        # 各源文件时间列的格式，以及已解析的datetime列（按缓存键存放，不写回缓存数据）
+        self._time_formats = {}
+        self._datetime_columns = {}
+        # 按时间列排序的数据视图，键为缓存键，值为时间列到视图的映射
+        self._time_views = {}
+        # 按物理文件加锁，避免并行预加载时重复解析同一文件或并发写入同一缓存副本
+        self._file_locks = {}
+        self._file_locks_guard = threading.Lock()
+        # 源文件追加新行时的回调
+        self._append_listeners = []
+        # 各缓存条目的二级索引
+        self._index_sets = {}
+        # 已加载的汇总立方体，键为 (规范物理路径, 立方体键)
+        self._rollup_cubes = {}
+        
+        # 初始化列式摄取缓存
+        self.ingest_cache = None
+        self.column_store = None
+        self.partition_store = None
+        self.ratio_store = None
+        self.rollup_store = None
+        if cache_dir:
+            self.ingest_cache = IngestCache(cache_dir)
+            self.column_store = ColumnStore(os.path.join(cache_dir, "columns"))
+            self.partition_store = PartitionedStore(os.path.join(cache_dir, "partitions"))
+            self.ratio_store = RatioStore(os.path.join(cache_dir, "ratios"))
+            self.rollup_store = RollupStore(os.path.join(cache_dir, "rollups"))
+        # 跨文件的实体索引，行位置按数据集版本号校验，只有启用磁盘缓存时才持久化
+        self.entity_index = EntityIndex(
+            self, os.path.join(cache_dir, "entities") if self.ingest_cache is not None else None)
+        # 数据查询、数据分析和图表生成共用的相关性矩阵缓存
+        self.correlations = CorrelationService(self)
         
         # 加载文件映射配置
         try:
@@ -28,103 +147,1223 @@ class MappedDataLoader:
             # 使用空映射，继续运行
             self.file_mapping = {}
         
+    def _on_cache_evict(self, key: str) -> None:
+        """内存缓存淘汰条目时清理相关状态"""
+        self._complete_entries.discard(key)
+        self._datetime_columns.pop(key, None)
+        self._time_views.pop(key, None)
+        self._index_sets.pop(key, None)
+    
+    def pin_dataset(self, file_name: str) -> None:
+        """将数据文件固定在内存缓存中，可在加载前调用"""
+        self._pinned_aliases.add(file_name)
+        for (alias, _), cache_key in self._cache_aliases.items():
+            if alias == file_name:
+                self.data_cache.pin(cache_key)
+    
+    def unpin_dataset(self, file_name: str) -> None:
+        """取消固定数据文件"""
+        self._pinned_aliases.discard(file_name)
+        for (alias, _), cache_key in list(self._cache_aliases.items()):
+            if alias == file_name:
+                self.data_cache.unpin(cache_key)
+    
+    @staticmethod
+    def _options_key(kwargs: Dict[str, Any]) -> str:
+        """将加载参数规范化为缓存键的一部分"""
+        if not kwargs:
+            return ""
+        return repr(sorted((key, repr(value)) for key, value in kwargs.items()))
+    
+    def _cache_key(self, file_name: str, actual_file_name: str, kwargs: Dict[str, Any]) -> Tuple[str, Path]:
+        """
+        获取逻辑文件名对应的内存缓存键
+        
+        多个逻辑名映射到同一物理文件时共享同一缓存条目。
+        
+        Returns:
+            (缓存键, 实际文件路径)
+        """
+        alias_key = (file_name, self._options_key(kwargs))
+        cached_key = self._cache_aliases.get(alias_key)
+        if cached_key is not None:
+            return cached_key
+        
+        file_path = self._locate_file(actual_file_name)
+        cache_key = str(file_path.resolve())
+        if alias_key[1]:
+            cache_key = f"{cache_key}|{alias_key[1]}"
+        self._cache_aliases[alias_key] = (cache_key, file_path)
+        if file_name in self._pinned_aliases:
+            self.data_cache.pin(cache_key)
+        return cache_key, file_path
+    
+    def _file_lock(self, file_path: Path) -> threading.RLock:
+        """获取物理文件对应的锁"""
+        key = str(Path(file_path).resolve())
+        with self._file_locks_guard:
+            lock = self._file_locks.get(key)
+            if lock is None:
+                lock = self._file_locks[key] = threading.RLock()
+            return lock
+    
+    def _cache_hit(self, cached: Optional[pd.DataFrame], cache_key: str,
+                   wanted: Optional[List[str]]) -> Optional[pd.DataFrame]:
+        """缓存数据满足请求时返回投影结果，否则返回None"""
+        if cached is None:
+            return None
+        if wanted is None:
+            return cached if cache_key in self._complete_entries else None
+        if all(col in cached.columns for col in wanted):
+            return self._project(cached, wanted)
+        return None
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """获取内存数据缓存的统计信息（命中、未命中、淘汰次数及各条目占用）"""
+        return self.data_cache.stats()
+    
     def _resolve_file_name(self, logical_name: str) -> str:
         """将逻辑文件名解析为实际文件名"""
         # 如果逻辑文件名在映射中，返回实际文件名
         if logical_name in self.file_mapping:
             return self.file_mapping[logical_name]["actual_file"]
         
-        # 如果逻辑文件名是实际存在的文件，直接返回
-        actual_path = self.data_root_path / logical_name
-        if actual_path.exists():
-            return logical_name
-            
-        # 尝试在数据目录中查找匹配的文件
-        for file_path in self.data_root_path.glob("*.csv"):
-            if logical_name.lower() in file_path.name.lower():
-                logger.info(f"找到匹配文件: {file_path.name} (逻辑名: {logical_name})")
-                return file_path.name
+        # 带子目录的路径不在索引中，直接检查文件是否存在
+        if os.sep in logical_name or "/" in logical_name:
+            if (self.data_root_path / logical_name).exists():
+                return logical_name
+        else:
+            # 通过文件索引进行精确、忽略大小写和子串匹配
+            match = self.file_index.resolve(logical_name)
+            if match is not None:
+                if match != logical_name:
+                    logger.info(f"找到匹配文件: {match} (逻辑名: {logical_name})")
+                return match
         
         # 如果找不到，返回原始名称
         logger.warning(f"无法找到逻辑文件名 {logical_name} 对应的实际文件，返回原始名称")
         return logical_name
         
-    def load_data(self, file_name: str, **kwargs) -> pd.DataFrame:
-        """加载指定的数据文件"""
-        # 解析实际文件名
-        actual_file_name = self._resolve_file_name(file_name)
+    def _locate_file(self, actual_file_name: str) -> Path:
+        """定位实际文件路径，数据根目录中不存在时尝试备选位置"""
         file_path = self.data_root_path / actual_file_name
+        if file_path.exists():
+            return file_path
         
-        if file_name in self.data_cache:
-            logger.info(f"从缓存中加载数据: {file_name} -> {actual_file_name}")
-            return self.data_cache[file_name]
+        logger.error(f"数据文件不存在: {file_path}")
+        
+        # 尝试在备选位置查找文件
+        alternative_paths = [
+            Path("../data") / actual_file_name,  # 上级目录的data文件夹
+            Path("../../数据") / actual_file_name,  # 上上级目录的"数据"文件夹
+            Path("data") / actual_file_name,  # 当前目录的data文件夹
+        ]
+        
+        for alt_path in alternative_paths:
+            if alt_path.exists():
+                logger.info(f"在备选位置找到文件: {alt_path}")
+                return alt_path
+        
+        # 提供更详细的错误信息
+        error_msg = f"数据文件不存在: {file_path}\n"
+        error_msg += f"已尝试的备选位置:\n"
+        for alt_path in alternative_paths:
+            error_msg += f"  - {alt_path}\n"
+        error_msg += f"\n请确保数据文件已正确放置，或检查DATA_ROOT_PATH配置。\n"
+        error_msg += f"当前DATA_ROOT_PATH配置为: {self.data_root_path}"
+        
+        raise FileNotFoundError(error_msg)
+    
+    def _read_source(self, file_path: Path, file_name: str, actual_file_name: str, **kwargs) -> pd.DataFrame:
+        """解析源数据文件"""
+        if file_name.endswith('.csv') or actual_file_name.endswith('.csv'):
+            read_path, encoding = self._resolve_csv_source(file_path)
+            try:
+                df = pd.read_csv(read_path, encoding=encoding, **kwargs)
+            except UnicodeDecodeError:
+                # 样本之外出现无法解码的字节，改用后备编码重新解析一次
+                retry_encoding = fallback_encoding(encoding)
+                logger.warning(f"{encoding} 编码解析失败，改用 {retry_encoding}: {actual_file_name}")
+                try:
+                    df = pd.read_csv(read_path, encoding=retry_encoding, **kwargs)
+                except UnicodeDecodeError:
+                    raise ValueError(f"无法使用任何编码读取文件: {file_path}")
+                encoding = retry_encoding
+                self._remember_encoding(file_path, encoding)
+            logger.info(f"使用 {encoding} 编码成功加载数据: {actual_file_name}")
+            return df
+        elif file_name.endswith('.xlsx') or file_name.endswith('.xls') or actual_file_name.endswith('.xlsx') or actual_file_name.endswith('.xls'):
+            return pd.read_excel(file_path, **kwargs)
+        else:
+            raise ValueError(f"不支持的文件格式: {file_name}")
+    
+    def _resolve_csv_source(self, file_path: Path) -> Tuple[Path, str]:
+        """
+        确定CSV文件的实际读取路径和编码
+        
+        优先使用清单中记录的编码；没有记录时从字节样本探测一次并写入清单。
+        开启转码时，非UTF-8文件会在首次摄取时生成UTF-8副本，之后直接读取副本。
+        """
+        manifest = self.ingest_cache.validate(file_path) if self.ingest_cache else None
+        
+        encoding = manifest.get("encoding") if manifest else None
+        if encoding is None:
+            encoding = detect_encoding(file_path)
+            logger.info(f"探测到文件编码 {encoding}: {file_path.name}")
+            manifest = self._remember_encoding(file_path, encoding)
         
-        # 检查文件是否存在
-        if not file_path.exists():
-            logger.error(f"数据文件不存在: {file_path}")
+        if encoding.startswith("utf-8") or not self.transcode_sources:
+            return file_path, encoding
+        
+        if self.ingest_cache is None:
+            logger.warning(f"未启用缓存目录，跳过UTF-8转码: {file_path.name}")
+            return file_path, encoding
+        
+        transcoded_path = self.ingest_cache.transcoded_path(file_path)
+        if not (manifest and manifest.get("transcoded") and transcoded_path.exists()):
+            try:
+                transcode_to_utf8(file_path, transcoded_path, encoding)
+            except UnicodeDecodeError:
+                encoding = fallback_encoding(encoding)
+                logger.warning(f"转码失败，改用 {encoding} 重新转码: {file_path.name}")
+                transcode_to_utf8(file_path, transcoded_path, encoding)
+            self.ingest_cache.update_manifest(file_path, {"encoding": encoding, "transcoded": True})
+        return transcoded_path, "utf-8"
+    
+    def _remember_encoding(self, file_path: Path, encoding: str) -> Optional[Dict[str, Any]]:
+        """将文件编码写入清单，供后续加载直接使用"""
+        if self.ingest_cache is None:
+            return None
+        return self.ingest_cache.update_manifest(file_path, {"encoding": encoding, "transcoded": False})
+    
+    def _time_format(self, file_path: Path, series: pd.Series) -> Optional[str]:
+        """获取时间列格式，优先使用清单中记录的格式，否则推断一次并写入清单"""
+        formats = self._time_formats.setdefault(str(file_path), {})
+        if series.name in formats:
+            return formats[series.name]
+        
+        manifest = self.ingest_cache.validate(file_path) if self.ingest_cache else None
+        recorded = (manifest or {}).get("time_formats", {})
+        if series.name in recorded:
+            fmt = recorded[series.name]
+        else:
+            fmt = infer_datetime_format(series)
+            logger.info(f"推断时间列格式: {file_path.name}[{series.name}] -> {fmt}")
+            if self.ingest_cache is not None:
+                self.ingest_cache.update_manifest(file_path, {"time_formats": {**recorded, series.name: fmt}})
+        formats[series.name] = fmt
+        return fmt
+    
+    def get_datetime_column(self, file_name: str, time_col: str) -> Optional[pd.Series]:
+        """
+        获取解析为datetime类型的时间列
+        
+        每个数据集的时间列只推断格式并解析一次，结果与缓存数据的索引对齐，
+        之后的调用直接复用，不修改缓存中的原始数据。
+        
+        Args:
+            file_name: 逻辑文件名或实际文件名
+            time_col: 时间列名
             
-            # 尝试在备选位置查找文件
-            alternative_paths = [
-                Path("../data") / actual_file_name,  # 上级目录的data文件夹
-                Path("../../数据") / actual_file_name,  # 上上级目录的"数据"文件夹
-                Path("data") / actual_file_name,  # 当前目录的data文件夹
-            ]
+        Returns:
+            datetime类型的序列；列不存在或无法识别为时间列时返回None
+        """
+        df = self.load_data(file_name, columns=[time_col])
+        if time_col not in df.columns:
+            return None
+        
+        actual_file_name = self._resolve_file_name(file_name)
+        cache_key, file_path = self._cache_key(file_name, actual_file_name, {})
+        with self._file_lock(file_path):
+            parsed_columns = self._datetime_columns.get(cache_key, {})
+            if time_col in parsed_columns:
+                return parsed_columns[time_col]
             
-            found_path = None
-            for alt_path in alternative_paths:
-                if alt_path.exists():
-                    found_path = alt_path
-                    logger.info(f"在备选位置找到文件: {alt_path}")
-                    break
+            fmt = self._time_format(file_path, df[time_col])
+            if fmt is None:
+                return None
+            parsed = parse_datetime(df[time_col], fmt)
+            if cache_key in self.data_cache:
+                self._datetime_columns.setdefault(cache_key, {})[time_col] = parsed
+            return parsed
+    
+    def parse_time_values(self, file_name: str, series: pd.Series) -> Optional[pd.Series]:
+        """
+        按数据集记录的时间格式解析给定的时间列数据（如分区扫描得到的部分行）
+
+        格式按列名只推断一次并写入清单，不加载和解析数据集的整列。
+
+        Args:
+            file_name: 逻辑文件名或实际文件名
+            series: 时间列数据，序列名为时间列名
+
+        Returns:
+            datetime类型的序列，索引与输入一致；无法识别为时间列时返回None
+        """
+        _, file_path = self._cache_key(file_name, self._resolve_file_name(file_name), {})
+        fmt = self._time_format(file_path, series)
+        if fmt is None:
+            return None
+        return parse_datetime(series, fmt)
+    
+    def time_view(self, file_name: str, time_col: str) -> Optional[SortedTimeView]:
+        """
+        获取按时间列排序的数据视图
+        
+        每个数据集的每个时间列只排序一次，之后的时间范围查询通过二分查找切片；
+        视图只保存排序后的行位置和时间取值，切片时从缓存数据中取行，不另存一份排序后的数据；
+        数据追加新行或被移出缓存后重新建立。
+        
+        Args:
+            file_name: 逻辑文件名或实际文件名
+            time_col: 时间列名
             
-            if found_path:
-                file_path = found_path
-            else:
-                # 提供更详细的错误信息
-                error_msg = f"数据文件不存在: {file_path}\n"
-                error_msg += f"已尝试的备选位置:\n"
-                for alt_path in alternative_paths:
-                    error_msg += f"  - {alt_path}\n"
-                error_msg += f"\n请确保数据文件已正确放置，或检查DATA_ROOT_PATH配置。\n"
-                error_msg += f"当前DATA_ROOT_PATH配置为: {self.data_root_path}"
-                
-                raise FileNotFoundError(error_msg)
+        Returns:
+            视图；列不存在、无法识别为时间列、带时区或数据使用内存映射存储时返回None
+        """
+        if self.is_mmap_storage(file_name):
+            # 整表不在内存缓存中，视图无处引用
+            return None
+        df = self.load_data(file_name)
+        if time_col not in df.columns:
+            return None
+        parsed = self.get_datetime_column(file_name, time_col)
+        if parsed is None or not isinstance(parsed.dtype, np.dtype):
+            return None
+        
+        actual_file_name = self._resolve_file_name(file_name)
+        cache_key, file_path = self._cache_key(file_name, actual_file_name, {})
+        with self._file_lock(file_path):
+            views = self._time_views.setdefault(cache_key, {})
+            view = views.get(time_col)
+            if view is None or view.rows != len(df) or not set(df.columns) <= view.columns:
+                view = views[time_col] = SortedTimeView(df, time_col, parsed)
+                logger.info(f"已建立时间排序视图: {actual_file_name}[{time_col}], {len(df)} 行")
+            return view
+    
+    def _requested_columns(self, file_name: str, columns: Optional[List[str]]) -> Optional[List[str]]:
+        """确定需要加载的列，未指定时使用映射配置中声明的columns"""
+        if columns is not None:
+            return list(columns)
+        mapping = self.file_mapping.get(file_name)
+        if isinstance(mapping, dict) and mapping.get("columns"):
+            return list(mapping["columns"])
+        return None
+    
+    def _source_columns(self, file_path: Path, file_name: str, actual_file_name: str, **kwargs) -> List[str]:
+        """获取源文件的全部列名，只读取表头并记录到清单"""
+        cache_key = str(file_path)
+        if cache_key in self._source_columns_cache:
+            return self._source_columns_cache[cache_key]
+        
+        manifest = self.ingest_cache.validate(file_path) if self.ingest_cache else None
+        if manifest and "source_columns" in manifest:
+            source_columns = manifest["source_columns"]
+        elif self.is_mmap_storage(file_name) and not kwargs:
+            meta = self._column_store_meta(file_path, file_name, actual_file_name)
+            source_columns = self.column_store.column_names(meta)
+        else:
+            header_kwargs = {k: v for k, v in kwargs.items() if k not in ("usecols", "nrows")}
+            header = self._read_source(file_path, file_name, actual_file_name, nrows=0, **header_kwargs)
+            source_columns = [str(col) for col in header.columns]
+            if self.ingest_cache is not None and not kwargs:
+                self.ingest_cache.update_manifest(file_path, {"source_columns": source_columns})
+        
+        self._source_columns_cache[cache_key] = source_columns
+        return source_columns
+    
+    def _ingest(self, file_path: Path, file_name: str, actual_file_name: str,
+                columns: Optional[List[str]] = None, **kwargs) -> pd.DataFrame:
+        """解析数据文件的指定列，优先复用列式缓存中已有的列"""
+        # 仅默认解析参数的结果写入磁盘缓存，自定义参数直接解析源文件
+        use_disk_cache = self.ingest_cache is not None and not kwargs
+        
+        cached_part = self.ingest_cache.lookup(file_path, columns) if use_disk_cache else None
+        if cached_part is not None:
+            missing = [col for col in columns if col not in cached_part.columns] if columns else []
+            if not missing:
+                logger.info(f"从列式缓存加载数据: {file_name} -> {actual_file_name}")
+                return cached_part
+            columns = missing
+        
+        signature = IngestCache.file_signature(file_path)
+        # 解析前的内容哈希，部分列只与内容一致的已有副本合并
+        manifest = self.ingest_cache.validate(file_path) if use_disk_cache else None
+        content_hash = manifest.get("content_hash") if manifest else None
+        if columns is not None:
+            kwargs["usecols"] = columns
+        parsed = self._read_source(file_path, file_name, actual_file_name, **kwargs)
+        if use_disk_cache:
+            self.ingest_cache.store(file_path, parsed, signature=signature, complete=columns is None,
+                                    content_hash=content_hash)
+            if columns is None:
+                self._record_stats(file_path, parsed)
         
+        if cached_part is None:
+            return parsed
+        return pd.concat([cached_part, parsed], axis=1)
+    
+    def _record_stats(self, file_path: Path, df: pd.DataFrame) -> Dict[str, Any]:
+        """计算完整数据的统计信息并写入清单"""
+        stats = compute_dataset_stats(df)
+        self.ingest_cache.update_manifest(file_path, {"stats": stats})
+        return stats
+    
+    def _dataset_stats(self, file_name: str) -> Optional[Dict[str, Any]]:
+        """
+        获取清单中的数据集统计信息
+        
+        清单中没有统计信息时（例如列式缓存由旧版本写入）补充计算一次。
+        未启用磁盘缓存或开启了类型压缩（统计信息中的类型和内存占用会不一致）时返回None。
+        """
+        if self.ingest_cache is None or self.compact:
+            return None
+        actual_file_name = self._resolve_file_name(file_name)
+        _, file_path = self._cache_key(file_name, actual_file_name, {})
+        with self._file_lock(file_path):
+            self._sync_appends(file_path, file_name, actual_file_name)
+            manifest = self.ingest_cache.validate(file_path)
+            if manifest is not None and "stats" in manifest:
+                return manifest["stats"]
+            df = self._ingest(file_path, file_name, actual_file_name, None)
+            manifest = self.ingest_cache.validate(file_path)
+            if manifest is not None and "stats" in manifest:
+                return manifest["stats"]
+            return self._record_stats(file_path, df)
+    
+    def _sync_appends(self, file_path: Path, file_name: str, actual_file_name: str) -> Optional[Dict[str, Any]]:
+        """
+        将源文件末尾新追加的行同步到列式缓存和内存缓存
+        
+        只解析追加部分，写为列式缓存的增量分片，并拼接到已缓存的数据之后，然后通知追加回调。
+        源文件不是仅追加（内容被修改、没有可用清单）时不做处理，由后续加载全量重新摄取。
+        
+        Returns:
+            追加信息（行数、之前的版本号和当前版本号）；没有新追加的行时返回None
+        """
+        if self.ingest_cache is None or not actual_file_name.endswith('.csv'):
+            return None
+        with self._file_lock(file_path):
+            growth = self.ingest_cache.detect_append(file_path)
+            if growth is None:
+                return None
+            try:
+                tail = self._read_tail(file_path, growth)
+            except ValueError as e:
+                logger.warning(f"解析追加内容失败，将全量重新摄取: {actual_file_name}, 错误: {str(e)}")
+                return None
+            if tail is None:
+                return None
+            
+            from_version = growth["manifest"].get("version", 1)
+            manifest = self.ingest_cache.append(file_path, tail, growth)
+            self._append_to_memory(file_path, actual_file_name, tail)
+            self._append_to_rollups(file_path, tail, from_version, manifest["version"])
+            logger.info(f"检测到源文件追加 {len(tail)} 行: {actual_file_name}, "
+                        f"版本 {from_version} -> {manifest['version']}")
+        
+        for listener in list(self._append_listeners):
+            try:
+                listener(actual_file_name, tail, from_version, manifest["version"])
+            except Exception as e:
+                logger.warning(f"追加回调执行失败: {actual_file_name}, 错误: {str(e)}")
+        return {"rows": int(len(tail)), "from_version": from_version, "version": manifest["version"]}
+    
+    def _read_tail(self, file_path: Path, growth: Dict[str, Any]) -> Optional[pd.DataFrame]:
+        """从记录的字节偏移处解析新追加的行，列与列式缓存中已有的列一致"""
+        manifest = growth["manifest"]
+        stored = manifest.get("columns")
+        source_columns = manifest.get("source_columns") or (stored if manifest.get("complete") else None)
+        if not stored or not source_columns:
+            return None
+        
+        encoding = manifest.get("encoding") or detect_encoding(file_path)
+        with open(file_path, "rb") as f:
+            f.seek(growth["offset"])
+            data = f.read(growth["signature"]["size"] - growth["offset"])
+        tail = pd.read_csv(io.BytesIO(data), encoding=encoding, header=None,
+                           names=source_columns, usecols=stored)[stored]
+        tail.index = pd.RangeIndex(manifest["rows"], manifest["rows"] + len(tail))
+        return tail
+    
+    def _append_to_memory(self, file_path: Path, actual_file_name: str, tail: pd.DataFrame) -> None:
+        """将追加的行拼接到内存缓存中的数据，无法拼接的条目（自定义解析参数等）直接移除"""
+        base_key = str(file_path.resolve())
+        for cache_key in self.data_cache.keys():
+            if cache_key != base_key and not cache_key.startswith(f"{base_key}|"):
+                continue
+            cached = self.data_cache.peek(cache_key)
+            self._datetime_columns.pop(cache_key, None)
+            self._time_views.pop(cache_key, None)
+            self._index_sets.pop(cache_key, None)
+            if cache_key != base_key or cached is None or len(cached) != tail.index.start \
+                    or not set(cached.columns) <= set(tail.columns):
+                self.data_cache.pop(cache_key)
+                self._on_cache_evict(cache_key)
+                continue
+            combined = self._compact(pd.concat([cached, tail[list(cached.columns)]]), actual_file_name)
+            self.data_cache[cache_key] = combined
+            self._publish_shared(cache_key, file_path, combined, {})
+    
+    def _append_to_rollups(self, file_path: Path, tail: pd.DataFrame, from_version: int, version: int) -> None:
+        """将追加的行累计到已加载的汇总立方体，版本不连续或缺少列的立方体移除后按需重建"""
+        base_key = str(file_path.resolve())
+        for memory_key, cube in list(self._rollup_cubes.items()):
+            if memory_key[0] != base_key:
+                continue
+            if cube.version != from_version or not set(cube.dimensions + cube.measures) <= set(tail.columns):
+                self._rollup_cubes.pop(memory_key)
+                continue
+            cube.update(tail)
+            cube.version = version
+            self.rollup_store.save(file_path, cube)
+    
+    def add_append_listener(self, listener) -> None:
+        """
+        注册源文件追加新行时的回调
+        
+        回调参数为 (实际文件名, 追加的行, 之前的版本号, 当前版本号)，
+        追加的行的索引为其在源文件中的行位置。
+        """
+        self._append_listeners.append(listener)
+    
+    def remove_append_listener(self, listener) -> None:
+        """取消注册追加回调"""
+        if listener in self._append_listeners:
+            self._append_listeners.remove(listener)
+    
+    def refresh_dataset(self, file_name: str) -> Optional[Dict[str, Any]]:
+        """
+        检查源文件是否有变化并刷新缓存
+        
+        内存缓存命中时不会检查源文件，需要读取最新数据时调用此方法：
+        仅追加时只解析新增的行并拼接到已缓存的数据之后；其他变化会移除已缓存的数据，
+        下次加载时全量重新摄取。
+        
+        Returns:
+            追加信息（行数、之前的版本号和当前版本号）；没有新追加的行时返回None
+        """
+        actual_file_name = self._resolve_file_name(file_name)
+        _, file_path = self._cache_key(file_name, actual_file_name, {})
+        with self._file_lock(file_path):
+            appended = self._sync_appends(file_path, file_name, actual_file_name)
+            if appended is None and self.ingest_cache is not None \
+                    and self.ingest_cache.load_manifest(file_path) is not None \
+                    and self.ingest_cache.validate(file_path) is None:
+                base_key = str(file_path.resolve())
+                for cache_key in self.data_cache.keys():
+                    if cache_key == base_key or cache_key.startswith(f"{base_key}|"):
+                        self.data_cache.pop(cache_key)
+                        self._on_cache_evict(cache_key)
+                self._source_columns_cache.pop(str(file_path), None)
+                self._time_formats.pop(str(file_path), None)
+                logger.info(f"源文件已变化，已移除缓存数据: {actual_file_name}")
+            return appended
+    
+    def get_dataset_version(self, file_name: str) -> Optional[int]:
+        """
+        获取数据集当前的版本号，每次源文件追加或变化后递增
+        
+        Returns:
+            版本号；未启用磁盘缓存或尚未摄取时返回None
+        """
+        if self.ingest_cache is None:
+            return None
+        actual_file_name = self._resolve_file_name(file_name)
+        _, file_path = self._cache_key(file_name, actual_file_name, {})
+        self._sync_appends(file_path, file_name, actual_file_name)
+        manifest = self.ingest_cache.validate(file_path)
+        return manifest.get("version", 1) if manifest is not None else None
+    
+    def get_changes_since(self, file_name: str, version: int,
+                          columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+        """
+        获取数据集在指定版本之后追加的行，供下游缓存增量更新
+        
+        Args:
+            file_name: 逻辑文件名或实际文件名
+            version: 调用方已有数据对应的版本号（get_dataset_version 的返回值）
+            columns: 需要的列，为None时返回列式缓存中的全部列
+            
+        Returns:
+            追加的行，索引为行在源文件中的位置；已是最新版本时返回空数据。
+            源文件发生过非追加的变化或增量已合并时返回None，调用方需要全量重新加载
+        """
+        if self.ingest_cache is None:
+            return None
+        actual_file_name = self._resolve_file_name(file_name)
+        _, file_path = self._cache_key(file_name, actual_file_name, {})
+        self._sync_appends(file_path, file_name, actual_file_name)
+        return self.ingest_cache.changes_since(file_path, version, columns)
+    
+    @staticmethod
+    def _project(df: pd.DataFrame, columns: Optional[List[str]]) -> pd.DataFrame:
+        """按源文件列顺序选出所需的列"""
+        if columns is None:
+            return df
+        wanted = set(columns)
+        selected = [col for col in df.columns if col in wanted]
+        if len(selected) == len(df.columns):
+            return df
+        return df[selected]
+    
+    def load_data(self, file_name: str, columns: Optional[List[str]] = None, **kwargs) -> pd.DataFrame:
+        """
+        加载指定的数据文件
+        
+        Args:
+            file_name: 逻辑文件名或实际文件名
+            columns: 需要的列，只解析和缓存这些列；为None时使用映射配置中声明的columns，
+                     未声明时加载全部列（内存映射存储的文件此时从列存储读取，不写入内存缓存）。
+                     之后请求更多列时只补充解析缺少的列
+            **kwargs: 传递给pandas读取函数的参数
+            
+        Returns:
+            数据DataFrame
+        """
+        # 解析实际文件名，并检查文件是否存在
+        actual_file_name = self._resolve_file_name(file_name)
+        cache_key, file_path = self._cache_key(file_name, actual_file_name, kwargs)
+        wanted = self._requested_columns(file_name, columns)
+        if wanted is None and not kwargs and self.is_mmap_storage(file_name):
+            # 内存映射存储的全部列不写入内存缓存，否则整表常驻内存，列存储失去意义
+            logger.info(f"{file_name} 使用内存映射存储，全部列从列存储读取，不写入内存缓存")
+            return self.select(file_name)
+        
+        hit = self._cache_hit(self.data_cache.get(cache_key), cache_key, wanted)
+        if hit is not None:
+            logger.info(f"从缓存中加载数据: {file_name} -> {actual_file_name}")
+            return hit
+        
+        with self._file_lock(file_path):
+            # 源文件仅追加时只解析新增的行；等待锁期间其他线程可能已加载了同一文件
+            self._sync_appends(file_path, file_name, actual_file_name)
+            cached = self.data_cache.peek(cache_key)
+            hit = self._cache_hit(cached, cache_key, wanted)
+            if hit is not None:
+                logger.info(f"从缓存中加载数据: {file_name} -> {actual_file_name}")
+                return hit
+            return self._load_uncached(file_name, actual_file_name, file_path, cache_key,
+                                       wanted, cached, **kwargs)
+    
+    def _load_uncached(self, file_name: str, actual_file_name: str, file_path: Path, cache_key: str,
+                       wanted: Optional[List[str]], cached: Optional[pd.DataFrame],
+                       **kwargs) -> pd.DataFrame:
+        """解析缓存中缺少的数据并写入内存缓存"""
         try:
-            if file_name.endswith('.csv') or actual_file_name.endswith('.csv'):
-                # 尝试不同的编码
-                encodings = ['utf-8', 'gbk', 'gb2312']
-                df = None
-                for encoding in encodings:
-                    try:
-                        df = pd.read_csv(file_path, encoding=encoding, **kwargs)
-                        logger.info(f"使用 {encoding} 编码成功加载数据: {actual_file_name}")
-                        break
-                    except UnicodeDecodeError:
-                        continue
-                
-                if df is None:
-                    raise ValueError(f"无法使用任何编码读取文件: {file_path}")
-            elif file_name.endswith('.xlsx') or file_name.endswith('.xls') or actual_file_name.endswith('.xlsx') or actual_file_name.endswith('.xls'):
-                df = pd.read_excel(file_path, **kwargs)
+            if wanted is not None:
+                source_columns = self._source_columns(file_path, file_name, actual_file_name, **kwargs)
+                absent = [col for col in wanted if col not in source_columns]
+                if absent:
+                    logger.warning(f"请求的列 {absent} 在数据文件 {actual_file_name} 中不存在，已忽略")
+                wanted = [col for col in wanted if col in source_columns]
+            
+            if cached is not None and wanted is not None:
+                # 只补充解析缓存中缺少的列，并合并进已缓存的数据
+                missing = [col for col in wanted if col not in cached.columns]
+                if missing:
+                    extra = self._attach_shared(cache_key, file_path, missing, kwargs)
+                    if extra is None:
+                        extra = self._read_columns(file_path, file_name, actual_file_name, missing, **kwargs)
+                        extra = self._compact(extra[missing], file_name)
+                    cached = pd.concat([cached, extra[missing]], axis=1)
+                    logger.info(f"已向缓存数据 {file_name} 合并列: {missing}")
+                df = cached
             else:
-                raise ValueError(f"不支持的文件格式: {file_name}")
+                df = self._attach_shared(cache_key, file_path, wanted, kwargs)
+                if df is None:
+                    df = self._read_columns(file_path, file_name, actual_file_name, wanted, **kwargs)
+                    df = self._compact(df, file_name)
+                if wanted is None:
+                    self._complete_entries.add(cache_key)
             
-            # 缓存数据
-            self.data_cache[file_name] = df
+            # 缓存数据，并发布到共享内存供其他进程使用
+            self.data_cache[cache_key] = df
+            self._publish_shared(cache_key, file_path, df, kwargs)
             logger.info(f"成功加载数据: {file_name} -> {actual_file_name}, 形状: {df.shape}")
-            return df
+            return self._project(df, wanted)
             
         except Exception as e:
             logger.error(f"加载数据失败: {file_name} -> {actual_file_name}, 错误: {str(e)}")
             raise
     
+    def is_mmap_storage(self, file_name: str) -> bool:
+        """数据文件是否在映射配置中声明了 storage: mmap 且列存储可用"""
+        mapping = self.file_mapping.get(file_name)
+        return (self.column_store is not None and isinstance(mapping, dict)
+                and mapping.get("storage") == "mmap")
+    
+    def _column_store_meta(self, file_path: Path, file_name: str, actual_file_name: str) -> Dict[str, Any]:
+        """获取列存储描述，不存在或源文件已变化时从源文件构建"""
+        with self._file_lock(file_path):
+            self._sync_appends(file_path, file_name, actual_file_name)
+            signature = IngestCache.file_signature(file_path)
+            meta = self.column_store.load_meta(file_path, signature)
+            if meta is None:
+                # 构建时需要完整解析一次源文件，之后按列映射读取
+                df = self._ingest(file_path, file_name, actual_file_name, None)
+                meta = self.column_store.build(file_path, df, signature)
+            return meta
+    
+    def _read_columns(self, file_path: Path, file_name: str, actual_file_name: str,
+                      columns: Optional[List[str]], **kwargs) -> pd.DataFrame:
+        """读取指定的列，声明为内存映射存储的文件从列存储读取"""
+        if self.is_mmap_storage(file_name) and not kwargs:
+            if columns is None:
+                logger.warning(f"{file_name} 使用内存映射存储，未指定列时将读取全部列")
+            meta = self._column_store_meta(file_path, file_name, actual_file_name)
+            return self.column_store.read(file_path, meta, columns)
+        return self._ingest(file_path, file_name, actual_file_name, columns, **kwargs)
+    
+    def select(self, file_name: str, columns: Optional[List[str]] = None,
+               rows: Optional[Any] = None) -> pd.DataFrame:
+        """
+        读取指定的列和行
+        
+        内存映射存储的文件直接从列存储读取，只访问所需列和行所在的页，结果不写入内存缓存；
+        其他文件通过 load_data 加载后再选取行。
+        
+        Args:
+            file_name: 逻辑文件名或实际文件名
+            columns: 需要的列，为None时使用映射配置中声明的columns
+            rows: 行位置数组或布尔掩码，为None时返回全部行
+            
+        Returns:
+            所选的数据，索引为行在源文件中的位置
+        """
+        wanted = self._requested_columns(file_name, columns)
+        if self.is_mmap_storage(file_name):
+            actual_file_name = self._resolve_file_name(file_name)
+            _, file_path = self._cache_key(file_name, actual_file_name, {})
+            meta = self._column_store_meta(file_path, file_name, actual_file_name)
+            if wanted is not None:
+                absent = [col for col in wanted if col not in self.column_store.column_names(meta)]
+                if absent:
+                    logger.warning(f"请求的列 {absent} 在数据文件 {actual_file_name} 中不存在，已忽略")
+            return self.column_store.read(file_path, meta, wanted, rows)
+        
+        df = self.load_data(file_name, columns=wanted)
+        if rows is None:
+            return df
+        rows = np.asarray(rows)
+        return df[rows] if rows.dtype == bool else df.take(rows)
+    
+    def filter_rows(self, file_name: str, df: pd.DataFrame, filters: Dict[str, Any]) -> pd.DataFrame:
+        """
+        按过滤条件筛选 load_data 或 scan 返回的数据，可用时使用二级索引
+        
+        以AND组合的 eq/in 条件使用哈希索引，gt/gte/lt/lte 条件使用有序索引，直接得到满足条件的行位置，
+        多个条件的结果取交集；编译后的完整过滤条件只在这些行上求值。索引按需建立并随缓存条目保存，
+        映射配置 indexes 中声明的列首次过滤即建立索引，其他列被多次过滤后建立。
+        
+        Args:
+            file_name: 逻辑文件名或实际文件名
+            df: load_data(file_name, ...) 或 scan(file_name, ...) 返回的数据
+            filters: 过滤条件，格式与 DataQuery.query_data 相同
+            
+        Returns:
+            过滤后的数据，结果与 apply_filters 相同
+        """
+        actual_file_name = self._resolve_file_name(file_name)
+        cache_key, file_path = self._cache_key(file_name, actual_file_name, {})
+        cached = self.data_cache.peek(cache_key)
+        if cached is None or len(cached) != len(df) or not df.index.equals(cached.index):
+            # scan 返回的分区扫描结果本身就是缓存条目，索引随该条目保存
+            scan_prefix = f"{cache_key}|scan:"
+            cache_key = next((key for key in self.data_cache.keys()
+                              if key.startswith(scan_prefix) and self.data_cache.peek(key) is df), None)
+            if cache_key is None:
+                return apply_filters(df, filters)
+        
+        mapping = self.file_mapping.get(file_name)
+        declared = mapping.get("indexes") if isinstance(mapping, dict) else None
+        positions = None
+        with self._file_lock(file_path):
+            index_set = self._index_sets.setdefault(cache_key, IndexSet(declared))
+            for col, op, value in column_conditions(filters):
+                kind = OPERATOR_INDEX.get(op)
+                index = index_set.get(df[col], kind) if kind and col in df.columns else None
+                if index is None:
+                    continue
+                try:
+                    matched = index.positions(op, value)
+                except (TypeError, ValueError):
+                    continue
+                positions = matched if positions is None else np.intersect1d(positions, matched, assume_unique=True)
+        
+        compiled = compile_filters(filters, df.columns, self._manifest_stats(file_path))
+        if positions is None:
+            return compiled.apply(df)
+        return df.take(positions[compiled.mask(df, positions)])
+    
+    def _manifest_stats(self, file_path: Path) -> Optional[Dict[str, Any]]:
+        """清单中已有的数据集统计信息，用于估计过滤条件的选择性；不会触发计算"""
+        if self.ingest_cache is None:
+            return None
+        manifest = self.ingest_cache.validate(file_path)
+        return manifest.get("stats") if manifest is not None else None
+    
+    def columnar_source(self, file_name: str) -> Dict[str, Any]:
+        """
+        获取数据集的列式缓存文件，供SQL引擎等外部读取方直接读取
+        
+        列式缓存不存在或不完整时先完整摄取一次；源文件追加的新行会先同步为增量分片。
+        
+        Args:
+            file_name: 逻辑文件名或实际文件名
+            
+        Returns:
+            包含 files（主副本及增量分片路径，按行顺序）和 columns
+            （映射配置中声明的列，未声明时为全部列）的字典
+        """
+        if self.ingest_cache is None:
+            raise ValueError("未启用列式缓存目录，无法提供列式缓存文件")
+        actual_file_name = self._resolve_file_name(file_name)
+        _, file_path = self._cache_key(file_name, actual_file_name, {})
+        with self._file_lock(file_path):
+            self._sync_appends(file_path, file_name, actual_file_name)
+            manifest = self.ingest_cache.validate(file_path)
+            if manifest is None or not manifest.get("complete", True) \
+                    or not self.ingest_cache.data_path(file_path).exists():
+                self._ingest(file_path, file_name, actual_file_name, None)
+                manifest = self.ingest_cache.validate(file_path)
+            if manifest is None:
+                raise ValueError(f"写入列式缓存失败: {actual_file_name}")
+            files = self.ingest_cache.data_files(file_path, manifest)
+        
+        wanted = self._requested_columns(file_name, None)
+        columns = manifest["columns"]
+        if wanted is not None:
+            columns = [col for col in columns if col in set(wanted)]
+        return {"files": files, "columns": columns}
+    
+    def is_partitioned_storage(self, file_name: str) -> bool:
+        """数据文件是否在映射配置中声明了 storage: partitioned 且分区存储可用"""
+        mapping = self.file_mapping.get(file_name)
+        return (self.partition_store is not None and isinstance(mapping, dict)
+                and mapping.get("storage") == "partitioned")
+    
+    def partition_layout(self, file_name: str) -> Dict[str, Any]:
+        """获取映射配置中声明的分区方式（年份列、公司代码列和分桶数量）"""
+        partition = (self.file_mapping.get(file_name) or {}).get("partition") or {}
+        return {
+            "year_col": partition.get("year_col", "会计年度"),
+            "code_col": partition.get("code_col", "证券代码"),
+            "buckets": int(partition.get("buckets", DEFAULT_BUCKETS))
+        }
+    
+    def _partition_years(self, file_path: Path, series: pd.Series) -> np.ndarray:
+        """将年份列转换为年份数组，日期和季度等形式按记录的时间格式解析"""
+        if pd.api.types.is_numeric_dtype(series.dtype):
+            return np.floor(series.to_numpy(dtype=np.float64, na_value=np.nan))
+        if pd.api.types.is_datetime64_any_dtype(series.dtype):
+            return series.dt.year.to_numpy(dtype=np.float64, na_value=np.nan)
+        fmt = self._time_format(file_path, series)
+        if fmt is None:
+            return pd.to_numeric(series, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+        return parse_datetime(series, fmt).dt.year.to_numpy(dtype=np.float64, na_value=np.nan)
+    
+    def _partition_meta(self, file_path: Path, file_name: str, actual_file_name: str) -> Optional[Dict[str, Any]]:
+        """
+        获取分区存储描述，不存在或源文件已变化时从列式缓存构建
+        
+        构建前先按表头校验映射配置声明的年份列和公司代码列，缺少时记录到清单，
+        源文件不变时之后的调用直接回退为整表加载，不再重复摄取。
+        
+        Returns:
+            描述信息；源文件缺少配置的年份列或公司代码列时返回None
+        """
+        layout = self.partition_layout(file_name)
+        with self._file_lock(file_path):
+            self._sync_appends(file_path, file_name, actual_file_name)
+            signature = IngestCache.file_signature(file_path)
+            meta = self.partition_store.load_meta(file_path, signature, layout)
+            if meta is None:
+                manifest = self.ingest_cache.validate(file_path)
+                if manifest is not None and manifest.get("partition_unusable") == layout:
+                    return None
+                source_columns = self._source_columns(file_path, file_name, actual_file_name)
+                missing = [col for col in (layout["year_col"], layout["code_col"]) if col not in source_columns]
+                if missing:
+                    logger.error(f"{actual_file_name} 的表头缺少映射配置声明的分区列 {missing}，"
+                                 f"storage: partitioned 不生效，回退为整表加载；请检查 {file_name} 的 partition 配置")
+                    self.ingest_cache.update_manifest(file_path, {"partition_unusable": layout})
+                    return None
+                df = self._ingest(file_path, file_name, actual_file_name, None)
+                years = self._partition_years(file_path, df[layout["year_col"]])
+                meta = self.partition_store.build(file_path, df, years, signature, layout)
+            return meta
+    
+    @staticmethod
+    def _scan_key(file_path: Path, meta: Dict[str, Any], partitions: List[Dict[str, Any]],
+                  columns: Optional[List[str]]) -> str:
+        """分区扫描结果的内存缓存键，以规范路径开头，源文件追加新行时随其他条目一起移除"""
+        digest = hashlib.sha1(json.dumps(
+            [meta["signature"], meta["layout"], [partition["file"] for partition in partitions], columns],
+            ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()[:20]
+        return f"{Path(file_path).resolve()}|scan:{digest}"
+    
+    def scan(self, file_name: str, columns: Optional[List[str]] = None,
+             filters: Optional[Dict] = None,
+             year_range: Optional[Tuple[Optional[int], Optional[int]]] = None) -> pd.DataFrame:
+        """
+        读取可能满足过滤条件的行
+        
+        分区存储的文件根据年份列和公司代码列上的条件裁剪分区，只读取相关分区的所需列，
+        结果压缩类型后按裁剪出的分区集合和列写入内存缓存，相同分区的重复查询直接复用，
+        可用 filter_rows 借助二级索引筛选；其他文件通过 load_data 加载全部行。
+        不会按过滤条件筛选行，调用方仍需应用过滤条件。
+        
+        Args:
+            file_name: 逻辑文件名或实际文件名
+            columns: 需要的列，为None时使用映射配置中声明的columns
+            filters: 过滤条件，格式与 DataQuery.query_data 相同
+            year_range: 额外的年份闭区间 (下限, 上限)，任一端为None表示不限
+            
+        Returns:
+            数据，索引为行在源文件中的位置
+        """
+        wanted = self._requested_columns(file_name, columns)
+        if self.is_partitioned_storage(file_name):
+            actual_file_name = self._resolve_file_name(file_name)
+            _, file_path = self._cache_key(file_name, actual_file_name, {})
+            meta = self._partition_meta(file_path, file_name, actual_file_name)
+            if meta is not None:
+                if wanted is not None:
+                    absent = [col for col in wanted if col not in meta["columns"]]
+                    if absent:
+                        logger.warning(f"请求的列 {absent} 在数据文件 {actual_file_name} 中不存在，已忽略")
+                    wanted = [col for col in meta["columns"] if col in set(wanted)]
+                partitions = self.partition_store.select_partitions(meta, filters, year_range)
+                scan_key = self._scan_key(file_path, meta, partitions, wanted)
+                cached = self.data_cache.get(scan_key)
+                if cached is not None:
+                    logger.info(f"从缓存中读取分区扫描结果: {actual_file_name}, {len(partitions)} 个分区")
+                    return cached
+                with self._file_lock(file_path):
+                    cached = self.data_cache.peek(scan_key)
+                    if cached is None:
+                        cached = self._compact(
+                            self.partition_store.read(file_path, meta, wanted, partitions=partitions), file_name)
+                        self.data_cache[scan_key] = cached
+                return cached
+        return self.load_data(file_name, columns=wanted)
+    
+    def financial_ratios(self, file_name: str, company_col: str, period_col: str,
+                         ratio_definitions: Dict[str, Dict]) -> pd.DataFrame:
+        """
+        计算财务比率，结果缓存在列式缓存目录中
+        
+        只加载公司列、期间列和比率引用的列；缓存按源文件签名校验，
+        源文件追加或变化后自动重新计算。
+        
+        Args:
+            file_name: 逻辑文件名或实际文件名
+            company_col: 公司列
+            period_col: 期间列
+            ratio_definitions: 比率定义，格式见 ratio_engine.normalize_definitions
+            
+        Returns:
+            包含公司列、期间列和各比率列的数据，按公司和期间排序
+        """
+        definitions = normalize_definitions(ratio_definitions)
+        columns = list(dict.fromkeys([company_col, period_col] + source_columns(definitions)))
+        if self.ratio_store is None:
+            return compute_ratios(self.load_data(file_name, columns=columns), company_col, period_col, definitions)
+        
+        actual_file_name = self._resolve_file_name(file_name)
+        _, file_path = self._cache_key(file_name, actual_file_name, {})
+        key = definitions_key(company_col, period_col, definitions)
+        with self._file_lock(file_path):
+            # 先同步追加的新行，保证缓存数据与记录的签名一致
+            self._sync_appends(file_path, file_name, actual_file_name)
+            signature = IngestCache.file_signature(file_path)
+            cached = self.ratio_store.load(file_path, signature, key)
+            if cached is not None:
+                logger.info(f"从缓存中加载财务比率: {actual_file_name}")
+                return cached
+            result = compute_ratios(self.load_data(file_name, columns=columns), company_col, period_col, definitions)
+            self.ratio_store.save(file_path, signature, key, result)
+            return result
+    
+    def rollup_specs(self, file_name: str) -> List[Dict[str, List[str]]]:
+        """映射配置中声明的汇总立方体（维度列和度量列）"""
+        mapping = self.file_mapping.get(file_name)
+        specs = mapping.get("rollups") if isinstance(mapping, dict) else None
+        return [{"dimensions": list(spec["dimensions"]), "measures": list(spec["measures"])}
+                for spec in specs or []]
+    
+    def rollup(self, file_name: str, group_cols: List[str], agg_cols: List[str],
+               agg_funcs: List[str]) -> Optional[pd.DataFrame]:
+        """
+        由声明的汇总立方体回答分组聚合
+        
+        分组列和聚合列被某个立方体覆盖、聚合函数可由部分结果合并得到时，
+        选择维度最少的立方体再汇总，不读取原始数据。
+        
+        Args:
+            file_name: 逻辑文件名或实际文件名
+            group_cols: 分组列
+            agg_cols: 聚合列
+            agg_funcs: 聚合函数列表
+            
+        Returns:
+            与 DataQuery.aggregate_by_period 相同格式的聚合结果；没有可用的立方体时返回None
+        """
+        if self.rollup_store is None:
+            return None
+        candidates = [spec for spec in self.rollup_specs(file_name)
+                      if covers(spec, group_cols, agg_cols, agg_funcs)]
+        if not candidates:
+            return None
+        spec = min(candidates, key=lambda spec: len(spec["dimensions"]))
+        cube = self._rollup_cube(file_name, spec["dimensions"], spec["measures"])
+        if cube is None:
+            return None
+        logger.info(f"由汇总立方体 {spec['dimensions']} 回答聚合: {file_name}, 分组 {group_cols}")
+        return cube.rollup(group_cols, agg_cols, agg_funcs)
+    
+    def _rollup_cube(self, file_name: str, dimensions: List[str], measures: List[str]) -> Optional[RollupCube]:
+        """
+        获取与数据集当前版本一致的汇总立方体
+        
+        依次使用内存中的立方体、持久化的立方体；版本落后时只累计之后追加的行，
+        无法增量更新（源文件被修改、增量已合并）时由数据全量重建。
+        
+        Returns:
+            立方体；数据缺少维度列或度量列时返回None
+        """
+        actual_file_name = self._resolve_file_name(file_name)
+        _, file_path = self._cache_key(file_name, actual_file_name, {})
+        memory_key = (str(file_path.resolve()), cube_key(dimensions, measures))
+        columns = list(dict.fromkeys(dimensions + measures))
+        with self._file_lock(file_path):
+            self._sync_appends(file_path, file_name, actual_file_name)
+            manifest = self.ingest_cache.validate(file_path)
+            version = manifest.get("version", 1) if manifest is not None else None
+            
+            cube = self._rollup_cubes.get(memory_key) or self.rollup_store.load(file_path, dimensions, measures)
+            if cube is not None and (version is None or cube.version is None or cube.version > version):
+                cube = None
+            elif cube is not None and cube.version < version:
+                delta = self.ingest_cache.changes_since(file_path, cube.version, columns)
+                if delta is None or not set(columns) <= set(delta.columns):
+                    cube = None
+                else:
+                    cube.update(delta)
+                    cube.version = version
+                    self.rollup_store.save(file_path, cube)
+                    logger.info(f"汇总立方体已累计追加的 {len(delta)} 行: {actual_file_name}")
+            
+            if cube is None:
+                df = self.load_data(file_name, columns=columns)
+                missing = [col for col in columns if col not in df.columns]
+                if missing:
+                    logger.warning(f"{actual_file_name} 缺少立方体列 {missing}，不使用汇总立方体")
+                    return None
+                manifest = self.ingest_cache.validate(file_path)
+                cube = RollupCube(dimensions, measures, manifest.get("version", 1) if manifest is not None else None)
+                cube.update(df)
+                if cube.version is not None:
+                    self.rollup_store.save(file_path, cube)
+                logger.info(f"已建立汇总立方体: {actual_file_name}, 维度 {dimensions}, {cube.groups} 组")
+            
+            self._rollup_cubes[memory_key] = cube
+            return cube
+    
+    def _attach_shared(self, cache_key: str, file_path: Path, columns: Optional[List[str]],
+                       kwargs: Dict[str, Any]) -> Optional[pd.DataFrame]:
+        """从共享内存存储连接其他进程已加载的数据"""
+        if self.shared_store is None or kwargs:
+            return None
+        try:
+            return self.shared_store.attach(cache_key, IngestCache.file_signature(file_path), columns)
+        except Exception as e:
+            logger.warning(f"连接共享数据失败: {cache_key}, 错误: {str(e)}")
+            return None
+    
+    def _publish_shared(self, cache_key: str, file_path: Path, df: pd.DataFrame,
+                        kwargs: Dict[str, Any]) -> None:
+        """将已加载的数据发布到共享内存存储"""
+        if self.shared_store is None or kwargs:
+            return
+        try:
+            self.shared_store.publish(cache_key, df, IngestCache.file_signature(file_path),
+                                      complete=cache_key in self._complete_entries)
+        except Exception as e:
+            logger.warning(f"发布共享数据失败: {cache_key}, 错误: {str(e)}")
+    
+    def _compact(self, df: pd.DataFrame, file_name: str) -> pd.DataFrame:
+        """开启类型压缩时压缩数据类型"""
+        if not self.compact:
+            return df
+        return compact_dtypes(df, float32=self.float32, name=file_name)
+    
+    def preload(self, file_names: List[str], max_workers: Optional[int] = None,
+                mode: str = "thread") -> Dict[str, Dict[str, Any]]:
+        """
+        并行预加载多个数据文件到内存缓存
+        
+        Args:
+            file_names: 逻辑文件名或实际文件名列表
+            max_workers: 并行工作数，为None时取文件数与CPU核数的较小值
+            mode: 'thread' 使用线程池；'process' 使用进程池，子进程以Arrow格式回传数据；
+                  'sequential' 逐个加载
+            
+        Returns:
+            每个文件的加载结果，包含状态、形状、列名和加载耗时（秒）
+        """
+        if mode not in ("thread", "process", "sequential"):
+            raise ValueError(f"不支持的预加载模式: {mode}，仅支持: thread, process, sequential")
+        if not file_names:
+            return {}
+        if max_workers is None:
+            max_workers = min(len(file_names), os.cpu_count() or 1)
+        max_workers = max(1, max_workers)
+        
+        start = time.perf_counter()
+        if mode == "sequential" or max_workers == 1:
+            results = {file_name: self._timed_load(file_name) for file_name in file_names}
+        elif mode == "thread":
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {executor.submit(self._timed_load, file_name): file_name for file_name in file_names}
+                results = {futures[future]: future.result() for future in as_completed(futures)}
+        else:
+            results = self._preload_processes(file_names, max_workers)
+        
+        logger.info(f"预加载 {len(file_names)} 个数据文件完成 (模式: {mode}, 工作数: {max_workers}), "
+                    f"总耗时: {time.perf_counter() - start:.2f}秒")
+        return {file_name: results[file_name] for file_name in file_names}
+    
+    def _timed_load(self, file_name: str) -> Dict[str, Any]:
+        """加载单个文件并记录耗时，失败时返回错误信息"""
+        start = time.perf_counter()
+        try:
+            data = self.load_data(file_name)
+        except Exception as e:
+            return {"status": "error", "error": str(e), "load_time": time.perf_counter() - start}
+        return {
+            "status": "success",
+            "shape": data.shape,
+            "columns": data.columns.tolist(),
+            "load_time": time.perf_counter() - start
+        }
+    
+    def _preload_processes(self, file_names: List[str], max_workers: int) -> Dict[str, Dict[str, Any]]:
+        """使用进程池解析文件，并将子进程回传的Arrow数据写入本进程的内存缓存"""
+        import pyarrow as pa
+        
+        loader_config = {
+            "data_root_path": str(self.data_root_path),
+            "mapping_config_path": self.mapping_config_path,
+            "cache_dir": self.cache_dir,
+            "transcode_sources": self.transcode_sources,
+            "compact": self.compact,
+            "float32": self.float32
+        }
+        results = {}
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(_load_as_arrow, loader_config, file_name): (file_name, time.perf_counter())
+                for file_name in file_names
+            }
+            for future in as_completed(futures):
+                file_name, start = futures[future]
+                try:
+                    payload, complete = future.result()
+                    data = pa.ipc.open_stream(payload).read_all().to_pandas()
+                    self._install(file_name, data, complete)
+                except Exception as e:
+                    logger.error(f"预加载数据失败: {file_name}, 错误: {str(e)}")
+                    results[file_name] = {"status": "error", "error": str(e),
+                                          "load_time": time.perf_counter() - start}
+                    continue
+                results[file_name] = {
+                    "status": "success",
+                    "shape": data.shape,
+                    "columns": data.columns.tolist(),
+                    "load_time": time.perf_counter() - start
+                }
+        return results
+    
+    def _install(self, file_name: str, df: pd.DataFrame, complete: bool) -> None:
+        """将外部加载的数据写入内存缓存，与已有的部分列条目合并"""
+        actual_file_name = self._resolve_file_name(file_name)
+        cache_key, file_path = self._cache_key(file_name, actual_file_name, {})
+        with self._file_lock(file_path):
+            existing = self.data_cache.peek(cache_key)
+            if existing is not None:
+                if cache_key in self._complete_entries:
+                    return
+                if not complete:
+                    missing = [col for col in df.columns if col not in existing.columns]
+                    df = pd.concat([existing, df[missing]], axis=1)
+            self.data_cache[cache_key] = df
+            if complete:
+                self._complete_entries.add(cache_key)
+    
+    def load_data_iter(self, file_name: str, chunksize: int = 100_000,
+                       columns: Optional[List[str]] = None,
+                       filters: Optional[Dict] = None) -> Iterator[pd.DataFrame]:
+        """
+        按数据块流式加载数据文件，不写入内存缓存
+        
+        有列式缓存副本时按批次读取副本，否则分块解析CSV。
+        
+        Args:
+            file_name: 逻辑文件名或实际文件名
+            chunksize: 每个数据块的行数
+            columns: 需要的列，为None时使用映射配置中声明的columns
+            filters: 行过滤条件，格式与 DataQuery.query_data 相同
+            
+        Yields:
+            过滤后的数据块
+        """
+        actual_file_name = self._resolve_file_name(file_name)
+        file_path = self._locate_file(actual_file_name)
+        wanted = self._requested_columns(file_name, columns)
+        
+        read_columns = None
+        if wanted is not None:
+            source_columns = self._source_columns(file_path, file_name, actual_file_name)
+            extra_columns = [col for col in filter_columns(filters) if col not in wanted]
+            read_columns = [col for col in list(wanted) + extra_columns if col in source_columns]
+        
+        chunks = None
+        if self.ingest_cache is not None:
+            self._sync_appends(file_path, file_name, actual_file_name)
+            chunks = self.ingest_cache.iter_batches(file_path, read_columns, batch_size=chunksize)
+        if chunks is None:
+            chunks = self._iter_source(file_path, file_name, actual_file_name, read_columns, chunksize)
+        
+        for chunk in chunks:
+            if filters:
+                chunk = apply_filters(chunk, filters)
+            yield self._project(chunk, wanted)
+    
+    def _iter_source(self, file_path: Path, file_name: str, actual_file_name: str,
+                     columns: Optional[List[str]], chunksize: int) -> Iterator[pd.DataFrame]:
+        """分块解析源数据文件"""
+        if file_name.endswith('.csv') or actual_file_name.endswith('.csv'):
+            read_path, encoding = self._resolve_csv_source(file_path)
+            reader = pd.read_csv(read_path, encoding=encoding, usecols=columns, chunksize=chunksize)
+            with reader:
+                for chunk in reader:
+                    yield chunk
+        else:
+            # Excel 不支持分块读取，整体解析后再切块
+            logger.warning(f"{actual_file_name} 不支持分块解析，将整体读取后分块返回")
+            df = self._read_source(file_path, file_name, actual_file_name, usecols=columns)
+            for start in range(0, len(df), chunksize):
+                yield df.iloc[start:start + chunksize]
+    
     def get_data_info(self, file_name: str) -> Dict[str, Any]:
-        """获取数据文件的基本信息"""
-        if file_name not in self.data_cache:
-            self.load_data(file_name)
+        """获取数据文件的基本信息，优先使用清单中预先计算的统计信息"""
+        stats = self._dataset_stats(file_name)
+        if stats is not None:
+            return data_info_from_stats(stats, self._requested_columns(file_name, None))
         
-        df = self.data_cache[file_name]
+        df = self.load_data(file_name)
         return {
             "shape": df.shape,
             "columns": df.columns.tolist(),
@@ -134,11 +1373,12 @@ class MappedDataLoader:
         }
     
     def get_data_summary(self, file_name: str) -> Dict[str, Any]:
-        """获取数据文件的摘要统计信息"""
-        if file_name not in self.data_cache:
-            self.load_data(file_name)
+        """获取数据文件的摘要统计信息，优先使用清单中预先计算的统计信息"""
+        stats = self._dataset_stats(file_name)
+        if stats is not None:
+            return data_summary_from_stats(stats, self._requested_columns(file_name, None))
         
-        df = self.data_cache[file_name]
+        df = self.load_data(file_name)
         numeric_cols = df.select_dtypes(include=[np.number]).columns
         
         summary = {
@@ -147,7 +1387,7 @@ class MappedDataLoader:
         }
         
         # 对于分类变量的摘要
-        categorical_cols = df.select_dtypes(include=['object']).columns
+        categorical_cols = df.select_dtypes(include=['object', 'string', 'category']).columns
         for col in categorical_cols:
             summary["categorical_summary"][col] = {
                 "unique_count": df[col].nunique(),
@@ -161,9 +1401,7 @@ class MappedDataLoader:
         available_files = {}
         
         # 列出实际存在的文件
-        actual_files = []
-        for file_path in self.data_root_path.glob("*.csv"):
-            actual_files.append(file_path.name)
+        actual_files = self.file_index.files(suffixes=('.csv',))
         
         # 列出映射的文件
         mapped_files = {}
@@ -175,6 +1413,13 @@ class MappedDataLoader:
                 "exists": exists,
                 "description": config.get("description", "")
             }
+            # 已摄取过的文件直接从清单补充行数和列数，不加载数据
+            if exists and self.ingest_cache is not None:
+                manifest = self.ingest_cache.validate(self.data_root_path / actual_file)
+                if manifest is not None and "stats" in manifest:
+                    columns = self._requested_columns(logical_name, None)
+                    mapped_files[logical_name]["rows"] = manifest["stats"]["rows"]
+                    mapped_files[logical_name]["column_count"] = len(select_columns(manifest["stats"], columns))
         
         return {
             "actual_files": actual_files,
@@ -200,12 +1445,94 @@ class DataQuery:
             # 向后兼容，创建MappedDataLoader实例
             self.data_loader = MappedDataLoader(data_root_path=data_dir)
             self.data_dir = self.data_loader.data_root_path
+        self._sql_engine = None
+        self._aligner = None
+    
+    def sql(self, query: str, params: SQLParams = None) -> pd.DataFrame:
+        """
+        使用SQL查询映射数据集
+        
+        映射配置中的逻辑名可直接作为表名，支持连接、窗口函数和分组聚合，
+        由嵌入式DuckDB直接读取列式缓存执行，例如：
+        SELECT 省份, SUM(充电桩数量) FROM charging_infrastructure GROUP BY 省份
+        
+        Args:
+            query: SQL语句
+            params: 参数化查询的参数
+            
+        Returns:
+            查询结果
+        """
+        if self._sql_engine is None:
+            self._sql_engine = SQLEngine(self.data_loader)
+        return self._sql_engine.query(query, params)
+    
+    def align_series(self, series: List[Dict[str, Any]], target_freq: str = "M",
+                     start: Optional[str] = None, end: Optional[str] = None) -> pd.DataFrame:
+        """
+        将不同频率的多个时间序列对齐到同一频率
+        
+        例如将季度GDP（how='sum'，升频时平均分摊）与月度CPI（how='mean'，
+        filters={'数据频率': 'M'}）对齐到季度，结果按序列组合和目标频率缓存。
+        
+        Args:
+            series: 序列定义列表，格式见 frequency_alignment.normalize_series
+            target_freq: 目标频率，D/M/Q/Y
+            start: 起始时间
+            end: 结束时间
+            
+        Returns:
+            以期间为索引、各序列为列的面板
+        """
+        if self._aligner is None:
+            self._aligner = FrequencyAligner(self.data_loader)
+        return self._aligner.align(series, target_freq, start, end)
+    
+    def join_companies(self, base: str, others: Dict[str, List[str]],
+                       base_columns: Optional[List[str]] = None,
+                       period_col: Optional[str] = None) -> pd.DataFrame:
+        """
+        按证券代码连接多个公司数据集
+        
+        以基准数据集的行为准，从其他数据集取指定列，例如为财务摘要的每一行加上公司基本信息；
+        指定 period_col（如“会计年度”）时按证券代码和期间连接。匹配行由缓存的实体行位置直接确定。
+        
+        Args:
+            base: 基准数据集
+            others: 其他数据集到所需列的映射
+            base_columns: 基准数据集的列
+            period_col: 期间列
+            
+        Returns:
+            连接后的数据
+        """
+        return self.data_loader.entity_index.join(base, others, base_columns, period_col)
     
     def query_data(self, file_name: str, filters: Optional[Dict] = None, 
                    columns: Optional[List[str]] = None, 
                    limit: Optional[int] = None) -> pd.DataFrame:
         """查询数据"""
-        df = self.data_loader.load_data(file_name)
+        if columns and getattr(self.data_loader, "is_mmap_storage", lambda name: False)(file_name):
+            # 内存映射存储：先只读取过滤列确定行，再读取输出列的这些行
+            rows = None
+            if filters:
+                rows = apply_filters(self.data_loader.select(file_name, filter_columns(filters)), filters).index
+            df = self.data_loader.select(file_name, columns, rows=rows)
+        else:
+            # 只加载输出列和过滤列
+            load_columns = None
+            if columns:
+                load_columns = list(dict.fromkeys(list(columns) + filter_columns(filters)))
+            if getattr(self.data_loader, "is_partitioned_storage", lambda name: False)(file_name):
+                # 分区存储：按年份和公司代码上的过滤条件裁剪分区，只读取相关分区
+                df = self.data_loader.scan(file_name, load_columns, filters)
+                if filters:
+                    df = self.data_loader.filter_rows(file_name, df, filters)
+            else:
+                df = self.data_loader.load_data(file_name, columns=load_columns)
+                # 应用行过滤，可用时使用二级索引
+                if filters:
+                    df = self.data_loader.filter_rows(file_name, df, filters)
         
         # 应用列过滤
         if columns:
@@ -216,33 +1543,6 @@ class DataQuery:
             else:
                 logger.warning(f"指定的列 {columns} 在数据中不存在")
         
-        # 应用行过滤
-        if filters:
-            for col, condition in filters.items():
-                if col not in df.columns:
-                    logger.warning(f"过滤列 {col} 在数据中不存在，跳过")
-                    continue
-                    
-                if isinstance(condition, dict):
-                    if 'eq' in condition:
-                        df = df[df[col] == condition['eq']]
-                    elif 'ne' in condition:
-                        df = df[df[col] != condition['ne']]
-                    elif 'gt' in condition:
-                        df = df[df[col] > condition['gt']]
-                    elif 'lt' in condition:
-                        df = df[df[col] < condition['lt']]
-                    elif 'gte' in condition:
-                        df = df[df[col] >= condition['gte']]
-                    elif 'lte' in condition:
-                        df = df[df[col] <= condition['lte']]
-                    elif 'in' in condition:
-                        df = df[df[col].isin(condition['in'])]
-                    elif 'contains' in condition:
-                        df = df[df[col].str.contains(condition['contains'], na=False)]
-                else:
-                    df = df[df[col] == condition]
-        
         # 应用限制
         if limit:
             df = df.head(limit)
@@ -254,7 +1554,15 @@ class DataQuery:
                             start_date: Optional[str] = None, 
                             end_date: Optional[str] = None) -> pd.DataFrame:
         """获取时间序列数据"""
-        df = self.data_loader.load_data(file_name)
+        partitioned = getattr(self.data_loader, "is_partitioned_storage", lambda name: False)(file_name) \
+            and self.data_loader.partition_layout(file_name)["year_col"] == time_col
+        if partitioned:
+            # 按年份分区的文件只读取时间范围内的分区
+            year_range = (year_of(start_date) if start_date else None,
+                          year_of(end_date) if end_date else None)
+            df = self.data_loader.scan(file_name, [time_col] + list(value_cols), year_range=year_range)
+        else:
+            df = self.data_loader.load_data(file_name)
         
         # 检查时间列是否存在
         if time_col not in df.columns:
@@ -266,18 +1574,30 @@ class DataQuery:
             else:
                 raise ValueError(f"无法找到时间列: {time_col}")
         
-        # 确保时间列是datetime类型
-        if not pd.api.types.is_datetime64_any_dtype(df[time_col]):
-            df[time_col] = pd.to_datetime(df[time_col], errors='coerce')
-        
-        # 应用时间范围过滤
-        if start_date:
-            df = df[df[time_col] >= pd.to_datetime(start_date)]
-        if end_date:
-            df = df[df[time_col] <= pd.to_datetime(end_date)]
-        
-        # 按时间排序
-        df = df.sort_values(time_col)
+        view = None
+        if not partitioned:
+            view = getattr(self.data_loader, "time_view", lambda *args: None)(file_name, time_col)
+        if view is not None:
+            # 已按时间排序的视图：二分查找确定时间范围，只取出范围内的行和所需的列
+            df = view.slice(start_date or None, end_date or None, list(value_cols))
+        else:
+            # 分区扫描的结果只解析扫描到的行；整表使用加载器中已解析的时间列，不修改缓存数据
+            if partitioned:
+                parsed = self.data_loader.parse_time_values(file_name, df[time_col])
+            else:
+                parsed = self.data_loader.get_datetime_column(file_name, time_col)
+            if parsed is None:
+                parsed = pd.to_datetime(df[time_col], errors='coerce')
+            df = df.assign(**{time_col: parsed})
+            
+            # 应用时间范围过滤
+            if start_date:
+                df = df[df[time_col] >= pd.to_datetime(start_date)]
+            if end_date:
+                df = df[df[time_col] <= pd.to_datetime(end_date)]
+            
+            # 按时间排序
+            df = df.sort_values(time_col)
         
         # 确保值列存在
         available_value_cols = [col for col in value_cols if col in df.columns]
@@ -287,82 +1607,94 @@ class DataQuery:
         
         return df[[time_col] + available_value_cols]
     
-    def get_correlation_matrix(self, file_name: str, columns: Optional[List[str]] = None) -> Dict[str, Any]:
-        """计算相关性矩阵"""
-        df = self.data_loader.load_data(file_name)
+    def get_correlation_matrix(self, file_name: str, columns: Optional[List[str]] = None,
+                               streaming: bool = False, chunksize: int = 100_000,
+                               method: str = "pearson", top_k: Optional[int] = None) -> Dict[str, Any]:
+        """
+        计算相关性矩阵，结果按数据集版本号、列组合和方法缓存
         
-        # 只选择数值列
-        numeric_df = df.select_dtypes(include=[np.number])
+        数值列较多时（如876个指标的公司财务指标）分块并行计算；指定 top_k 时只返回
+        每列相关性最强的k个变量，不生成完整矩阵，此时 high_correlations 只在这些变量对中筛选。
         
-        if columns:
-            # 确保指定的列都是数值型
-            numeric_cols = [col for col in columns if col in numeric_df.columns]
-            if not numeric_cols:
-                raise ValueError("指定的列中没有数值型列")
-            numeric_df = numeric_df[numeric_cols]
+        Args:
+            file_name: 数据文件名
+            columns: 参与计算的列，为None时使用全部数值列
+            streaming: 是否按数据块流式累计，内存占用与行数无关
+            chunksize: 流式模式下每个数据块的行数
+            method: 相关系数方法，pearson/spearman/kendall
+            top_k: 每列保留的相关变量数，为None时返回完整矩阵
+        """
+        correlations = self.data_loader.correlations
+        if top_k is not None:
+            if streaming:
+                raise ValueError("top_k 模式不支持流式计算")
+            top = correlations.top_correlations(file_name, columns, method, top_k)
+            records = [dict(record, correlation=float(record["correlation"])) for record in top.to_dict("records")]
+            seen = set()
+            high_correlations = []
+            for record in records:
+                pair = frozenset((record["var1"], record["var2"]))
+                if abs(record["correlation"]) >= 0.7 and pair not in seen:
+                    seen.add(pair)
+                    high_correlations.append(record)
+            return {
+                "top_correlations": records,
+                "high_correlations": high_correlations
+            }
         
-        # 计算相关性矩阵
-        corr_matrix = numeric_df.corr()
+        corr_matrix = correlations.matrix(file_name, columns, method, streaming, chunksize)
         
         return {
             "correlation_matrix": corr_matrix.to_dict(),
-            "high_correlations": self._find_high_correlations(corr_matrix)
+            "high_correlations": find_high_correlations(corr_matrix)
         }
     
-    def _find_high_correlations(self, corr_matrix: pd.DataFrame, threshold: float = 0.7) -> List[Dict]:
-        """找出高相关性的变量对"""
-        high_corr = []
-        
-        for i in range(len(corr_matrix.columns)):
-            for j in range(i+1, len(corr_matrix.columns)):
-                corr_val = corr_matrix.iloc[i, j]
-                if abs(corr_val) >= threshold:
-                    high_corr.append({
-                        "var1": corr_matrix.columns[i],
-                        "var2": corr_matrix.columns[j],
-                        "correlation": corr_val
-                    })
-        
-        return high_corr
-    
     def compute_financial_ratios(self, file_name: str, company_col: str, 
                                 period_col: str, ratio_definitions: Dict[str, Dict]) -> pd.DataFrame:
-        """计算财务比率"""
-        df = self.data_loader.load_data(file_name)
-        
-        results = []
-        
-        for company, group in df.groupby(company_col):
-            for _, row in group.iterrows():
-                ratios = {}
-                
-                for ratio_name, definition in ratio_definitions.items():
-                    try:
-                        numerator = row[definition['numerator']]
-                        denominator = row[definition['denominator']]
-                        
-                        # 处理除零情况
-                        if denominator == 0:
-                            ratios[ratio_name] = np.nan
-                        else:
-                            ratios[ratio_name] = numerator / denominator
-                    except KeyError as e:
-                        logger.warning(f"缺少计算比率所需的列: {e}")
-                        ratios[ratio_name] = np.nan
-                
-                result_row = {
-                    company_col: company,
-                    period_col: row[period_col],
-                    **ratios
-                }
-                results.append(result_row)
+        """
+        计算财务比率
         
-        return pd.DataFrame(results)
+        Args:
+            file_name: 数据文件名
+            company_col: 公司列
+            period_col: 期间列
+            ratio_definitions: 比率定义，{'numerator': 项, 'denominator': 项} 或
+                {'growth': 项, 'periods': n}；项为列名，或带 lag（滞后期数）、
+                average（与上一期平均）的字典，例如 {'column': '总资产', 'average': True}
+            
+        Returns:
+            包含公司列、期间列和各比率列的数据，按公司和期间排序，分母为零时比率为NaN
+        """
+        return self.data_loader.financial_ratios(file_name, company_col, period_col, ratio_definitions)
     
     def aggregate_by_period(self, file_name: str, group_cols: List[str], 
-                           agg_cols: List[str], agg_funcs: List[str]) -> pd.DataFrame:
-        """按时期聚合数据"""
-        df = self.data_loader.load_data(file_name)
+                           agg_cols: List[str], agg_funcs: List[str],
+                           streaming: bool = False, chunksize: int = 100_000) -> pd.DataFrame:
+        """
+        按时期聚合数据
+        
+        Args:
+            file_name: 数据文件名
+            group_cols: 分组列
+            agg_cols: 聚合列
+            agg_funcs: 聚合函数列表
+            streaming: 是否按数据块流式聚合，仅支持 sum/count/min/max/mean/std/var
+            chunksize: 流式模式下每个数据块的行数
+        """
+        # 映射配置声明了覆盖该聚合的汇总立方体时由立方体再汇总
+        rolled = getattr(self.data_loader, "rollup", lambda *args: None)(file_name, group_cols, agg_cols, agg_funcs)
+        if rolled is not None:
+            return rolled
+        
+        load_columns = list(dict.fromkeys(group_cols + agg_cols))
+        
+        if streaming:
+            aggregator = GroupedAggregator(group_cols, agg_cols, agg_funcs)
+            for chunk in self.data_loader.load_data_iter(file_name, chunksize=chunksize, columns=load_columns):
+                aggregator.update(chunk)
+            return aggregator.result()
+        
+        df = self.data_loader.load_data(file_name, columns=load_columns)
         
         # 定义聚合字典
         agg_dict = {}
@@ -370,7 +1702,7 @@ class DataQuery:
             agg_dict[col] = agg_funcs
         
         # 执行聚合
-        result = df.groupby(group_cols).agg(agg_dict).reset_index()
+        result = df.groupby(group_cols, observed=True).agg(agg_dict).reset_index()
         
         # 展平多级列名
         if isinstance(result.columns, pd.MultiIndex):
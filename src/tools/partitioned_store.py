@@ -0,0 +1,293 @@
+"""
+分区列式存储模块，将“公司×年份”面板数据按年份和公司代码哈希分桶写为分区Parquet文件，
+查询时根据过滤条件裁剪分区，只读取可能包含结果的文件
+"""
+
+import os
+import json
+import math
+import zlib
+import shutil
+import hashlib
+import logging
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .time_columns import infer_datetime_format, parse_datetime
+from .filter_compiler import column_conditions
+
+logger = logging.getLogger(__name__)
+
+# 分区存储格式版本，结构变化时递增以使旧存储失效
+STORE_VERSION = 1
+
+# 默认的公司代码分桶数量
+DEFAULT_BUCKETS = 8
+
+# 保存源文件行位置的列，读取时还原为索引
+ROW_COLUMN = "__row__"
+
+# 年份缺失的行所在分区
+NULL_YEAR = "null"
+
+
+def normalize_code(value: Any) -> str:
+    """规范化公司代码，使整数形式和带前导零的字符串形式（1 与 '000001'）落入同一分桶"""
+    text = str(value).strip()
+    if text.replace(".", "", 1).isdigit():
+        return str(int(float(text)))
+    return text
+
+
+def code_bucket(value: Any, buckets: int) -> int:
+    """公司代码所在的分桶"""
+    return zlib.crc32(normalize_code(value).encode("utf-8")) % buckets
+
+
+def bucket_codes(series: pd.Series, buckets: int) -> np.ndarray:
+    """计算每行公司代码所在的分桶，相同代码只计算一次"""
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    unique_buckets = np.array([code_bucket(value, buckets) for value in uniques] + [0], dtype=np.int32)
+    return unique_buckets[codes]
+
+
+def year_of(value: Any) -> Optional[int]:
+    """从年份、日期或季度等取值中提取年份，无法识别时返回None"""
+    if isinstance(value, (bool, np.bool_)) or value is None:
+        return None
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        return int(math.floor(value)) if math.isfinite(value) else None
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        return pd.Timestamp(value).year
+    text = str(value).strip()
+    if text.isdigit() and len(text) == 4:
+        return int(text)
+    series = pd.Series([text], dtype=object)
+    fmt = infer_datetime_format(series)
+    if fmt is None:
+        return None
+    parsed = parse_datetime(series, fmt).iloc[0]
+    return None if pd.isna(parsed) else parsed.year
+
+
+def prune_years(op: str, value: Any) -> Optional[Tuple[Optional[int], Optional[int], Optional[Set[int]]]]:
+    """
+    由年份列上的一个条件确定需要读取的年份范围
+
+    Returns:
+        (下限, 上限, 年份集合)，均为闭区间；无法裁剪时返回None
+    """
+    if op in ("eq", "in"):
+        values = value if op == "in" else [value]
+        years = {year_of(item) for item in values}
+        return None if None in years else (None, None, years)
+    if op in ("gt", "gte", "lt", "lte"):
+        year = year_of(value)
+        if year is None:
+            return None
+        return (year, None, None) if op in ("gt", "gte") else (None, year, None)
+    return None
+
+
+def prune_buckets(op: str, value: Any, buckets: int) -> Optional[Set[int]]:
+    """由公司代码列上的一个条件确定需要读取的分桶，无法裁剪时返回None"""
+    if op == "eq":
+        return {code_bucket(value, buckets)}
+    if op == "in":
+        return {code_bucket(item, buckets) for item in value}
+    return None
+
+
+class PartitionedStore:
+    """
+    分区列式存储
+
+    每个源文件对应一个目录，按 year=<年份>/bucket=<分桶>.parquet 组织，
+    描述文件中记录各分区的年份、分桶和行数，读取时先按描述裁剪分区。
+    """
+
+    def __init__(self, store_dir: str = ".cache/data/partitions"):
+        """
+        初始化分区存储
+
+        Args:
+            store_dir: 分区存储根目录
+        """
+        self.store_dir = Path(store_dir)
+        self._meta_cache: Dict[str, Dict[str, Any]] = {}
+
+    def _entry_dir(self, source_path: Path) -> Path:
+        """根据源文件的规范路径确定存储目录"""
+        canonical = str(Path(source_path).resolve())
+        return self.store_dir / hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:20]
+
+    def load_meta(self, source_path: Path, signature: Dict[str, int],
+                  layout: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        读取分区存储的描述信息
+
+        Returns:
+            描述信息；不存在、格式过期、与源文件签名或分区方式不一致时返回None
+        """
+        entry_dir = self._entry_dir(source_path)
+        meta = self._meta_cache.get(str(entry_dir))
+        if meta is None:
+            meta_file = entry_dir / "meta.json"
+            if not meta_file.exists():
+                return None
+            try:
+                with open(meta_file, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"读取分区存储描述失败: {meta_file}, 错误: {str(e)}")
+                return None
+        if meta.get("store_version") != STORE_VERSION or meta.get("signature") != signature \
+                or meta.get("layout") != layout:
+            self._meta_cache.pop(str(entry_dir), None)
+            return None
+        self._meta_cache[str(entry_dir)] = meta
+        return meta
+
+    def build(self, source_path: Path, df: pd.DataFrame, years: np.ndarray,
+              signature: Dict[str, int], layout: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        将数据按年份和公司代码分桶写入分区存储
+
+        先写入临时目录，完成后整体替换，读取方不会看到写了一半的存储。
+
+        Args:
+            source_path: 源文件路径
+            df: 源文件的全部数据
+            years: 每行的年份（浮点数组，缺失为NaN），与df按位置对齐
+            signature: 解析前获取的源文件签名
+            layout: 分区方式（年份列、公司代码列和分桶数量）
+
+        Returns:
+            描述信息
+        """
+        entry_dir = self._entry_dir(source_path)
+        tmp_dir = entry_dir.with_name(f"{entry_dir.name}.{os.getpid()}.tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir(parents=True)
+
+        frame = df.reset_index(drop=True)
+        frame[ROW_COLUMN] = np.arange(len(frame), dtype=np.int64)
+        years = np.asarray(years, dtype=np.float64)
+        year_keys = np.where(np.isnan(years), NULL_YEAR, np.nan_to_num(years).astype(np.int64).astype(str))
+        bucket_keys = bucket_codes(frame[layout["code_col"]], layout["buckets"])
+
+        partitions = []
+        for (year, bucket), positions in frame.groupby([year_keys, bucket_keys], sort=True).indices.items():
+            relative = Path(f"year={year}") / f"bucket={int(bucket)}.parquet"
+            (tmp_dir / relative.parent).mkdir(exist_ok=True)
+            frame.iloc[positions].to_parquet(tmp_dir / relative, index=False)
+            partitions.append({
+                "year": None if year == NULL_YEAR else int(year),
+                "bucket": int(bucket),
+                "file": relative.as_posix(),
+                "rows": int(len(positions))
+            })
+
+        meta = {
+            "store_version": STORE_VERSION,
+            "source_path": str(Path(source_path).resolve()),
+            "signature": signature,
+            "layout": layout,
+            "rows": int(len(frame)),
+            "columns": [str(col) for col in df.columns],
+            "partitions": partitions
+        }
+        with open(tmp_dir / "meta.json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.replace(tmp_dir, entry_dir)
+        self._meta_cache[str(entry_dir)] = meta
+        logger.info(f"已写入分区存储: {source_path} -> {entry_dir.name}, {len(partitions)} 个分区, {len(frame)} 行")
+        return meta
+
+    def select_partitions(self, meta: Dict[str, Any], filters: Optional[Dict[str, Any]] = None,
+                          year_range: Optional[Tuple[Optional[int], Optional[int]]] = None) -> List[Dict[str, Any]]:
+        """
+        根据过滤条件裁剪分区
+
+        Args:
+            meta: 描述信息
+            filters: 过滤条件，年份列和公司代码列上的条件用于裁剪
+            year_range: 额外的年份闭区间 (下限, 上限)，任一端为None表示不限
+
+        Returns:
+            可能包含结果的分区
+        """
+        layout = meta["layout"]
+        year_constraints = []
+        if year_range is not None:
+            year_constraints.append((year_range[0], year_range[1], None))
+        buckets = None
+        # 只有与其他条件以AND组合的条件可用于裁剪
+        for col, op, value in column_conditions(filters):
+            if col == layout["year_col"]:
+                pruned = prune_years(op, value)
+                if pruned is not None:
+                    year_constraints.append(pruned)
+            elif col == layout["code_col"]:
+                pruned = prune_buckets(op, value, layout["buckets"])
+                if pruned is not None:
+                    buckets = pruned if buckets is None else buckets & pruned
+
+        selected = []
+        for partition in meta["partitions"]:
+            year = partition["year"]
+            if any(year is None or (lower is not None and year < lower) or (upper is not None and year > upper)
+                   or (years is not None and year not in years)
+                   for lower, upper, years in year_constraints):
+                continue
+            if buckets is not None and partition["bucket"] not in buckets:
+                continue
+            selected.append(partition)
+        return selected
+
+    def read(self, source_path: Path, meta: Dict[str, Any], columns: Optional[List[str]] = None,
+             filters: Optional[Dict[str, Any]] = None,
+             year_range: Optional[Tuple[Optional[int], Optional[int]]] = None,
+             partitions: Optional[List[Dict[str, Any]]] = None) -> pd.DataFrame:
+        """
+        读取裁剪后的分区
+
+        只做分区级别的裁剪，不按过滤条件筛选行，调用方仍需应用过滤条件。
+
+        Args:
+            source_path: 源文件路径
+            meta: load_meta 返回的描述信息
+            columns: 需要的列，为None时读取全部列
+            filters: 过滤条件，格式与 DataQuery.query_data 相同
+            year_range: 额外的年份闭区间 (下限, 上限)
+            partitions: 已由 select_partitions 裁剪的分区，指定时忽略 filters 和 year_range
+
+        Returns:
+            数据，按源文件行顺序排列，索引为行在源文件中的位置
+        """
+        entry_dir = self._entry_dir(source_path)
+        if partitions is None:
+            partitions = self.select_partitions(meta, filters, year_range)
+        if columns is not None:
+            stored = set(meta["columns"])
+            columns = [col for col in meta["columns"] if col in set(columns) and col in stored]
+        read_columns = None if columns is None else columns + [ROW_COLUMN]
+        logger.info(f"分区裁剪: {source_path.name} 读取 {len(partitions)}/{len(meta['partitions'])} 个分区")
+
+        frames = [pd.read_parquet(entry_dir / partition["file"], columns=read_columns)
+                  for partition in partitions]
+        if not frames:
+            empty = pd.DataFrame(columns=columns if columns is not None else meta["columns"])
+            empty.index = pd.Index([], dtype=np.int64)
+            return empty
+        df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+        df = df.sort_values(ROW_COLUMN, kind="stable")
+        df.index = pd.Index(df.pop(ROW_COLUMN).to_numpy())
+        return df
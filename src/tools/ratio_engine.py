@@ -0,0 +1,304 @@
+"""
+财务比率计算模块，将全部比率定义作为列表达式一次向量化求值，
+支持滞后项（增长率、期初期末平均余额）和分母为零的屏蔽，计算结果可按源文件签名缓存；
+滞后按期间取值而不是行位置对齐，缺少的期间不会被相邻的更早期间替代
+"""
+
+import os
+import json
+import hashlib
+import logging
+from pathlib import Path
+from typing import Dict, List, Any, Optional
+
+import numpy as np
+import pandas as pd
+
+from .frequency_alignment import infer_frequency
+
+logger = logging.getLogger(__name__)
+
+# 比率缓存格式版本，计算规则变化时递增以使旧缓存失效
+RATIO_STORE_VERSION = 2
+
+
+def _term(spec: Any, ratio_name: str) -> Dict[str, Any]:
+    """
+    规范化比率定义中的一项
+
+    列名表示当期取值；{'column': 列名, 'lag': n} 表示同一公司n期之前的取值；
+    {'column': 列名, 'average': True} 表示当期与上一期的平均值（期初期末平均余额）。
+    """
+    if isinstance(spec, str):
+        return {"column": spec, "lag": 0, "average": False}
+    if isinstance(spec, dict) and isinstance(spec.get("column"), str):
+        lag = int(spec.get("lag", 0))
+        if lag < 0:
+            raise ValueError(f"比率 {ratio_name} 的滞后期数不能为负数")
+        return {"column": spec["column"], "lag": lag, "average": bool(spec.get("average", False))}
+    raise ValueError(f"比率 {ratio_name} 的定义项无法识别: {spec!r}")
+
+
+def normalize_definitions(ratio_definitions: Dict[str, Dict]) -> Dict[str, Dict[str, Any]]:
+    """
+    规范化比率定义
+
+    支持两种定义：{'numerator': 项, 'denominator': 项} 为两项之比；
+    {'growth': 项, 'periods': n} 为相对n期之前的增长率（默认1期）。
+
+    Args:
+        ratio_definitions: 比率名到定义的映射
+
+    Returns:
+        规范化后的定义，保持比率的顺序
+    """
+    normalized = {}
+    for ratio_name, definition in ratio_definitions.items():
+        if not isinstance(definition, dict):
+            raise ValueError(f"比率 {ratio_name} 的定义需要是字典")
+        if "growth" in definition:
+            periods = int(definition.get("periods", 1))
+            if periods < 1:
+                raise ValueError(f"比率 {ratio_name} 的增长期数需要大于0")
+            normalized[ratio_name] = {"growth": _term(definition["growth"], ratio_name), "periods": periods}
+        elif "numerator" in definition and "denominator" in definition:
+            normalized[ratio_name] = {
+                "numerator": _term(definition["numerator"], ratio_name),
+                "denominator": _term(definition["denominator"], ratio_name)
+            }
+        else:
+            raise ValueError(f"比率 {ratio_name} 需要 numerator 和 denominator，或 growth")
+    return normalized
+
+
+def _terms(definition: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """定义中引用的项"""
+    if "growth" in definition:
+        return [definition["growth"]]
+    return [definition["numerator"], definition["denominator"]]
+
+
+def source_columns(definitions: Dict[str, Dict[str, Any]]) -> List[str]:
+    """规范化后的定义引用的数据列，按首次出现的顺序"""
+    return list(dict.fromkeys(term["column"] for definition in definitions.values()
+                              for term in _terms(definition)))
+
+
+def definitions_key(company_col: str, period_col: str, definitions: Dict[str, Dict[str, Any]]) -> str:
+    """公司列、期间列和比率定义共同确定的缓存键"""
+    payload = json.dumps([company_col, period_col, list(definitions.items())],
+                         ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:20]
+
+
+def safe_divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """逐元素相除，分母为零或缺失的位置为NaN"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = numerator / denominator
+    result[denominator == 0] = np.nan
+    return result
+
+
+def period_ordinals(periods: pd.Series) -> np.ndarray:
+    """
+    将期间列转换为整数序号，相邻期间相差1，缺失或无法解析的期间为NaN
+
+    数值（如会计年度2021）直接取整；日期按推断的频率（日、月、季、年）转换为期间序号；
+    其他文本先尝试按数值、再按日期解析，都无法解析时按全部期间的排序编号。
+    """
+    if pd.api.types.is_datetime64_any_dtype(periods.dtype):
+        times = periods
+    elif pd.api.types.is_numeric_dtype(periods.dtype) and not pd.api.types.is_bool_dtype(periods.dtype):
+        return np.floor(periods.to_numpy(dtype=np.float64, na_value=np.nan))
+    else:
+        numeric = pd.to_numeric(periods, errors="coerce")
+        if numeric.notna().sum() == periods.notna().sum():
+            return np.floor(numeric.to_numpy(dtype=np.float64, na_value=np.nan))
+        times = pd.to_datetime(periods, errors="coerce", format="mixed")
+        if times.notna().sum() != periods.notna().sum():
+            logger.warning("期间列无法按数值或日期解析，按期间排序编号，缺少的期间不会被识别")
+            codes, _ = pd.factorize(periods, sort=True, use_na_sentinel=True)
+            return np.where(codes >= 0, codes, np.nan).astype(np.float64)
+    freq = infer_frequency(times) or "Y"
+    ordinals = times.dt.to_period(freq).array.asi8.astype(np.float64)
+    ordinals[times.isna().to_numpy()] = np.nan
+    return ordinals
+
+
+class PanelColumns:
+    """
+    按公司和期间排序后的面板数据列
+
+    各列只转换一次为浮点数组，滞后项取同一公司期间序号减n的那一行，同一列的同一滞后只计算一次；
+    该期间不存在或同一公司有多行该期间（无法确定取哪一行）时为NaN。
+    """
+
+    def __init__(self, df: pd.DataFrame, company_col: str, period_col: str):
+        self.df = df
+        self.companies = pd.factorize(df[company_col])[0]
+        self.ordinals = period_ordinals(df[period_col])
+        self._arrays: Dict[tuple, np.ndarray] = {}
+        self._lag_rows: Dict[int, np.ndarray] = {}
+
+    def lag_rows(self, lag: int) -> np.ndarray:
+        """每行对应的同一公司n期之前的行位置，没有唯一对应行时为-1"""
+        if lag in self._lag_rows:
+            return self._lag_rows[lag]
+        rows = np.full(len(self.df), -1, dtype=np.int64)
+        valid = ~np.isnan(self.ordinals)
+        if valid.any():
+            offset = np.where(valid, self.ordinals - np.nanmin(self.ordinals), 0).astype(np.int64)
+            span = int(offset.max()) + lag + 1
+            keys = self.companies.astype(np.int64) * span + offset
+            keys[~valid] = -1
+            order = np.argsort(keys, kind="stable")
+            sorted_keys = keys[order]
+            wanted = keys - lag
+            wanted[~valid | (offset < lag)] = -2
+            left = np.searchsorted(sorted_keys, wanted, side="left")
+            right = np.searchsorted(sorted_keys, wanted, side="right")
+            unique = (right - left == 1) & (wanted >= 0)
+            rows[unique] = order[left[unique]]
+        self._lag_rows[lag] = rows
+        return rows
+
+    def values(self, column: str, lag: int = 0) -> np.ndarray:
+        """列在每行n期之前的取值，同一公司没有该期间时为NaN"""
+        key = (column, lag)
+        if key in self._arrays:
+            return self._arrays[key]
+        if lag == 0:
+            if column not in self.df.columns:
+                logger.warning(f"缺少计算比率所需的列: {column}")
+                array = np.full(len(self.df), np.nan)
+            else:
+                series = self.df[column]
+                if not pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_bool_dtype(series.dtype):
+                    series = pd.to_numeric(series, errors="coerce")
+                array = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        else:
+            current = self.values(column)
+            rows = self.lag_rows(lag)
+            array = np.where(rows >= 0, current[rows], np.nan)
+        self._arrays[key] = array
+        return array
+
+    def term(self, term: Dict[str, Any]) -> np.ndarray:
+        """计算一项的取值"""
+        value = self.values(term["column"], term["lag"])
+        if term["average"]:
+            value = (value + self.values(term["column"], term["lag"] + 1)) / 2
+        return value
+
+
+def compute_ratios(df: pd.DataFrame, company_col: str, period_col: str,
+                   ratio_definitions: Dict[str, Dict]) -> pd.DataFrame:
+    """
+    计算财务比率
+
+    数据按公司和期间稳定排序后，所有比率作为整列运算一次求出；
+    滞后取同一公司n期之前的期间（如2021年的上一期为2020年），该期间缺失或重复时为NaN，
+    分母为零或缺失时结果为NaN。
+
+    Args:
+        df: 包含公司列、期间列和比率所需列的数据
+        company_col: 公司列
+        period_col: 期间列
+        ratio_definitions: 比率定义，格式见 normalize_definitions
+
+    Returns:
+        包含公司列、期间列和各比率列的数据，按公司和期间排序；公司缺失的行不参与计算
+    """
+    definitions = normalize_definitions(ratio_definitions)
+    frame = df[df[company_col].notna()] if df[company_col].hasnans else df
+    frame = frame.sort_values([company_col, period_col], kind="stable").reset_index(drop=True)
+    panel = PanelColumns(frame, company_col, period_col)
+
+    ratios = {}
+    for ratio_name, definition in definitions.items():
+        if "growth" in definition:
+            term = definition["growth"]
+            base = dict(term, lag=term["lag"] + definition["periods"])
+            ratios[ratio_name] = safe_divide(panel.term(term), panel.term(base)) - 1
+        else:
+            ratios[ratio_name] = safe_divide(panel.term(definition["numerator"]),
+                                             panel.term(definition["denominator"]))
+
+    result = frame[[company_col, period_col]].copy()
+    for ratio_name, values in ratios.items():
+        result[ratio_name] = values
+    return result
+
+
+class RatioStore:
+    """
+    财务比率缓存
+
+    每个源文件对应一个目录，每组比率定义的结果写为一个Parquet文件，
+    描述文件中记录计算时的源文件签名，签名不一致时视为失效。
+    """
+
+    def __init__(self, store_dir: str = ".cache/data/ratios"):
+        """
+        初始化比率缓存
+
+        Args:
+            store_dir: 比率缓存根目录
+        """
+        self.store_dir = Path(store_dir)
+
+    def _entry_dir(self, source_path: Path) -> Path:
+        """根据源文件的规范路径确定存储目录"""
+        canonical = str(Path(source_path).resolve())
+        return self.store_dir / hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:20]
+
+    def load(self, source_path: Path, signature: Dict[str, int], key: str) -> Optional[pd.DataFrame]:
+        """
+        读取缓存的比率
+
+        Returns:
+            比率数据；不存在、格式过期或与源文件签名不一致时返回None
+        """
+        entry_dir = self._entry_dir(source_path)
+        meta_file = entry_dir / f"{key}.json"
+        if not meta_file.exists():
+            return None
+        try:
+            with open(meta_file, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("store_version") != RATIO_STORE_VERSION or meta.get("signature") != signature:
+                return None
+            return pd.read_parquet(entry_dir / f"{key}.parquet")
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取比率缓存失败: {meta_file}, 错误: {str(e)}")
+            return None
+
+    def save(self, source_path: Path, signature: Dict[str, int], key: str, df: pd.DataFrame) -> None:
+        """写入比率缓存，同时清理该源文件签名已过期的其他缓存"""
+        entry_dir = self._entry_dir(source_path)
+        entry_dir.mkdir(parents=True, exist_ok=True)
+        tmp_file = entry_dir / f"{key}.{os.getpid()}.tmp"
+        try:
+            df.to_parquet(tmp_file, index=False)
+            os.replace(tmp_file, entry_dir / f"{key}.parquet")
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump({"store_version": RATIO_STORE_VERSION, "signature": signature,
+                           "rows": int(len(df))}, f)
+            os.replace(tmp_file, entry_dir / f"{key}.json")
+        except (OSError, ValueError) as e:
+            logger.warning(f"写入比率缓存失败: {source_path}, 错误: {str(e)}")
+            tmp_file.unlink(missing_ok=True)
+            return
+
+        for meta_file in entry_dir.glob("*.json"):
+            if meta_file.stem == key:
+                continue
+            try:
+                with open(meta_file, "r", encoding="utf-8") as f:
+                    stale = json.load(f).get("signature") != signature
+            except (OSError, ValueError):
+                stale = True
+            if stale:
+                meta_file.unlink(missing_ok=True)
+                meta_file.with_suffix(".parquet").unlink(missing_ok=True)
+        logger.info(f"已缓存财务比率: {source_path} -> {entry_dir.name}/{key}, {len(df)} 行")
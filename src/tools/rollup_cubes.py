@@ -0,0 +1,159 @@
+"""
+汇总立方体模块，按声明的维度组合预先计算并持久化可合并的分组聚合结果，
+更粗的分组由立方体再汇总得到，源文件追加新行时只累计新增的行
+"""
+
+import os
+import json
+import hashlib
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from .streaming_aggregates import GroupedAggregator, STREAMABLE_AGG_FUNCS
+
+logger = logging.getLogger(__name__)
+
+# 立方体存储格式版本，结构变化时递增以使旧存储失效
+CUBE_STORE_VERSION = 1
+
+# 立方体保存的部分结果，离差平方和用于合并方差
+PARTS = ("sum", "count", "min", "max", "m2")
+
+
+def cube_key(dimensions: List[str], measures: List[str]) -> str:
+    """维度和度量列共同确定的立方体键"""
+    payload = json.dumps([list(dimensions), list(measures)], ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:20]
+
+
+def covers(spec: Dict[str, List[str]], group_cols: List[str], agg_cols: List[str],
+           agg_funcs: List[str]) -> bool:
+    """立方体能否回答指定的分组聚合"""
+    return (bool(group_cols) and set(group_cols) <= set(spec["dimensions"])
+            and set(agg_cols) <= set(spec["measures"]) and set(agg_funcs) <= STREAMABLE_AGG_FUNCS)
+
+
+class RollupCube:
+    """
+    汇总立方体
+
+    保存每组的 sum/count/min/max 和离差平方和，可由这些部分结果得到
+    sum/count/min/max/mean/std/var，并可按维度子集再汇总。
+    """
+
+    def __init__(self, dimensions: List[str], measures: List[str], version: Optional[int] = None):
+        self.dimensions = list(dimensions)
+        self.measures = list(measures)
+        self.version = version
+        # 聚合函数包含var，使累加器同时累计离差平方和
+        self.aggregator = GroupedAggregator(self.dimensions, self.measures, ["sum", "var"])
+
+    def update(self, df: pd.DataFrame) -> None:
+        """累计新的行"""
+        self.aggregator.update(df[self.dimensions + self.measures])
+
+    @property
+    def groups(self) -> int:
+        """立方体中的分组数量"""
+        partial = self.aggregator.partial
+        return 0 if partial is None else len(partial["sum"])
+
+    def rollup(self, group_cols: List[str], agg_cols: List[str], agg_funcs: List[str]) -> pd.DataFrame:
+        """
+        按维度子集再汇总
+
+        Returns:
+            与 DataQuery.aggregate_by_period 相同格式的聚合结果
+        """
+        return self.aggregator.rollup(group_cols, agg_cols, agg_funcs).result()
+
+    def to_frame(self) -> pd.DataFrame:
+        """展平为维度列加“部分结果:度量列”列的数据，用于持久化"""
+        partial = self.aggregator.partial
+        if partial is None:
+            return pd.DataFrame(columns=self.dimensions + [f"{part}:{col}" for part in PARTS for col in self.measures])
+        flat = pd.concat({part: partial[part] for part in PARTS}, axis=1)
+        flat.columns = [f"{part}:{col}" for part, col in flat.columns]
+        flat.index.names = self.dimensions
+        return flat.reset_index()
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, dimensions: List[str], measures: List[str],
+                   version: Optional[int]) -> "RollupCube":
+        """由 to_frame 的结果还原立方体"""
+        cube = cls(dimensions, measures, version)
+        if len(df):
+            indexed = df.set_index(dimensions)
+            cube.aggregator.partial = {
+                part: indexed[[f"{part}:{col}" for col in measures]].set_axis(measures, axis=1)
+                for part in PARTS
+            }
+        return cube
+
+
+class RollupStore:
+    """
+    汇总立方体存储
+
+    每个源文件对应一个目录，每个立方体写为一个Parquet文件，
+    描述文件中记录立方体对应的数据集版本号。
+    """
+
+    def __init__(self, store_dir: str = ".cache/data/rollups"):
+        """
+        初始化立方体存储
+
+        Args:
+            store_dir: 立方体存储根目录
+        """
+        self.store_dir = Path(store_dir)
+
+    def _entry_dir(self, source_path: Path) -> Path:
+        """根据源文件的规范路径确定存储目录"""
+        canonical = str(Path(source_path).resolve())
+        return self.store_dir / hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:20]
+
+    def load(self, source_path: Path, dimensions: List[str], measures: List[str]) -> Optional[RollupCube]:
+        """
+        读取持久化的立方体
+
+        Returns:
+            立方体（版本号为写入时的数据集版本）；不存在或格式过期时返回None
+        """
+        key = cube_key(dimensions, measures)
+        entry_dir = self._entry_dir(source_path)
+        meta_file = entry_dir / f"{key}.json"
+        if not meta_file.exists():
+            return None
+        try:
+            with open(meta_file, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("store_version") != CUBE_STORE_VERSION:
+                return None
+            df = pd.read_parquet(entry_dir / f"{key}.parquet")
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取汇总立方体失败: {meta_file}, 错误: {str(e)}")
+            return None
+        return RollupCube.from_frame(df, dimensions, measures, meta.get("version"))
+
+    def save(self, source_path: Path, cube: RollupCube) -> None:
+        """写入立方体，先移除旧描述再写数据和描述，中断时不会留下版本号与数据不一致的立方体"""
+        key = cube_key(cube.dimensions, cube.measures)
+        entry_dir = self._entry_dir(source_path)
+        entry_dir.mkdir(parents=True, exist_ok=True)
+        tmp_file = entry_dir / f"{key}.{os.getpid()}.tmp"
+        try:
+            (entry_dir / f"{key}.json").unlink(missing_ok=True)
+            cube.to_frame().to_parquet(tmp_file, index=False)
+            os.replace(tmp_file, entry_dir / f"{key}.parquet")
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump({"store_version": CUBE_STORE_VERSION, "version": cube.version,
+                           "dimensions": cube.dimensions, "measures": cube.measures,
+                           "groups": cube.groups}, f, ensure_ascii=False)
+            os.replace(tmp_file, entry_dir / f"{key}.json")
+        except (OSError, ValueError) as e:
+            logger.warning(f"写入汇总立方体失败: {source_path}, 错误: {str(e)}")
+            tmp_file.unlink(missing_ok=True)
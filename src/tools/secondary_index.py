@@ -0,0 +1,168 @@
+"""
+二级索引模块，为数据集的实体列和日期列建立哈希索引和有序索引，
+等值、集合和范围过滤直接定位行位置，不再逐行扫描整列
+"""
+
+import logging
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 未在映射配置中声明索引的列，被过滤达到该次数后才自动建立索引，以摊销建立成本
+AUTO_INDEX_THRESHOLD = 2
+
+HASH = "hash"
+SORTED = "sorted"
+
+# 各过滤运算符可使用的索引类型
+OPERATOR_INDEX = {
+    "eq": HASH,
+    "in": HASH,
+    "gt": SORTED,
+    "gte": SORTED,
+    "lt": SORTED,
+    "lte": SORTED,
+}
+
+
+class HashIndex:
+    """哈希索引：取值到行位置的映射，用于 eq 和 in 过滤"""
+
+    kind = HASH
+
+    def __init__(self, series: pd.Series):
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        # 按取值编码稳定排序，同一取值的行位置连续存放且保持原有顺序
+        self.order = np.argsort(codes, kind="stable").astype(np.int64, copy=False)
+        counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        self.offsets = np.concatenate([[0], np.cumsum(counts)]) + int((codes < 0).sum())
+        self.slots = {value: i for i, value in enumerate(uniques)}
+        self.length = len(series)
+
+    def positions(self, op: str, value: Any) -> np.ndarray:
+        """返回满足条件的行位置（升序）"""
+        if op == "in" and not pd.api.types.is_list_like(value):
+            raise TypeError("in 条件需要列表取值")
+        values = value if op == "in" else [value]
+        if op == "in" and pd.isna(pd.Series(list(values), dtype=object)).any():
+            # isin 会匹配缺失值，索引中不含缺失值
+            raise ValueError("集合中包含缺失值")
+        slices = []
+        for item in values:
+            slot = self.slots.get(item)
+            if slot is not None:
+                slices.append(self.order[self.offsets[slot]:self.offsets[slot + 1]])
+        if not slices:
+            return np.empty(0, dtype=np.int64)
+        if len(slices) == 1:
+            return slices[0]
+        return np.sort(np.concatenate(slices))
+
+
+class SortedIndex:
+    """有序索引：按取值排序的行位置，用于范围过滤"""
+
+    kind = SORTED
+
+    def __init__(self, series: pd.Series):
+        self.datetime = pd.api.types.is_datetime64_dtype(series.dtype)
+        if pd.api.types.is_numeric_dtype(series.dtype) and not isinstance(series.dtype, np.dtype):
+            values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        else:
+            values = series.to_numpy()
+        valid = np.flatnonzero(series.notna().to_numpy())
+        order = np.argsort(values[valid], kind="stable")
+        self.sorted_values = values[valid][order]
+        self.order = valid[order].astype(np.int64, copy=False)
+        self.text = self.sorted_values.dtype == object
+        self.length = len(series)
+
+    def _bound(self, value: Any) -> Any:
+        """将过滤取值转换为可与索引取值比较的类型，类型不兼容时抛出TypeError"""
+        if self.datetime:
+            return pd.Timestamp(value).to_datetime64()
+        if self.text:
+            if not isinstance(value, str):
+                raise TypeError("字符串列只支持字符串取值的范围过滤")
+            return value
+        if isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+            return value
+        raise TypeError("数值列只支持数值取值的范围过滤")
+
+    def positions(self, op: str, value: Any) -> np.ndarray:
+        """返回满足条件的行位置（升序）"""
+        bound = self._bound(value)
+        if op in ("gt", "gte"):
+            start = np.searchsorted(self.sorted_values, bound, side="right" if op == "gt" else "left")
+            selected = self.order[start:]
+        else:
+            end = np.searchsorted(self.sorted_values, bound, side="left" if op == "lt" else "right")
+            selected = self.order[:end]
+        return np.sort(selected)
+
+
+Index = Union[HashIndex, SortedIndex]
+
+
+def supports(series: pd.Series, kind: str) -> bool:
+    """列的类型是否支持指定的索引"""
+    dtype = series.dtype
+    if kind == HASH:
+        # datetime列的等值比较会解析字符串取值，哈希查找无法保持同样的语义
+        return not pd.api.types.is_datetime64_any_dtype(dtype)
+    if isinstance(dtype, pd.CategoricalDtype) or pd.api.types.is_bool_dtype(dtype):
+        return False
+    if pd.api.types.is_numeric_dtype(dtype) or pd.api.types.is_datetime64_dtype(dtype):
+        return True
+    # 字符串列按字典序比较，要求没有缺失值且全部为字符串
+    return (pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype)) \
+        and series.notna().all() and series.map(type).eq(str).all()
+
+
+def build_index(series: pd.Series, kind: str) -> Optional[Index]:
+    """
+    建立索引
+
+    Args:
+        series: 被索引的列
+        kind: 'hash' 或 'sorted'
+
+    Returns:
+        索引；列的类型不支持时返回None
+    """
+    if not supports(series, kind):
+        return None
+    index = HashIndex(series) if kind == HASH else SortedIndex(series)
+    logger.info(f"已建立{'哈希' if kind == HASH else '有序'}索引: {series.name}, {len(series)} 行")
+    return index
+
+
+class IndexSet:
+    """
+    数据集的索引集合
+
+    索引在首次可用时按需建立并缓存；映射配置中声明的列首次过滤即建立，
+    其他列被过滤达到 AUTO_INDEX_THRESHOLD 次后建立。
+    """
+
+    def __init__(self, declared: Optional[List[str]] = None):
+        self.declared = set(declared or [])
+        self.indexes: Dict[tuple, Optional[Index]] = {}
+        self.filter_counts: Dict[str, int] = {}
+
+    def get(self, series: pd.Series, kind: str) -> Optional[Index]:
+        """获取列的索引，尚未满足建立条件时返回None"""
+        key = (series.name, kind)
+        if key in self.indexes:
+            index = self.indexes[key]
+            if index is None or index.length == len(series):
+                return index
+        count = self.filter_counts.get(series.name, 0) + 1
+        self.filter_counts[series.name] = count
+        if series.name not in self.declared and count < AUTO_INDEX_THRESHOLD:
+            return None
+        index = self.indexes[key] = build_index(series, kind)
+        return index
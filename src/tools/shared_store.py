@@ -0,0 +1,457 @@
+"""
+共享内存数据集存储模块，在多个进程（如多个uvicorn worker）之间零拷贝共享已加载的数据
+"""
+
+import os
+import json
+import time
+import atexit
+import hashlib
+import inspect
+import logging
+import threading
+from pathlib import Path
+from multiprocessing import shared_memory
+from typing import Dict, List, Any, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 各列缓冲区在共享内存段中的对齐字节数
+ALIGNMENT = 64
+
+# 共享内存段名称前缀
+SEGMENT_PREFIX = "fir_"
+
+# 登记目录中记录所有者进程号的文件
+OWNER_FILE = "owner.pid"
+
+# 所有者文件内容无法解析时的重试次数和间隔（秒）
+OWNER_RETRIES = 20
+OWNER_RETRY_DELAY = 0.05
+
+# Python 3.13+ 支持在创建或连接共享内存段时关闭resource_tracker跟踪
+_SUPPORTS_TRACK = "track" in inspect.signature(shared_memory.SharedMemory).parameters
+
+# 本进程已打开的共享内存段。数据视图可能比存储对象存活更久，
+# 段对象一旦被回收，其映射会被关闭，因此在进程级别保持引用
+_SEGMENTS: Dict[str, shared_memory.SharedMemory] = {}
+_SEGMENTS_LOCK = threading.Lock()
+
+
+def _resource_tracker_call(method: str, segment: shared_memory.SharedMemory) -> None:
+    """
+    调整resource_tracker对共享内存段的登记
+
+    POSIX系统上resource_tracker会在进程退出时回收其登记过的共享内存段，
+    这会让其他worker仍在使用的数据失效。共享内存段的生命周期改由 cleanup() 管理。
+    """
+    if os.name != "posix" or _SUPPORTS_TRACK:
+        return
+    try:
+        from multiprocessing import resource_tracker
+        getattr(resource_tracker, method)(segment._name, "shared_memory")
+    except Exception as e:
+        logger.debug(f"调整共享内存跟踪失败: {segment.name}, 错误: {str(e)}")
+
+
+def _open_segment(name: str, size: int = 0, create: bool = False) -> shared_memory.SharedMemory:
+    """创建或连接共享内存段，不由resource_tracker回收"""
+    if _SUPPORTS_TRACK:
+        return shared_memory.SharedMemory(name=name, create=create, size=size, track=False)
+    segment = shared_memory.SharedMemory(name=name, create=create, size=size)
+    _resource_tracker_call("unregister", segment)
+    return segment
+
+
+def _unlink_segment(segment: shared_memory.SharedMemory) -> None:
+    """删除共享内存段"""
+    # 旧版本的 unlink() 会向resource_tracker取消登记，先补回登记以保持配对
+    _resource_tracker_call("register", segment)
+    segment.unlink()
+
+
+def _pid_alive(pid: int) -> bool:
+    """进程是否仍在运行；非POSIX系统无法安全探测，视为仍在运行"""
+    if os.name != "posix":
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _aligned(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def encode_column(series: pd.Series) -> Tuple[Dict[str, Any], List[np.ndarray]]:
+    """
+    将列编码为定长缓冲区
+
+    数值、布尔和时间列直接使用其NumPy数组；带时区的时间列保存UTC时间的整数取值和时区；
+    可空数值类型转换为float64；字符串和分类列做字典编码，保存int32编码以及
+    UTF-8字典（偏移数组+字节块）。列描述中记录原始类型，连接时还原。
+
+    Returns:
+        (列描述, 需要写入的数组列表)
+    """
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy(dtype=np.int32)
+        categories = [str(value) for value in series.cat.categories]
+        spec = {"kind": "dictionary", "categorical": True, "ordered": bool(dtype.ordered),
+                "categories_dtype": str(dtype.categories.dtype)}
+    elif isinstance(dtype, pd.DatetimeTZDtype):
+        values = np.ascontiguousarray(series.dt.tz_convert("UTC").dt.tz_localize(None).to_numpy())
+        return {"kind": "array", "dtype": values.dtype.str, "tz": str(dtype.tz), "pandas_dtype": str(dtype)}, [values]
+    elif isinstance(dtype, np.dtype) and dtype.kind in "biufcmM":
+        values = np.ascontiguousarray(series.to_numpy())
+        return {"kind": "array", "dtype": values.dtype.str}, [values]
+    elif pd.api.types.is_numeric_dtype(dtype):
+        # 可空扩展类型，缺失值转换为NaN，连接时还原为原始类型
+        values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        return {"kind": "array", "dtype": values.dtype.str, "pandas_dtype": str(dtype)}, [values]
+    else:
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        codes = codes.astype(np.int32, copy=False)
+        categories = [str(value) for value in uniques]
+        spec = {"kind": "dictionary", "categorical": False, "pandas_dtype": str(dtype)}
+
+    encoded = [value.encode("utf-8") for value in categories]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(value) for value in encoded], dtype=np.int64)
+    blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    spec["dict_size"] = len(encoded)
+    return spec, [codes, offsets, blob]
+
+
+def decode_column(spec: Dict[str, Any], buffers: List[np.ndarray], index: Optional[pd.Index] = None) -> Any:
+    """
+    根据列描述和缓冲区还原列数据
+
+    NumPy类型的列直接返回缓冲区本身（不复制）；带时区的时间列和可空数值列还原为原始类型；
+    字典编码的列还原为分类数据或原始类型的字符串序列（以 index 为索引，保留object类型）。
+    """
+    if spec["kind"] == "array":
+        values = buffers[0]
+        if "tz" in spec:
+            return pd.DatetimeIndex(values).tz_localize("UTC").tz_convert(spec["tz"]).array
+        if "pandas_dtype" in spec:
+            return pd.array(values).astype(spec["pandas_dtype"])
+        return values
+
+    codes, offsets, blob = buffers
+    raw = blob.tobytes()
+    categories = [raw[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(spec["dict_size"])]
+    if spec["categorical"]:
+        index = pd.Index(categories, dtype=object)
+        if spec.get("categories_dtype") not in (None, "object"):
+            index = index.astype(spec["categories_dtype"])
+        return pd.Categorical.from_codes(codes, categories=index, ordered=spec.get("ordered", False))
+    # 字符串列需要还原为Python对象，每个进程只保留一份
+    values = np.asarray(categories + [None], dtype=object)[codes]
+    return pd.Series(values, index=index, dtype=spec.get("pandas_dtype", "object"), copy=False)
+
+
+class SharedDatasetStore:
+    """
+    跨进程共享的数据集存储
+
+    发布方将DataFrame各列写入一个共享内存段，并在登记目录中写入描述文件；
+    其他进程根据登记信息连接同一共享内存段，数值列以只读NumPy视图直接使用，不复制数据。
+    """
+
+    def __init__(self, registry_dir: str = ".cache/data/shared"):
+        """
+        初始化共享数据集存储
+
+        Args:
+            registry_dir: 登记目录，保存各数据集的共享内存段描述
+        """
+        self.registry_dir = Path(registry_dir)
+        self.owner = False
+
+    @staticmethod
+    def _digest(text: str) -> str:
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()[:20]
+
+    def _registry_path(self, key: str) -> Path:
+        return self.registry_dir / f"{self._digest(key)}.json"
+
+    def _read_registry(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取数据集的登记信息"""
+        registry_file = self._registry_path(key)
+        if not registry_file.exists():
+            return None
+        try:
+            with open(registry_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取共享数据登记失败: {registry_file}, 错误: {str(e)}")
+            return None
+
+    def _write_registry(self, key: str, entry: Dict[str, Any]) -> None:
+        """原子地写入数据集的登记信息"""
+        registry_file = self._registry_path(key)
+        tmp_file = registry_file.with_suffix(f".json.{os.getpid()}.tmp")
+        self.registry_dir.mkdir(parents=True, exist_ok=True)
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_file, registry_file)
+
+    def _segment(self, name: str) -> Optional[shared_memory.SharedMemory]:
+        """获取已连接的共享内存段，未连接时连接"""
+        with _SEGMENTS_LOCK:
+            segment = _SEGMENTS.get(name)
+            if segment is None:
+                try:
+                    segment = _open_segment(name)
+                except FileNotFoundError:
+                    return None
+                _SEGMENTS[name] = segment
+            return segment
+
+    @staticmethod
+    def _segment_exists(name: str) -> bool:
+        """共享内存段是否仍可被其他进程连接，本进程已打开的映射不能说明该段仍存在"""
+        try:
+            segment = _open_segment(name)
+        except FileNotFoundError:
+            return False
+        segment.close()
+        return True
+
+    def publish(self, key: str, df: pd.DataFrame, signature: Dict[str, int],
+                complete: bool = True) -> bool:
+        """
+        将数据集发布到共享内存
+
+        Args:
+            key: 数据集键
+            df: 数据，需要使用默认的RangeIndex
+            signature: 源文件签名，用于判断共享数据是否过期
+            complete: 数据是否包含源文件的全部列
+
+        Returns:
+            是否发布成功；同一版本已由其他进程发布时返回False
+        """
+        if not isinstance(df.index, pd.RangeIndex) or df.index.start != 0 or df.index.step != 1:
+            logger.warning(f"数据 {key} 不是默认索引，不发布到共享内存")
+            return False
+
+        previous = self._read_registry(key)
+        if previous and previous.get("signature") == signature \
+                and set(df.columns.map(str)) <= {spec["name"] for spec in previous["columns"]} \
+                and (previous.get("complete") or not complete):
+            if self._segment_exists(previous["segment"]):
+                # 已发布的数据覆盖了当前数据，无需重复发布
+                return False
+            # 共享内存段已被删除（如 /dev/shm 被清空），登记信息失效，重新发布
+            logger.info(f"共享数据 {key} 的共享内存段已不存在，重新发布")
+            with _SEGMENTS_LOCK:
+                _SEGMENTS.pop(previous["segment"], None)
+
+        columns = []
+        buffers = []
+        offset = 0
+        for col in df.columns:
+            spec, arrays = encode_column(df[col])
+            spec["name"] = str(col)
+            spec["buffers"] = []
+            for array in arrays:
+                offset = _aligned(offset)
+                spec["buffers"].append({"offset": offset, "dtype": array.dtype.str, "length": int(len(array))})
+                buffers.append((offset, array))
+                offset += array.nbytes
+            columns.append(spec)
+
+        segment_name = SEGMENT_PREFIX + self._digest(f"{key}|{signature}|{sorted(df.columns.map(str))}")
+        try:
+            segment = _open_segment(segment_name, size=max(offset, 1), create=True)
+        except FileExistsError:
+            logger.info(f"共享数据 {key} 已由其他进程发布")
+            return False
+
+        for buffer_offset, array in buffers:
+            target = np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf, offset=buffer_offset)
+            target[...] = array
+
+        self._write_registry(key, {
+            "key": key,
+            "segment": segment_name,
+            "rows": int(len(df)),
+            "columns": columns,
+            "signature": signature,
+            "complete": complete
+        })
+        with _SEGMENTS_LOCK:
+            _SEGMENTS[segment_name] = segment
+        if previous and previous.get("segment") != segment_name:
+            self._unlink(previous["segment"])
+        logger.info(f"已发布共享数据: {key}, 段: {segment_name}, {offset / 1024 / 1024:.2f}MB")
+        return True
+
+    def attach(self, key: str, signature: Dict[str, int],
+               columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+        """
+        连接共享内存中的数据集
+
+        Args:
+            key: 数据集键
+            signature: 当前源文件签名，与发布时不一致时视为过期
+            columns: 需要的列，为None时需要全部列
+
+        Returns:
+            数据，数值列为共享内存上的只读视图；未发布、过期或缺少所需列时返回None
+        """
+        entry = self._read_registry(key)
+        if entry is None or entry.get("signature") != signature:
+            return None
+        stored = {spec["name"]: spec for spec in entry["columns"]}
+        if columns is None:
+            if not entry.get("complete"):
+                return None
+            specs = entry["columns"]
+        else:
+            if not set(columns) <= set(stored):
+                return None
+            specs = [spec for spec in entry["columns"] if spec["name"] in set(columns)]
+
+        segment = self._segment(entry["segment"])
+        if segment is None:
+            return None
+
+        index = pd.RangeIndex(entry["rows"])
+        data = {
+            spec["name"]: decode_column(spec, [self._view(segment, buffer) for buffer in spec["buffers"]], index)
+            for spec in specs
+        }
+        df = pd.DataFrame(data, index=index, copy=False)
+        logger.info(f"已连接共享数据: {key}, 形状: {df.shape}")
+        return df
+
+    @staticmethod
+    def _view(segment: shared_memory.SharedMemory, buffer: Dict[str, Any]) -> np.ndarray:
+        """共享内存上的只读数组视图"""
+        array = np.ndarray((buffer["length"],), dtype=np.dtype(buffer["dtype"]),
+                           buffer=segment.buf, offset=buffer["offset"])
+        array.flags.writeable = False
+        return array
+
+    def _unlink(self, segment_name: str) -> None:
+        """删除共享内存段；已连接该段的进程仍可继续使用其映射"""
+        with _SEGMENTS_LOCK:
+            # 本进程可能仍有基于该段的数据视图，保留引用直到进程退出
+            segment = _SEGMENTS.get(segment_name)
+        try:
+            if segment is None:
+                segment = _open_segment(segment_name)
+            _unlink_segment(segment)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"删除共享内存段失败: {segment_name}, 错误: {str(e)}")
+
+    def cleanup(self) -> None:
+        """删除所有已登记的共享内存段和登记文件"""
+        for registry_file in self.registry_dir.glob("*.json"):
+            try:
+                with open(registry_file, "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+                self._unlink(entry["segment"])
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"清理共享数据失败: {registry_file}, 错误: {str(e)}")
+            registry_file.unlink(missing_ok=True)
+
+    def _read_owner(self, owner_file: Path) -> Optional[int]:
+        """读取所有者进程号；内容为空或无法解析时返回None"""
+        try:
+            return int(owner_file.read_text(encoding="utf-8").strip())
+        except ValueError:
+            return None
+
+    def claim_ownership(self) -> bool:
+        """
+        登记本进程为登记目录的所有者，所有者进程退出时删除全部共享内存段
+
+        所有者文件先完整写入临时文件，再以 os.link 原子地放到位，其他进程不会读到写了一半的内容；
+        内容为空或无法解析时视为所有者仍在运行，稍后重试。登记目录已有仍在运行的所有者时返回False；
+        所有者进程已退出时由本进程接管。其他worker在所有者退出后仍可使用已连接的映射，
+        之后加载的数据会重新发布。
+
+        Returns:
+            本进程是否为所有者
+        """
+        owner_file = self.registry_dir / OWNER_FILE
+        tmp_file = self.registry_dir / f"{OWNER_FILE}.{os.getpid()}.tmp"
+        stale_file = self.registry_dir / f"{OWNER_FILE}.{os.getpid()}.stale"
+        self.registry_dir.mkdir(parents=True, exist_ok=True)
+        tmp_file.write_text(str(os.getpid()), encoding="utf-8")
+        claimed = False
+        try:
+            for _ in range(OWNER_RETRIES):
+                try:
+                    os.link(tmp_file, owner_file)
+                    claimed = True
+                    break
+                except FileExistsError:
+                    pass
+                try:
+                    pid = self._read_owner(owner_file)
+                except FileNotFoundError:
+                    continue
+                if pid == os.getpid():
+                    claimed = True
+                    break
+                if pid is None:
+                    time.sleep(OWNER_RETRY_DELAY)
+                    continue
+                if _pid_alive(pid):
+                    return False
+                # 先将旧的所有者文件原子地移走，确认移走的确实是已退出进程的登记，
+                # 若其他进程已抢先接管，则将其登记放回
+                try:
+                    os.rename(owner_file, stale_file)
+                except FileNotFoundError:
+                    continue
+                try:
+                    moved = self._read_owner(stale_file)
+                    if moved == pid:
+                        logger.info(f"共享数据所有者进程 {pid} 已退出，由本进程接管")
+                    else:
+                        try:
+                            os.link(stale_file, owner_file)
+                        except FileExistsError:
+                            pass
+                finally:
+                    stale_file.unlink(missing_ok=True)
+        finally:
+            tmp_file.unlink(missing_ok=True)
+        if not claimed:
+            return False
+
+        if not self.owner:
+            self.owner = True
+            atexit.register(self.release)
+        return True
+
+    def release(self) -> None:
+        """本进程为所有者时删除全部共享内存段和所有者登记，可重复调用"""
+        if not self.owner:
+            return
+        self.owner = False
+        owner_file = self.registry_dir / OWNER_FILE
+        try:
+            if int(owner_file.read_text(encoding="utf-8").strip() or 0) != os.getpid():
+                return
+        except (OSError, ValueError):
+            return
+        self.cleanup()
+        owner_file.unlink(missing_ok=True)
+        logger.info(f"已清理共享数据: {self.registry_dir}")
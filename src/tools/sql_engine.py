@@ -0,0 +1,145 @@
+"""
+嵌入式SQL查询模块，基于DuckDB在进程内对映射数据集的列式缓存执行SQL查询
+"""
+
+import os
+import re
+import logging
+import threading
+from typing import Dict, List, Any, Optional, Sequence, Tuple, Union
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+SQLParams = Optional[Union[Sequence[Any], Dict[str, Any]]]
+
+
+def _quote_identifier(name: str) -> str:
+    """SQL标识符加双引号"""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _quote_literal(text: str) -> str:
+    """SQL字符串常量加单引号"""
+    return "'" + text.replace("'", "''") + "'"
+
+
+class SQLEngine:
+    """
+    映射数据集上的SQL查询引擎
+
+    映射配置中的每个逻辑名注册为一个视图，视图直接读取列式缓存中的Parquet文件
+    （主副本及追加的增量分片），连接、窗口函数和分组聚合由DuckDB多线程向量化执行，
+    只有最终结果转换为DataFrame。视图在查询首次引用对应逻辑名时注册，
+    缓存文件变化（追加新行、重新摄取）后自动重建。
+    """
+
+    def __init__(self, data_loader: Any, threads: Optional[int] = None):
+        """
+        初始化SQL查询引擎
+
+        Args:
+            data_loader: MappedDataLoader 实例，需要启用列式缓存目录
+            threads: DuckDB使用的线程数，为None时使用全部CPU核
+        """
+        self.data_loader = data_loader
+        self.threads = threads
+        self._connection = None
+        self._views: Dict[str, Tuple[Tuple[str, ...], Tuple[str, ...]]] = {}
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        """创建进程内DuckDB连接"""
+        try:
+            import duckdb
+        except ImportError:
+            raise ImportError("SQL查询需要安装 duckdb：pip install duckdb")
+        connection = duckdb.connect(database=":memory:")
+        connection.execute(f"SET threads TO {int(self.threads or os.cpu_count() or 1)}")
+        return connection
+
+    def view_names(self) -> List[str]:
+        """可在SQL中引用的逻辑名"""
+        return [name for name, config in self.data_loader.file_mapping.items()
+                if isinstance(config, dict) and config.get("actual_file")]
+
+    def _referenced_views(self, query: str) -> List[str]:
+        """查询中引用到的逻辑名"""
+        return [name for name in self.view_names()
+                if re.search(r'(?<![\w.])' + re.escape(name) + r'(?![\w.])', query)]
+
+    def _register_view(self, name: str) -> None:
+        """注册或刷新逻辑名对应的视图"""
+        source = self.data_loader.columnar_source(name)
+        files = tuple(str(path) for path in source["files"])
+        columns = tuple(source["columns"])
+        if self._views.get(name) == (files, columns):
+            return
+
+        file_list = ", ".join(_quote_literal(path) for path in files)
+        select_list = ", ".join(_quote_identifier(col) for col in columns)
+        self._connection.execute(
+            f"CREATE OR REPLACE VIEW {_quote_identifier(name)} AS "
+            f"SELECT {select_list} FROM read_parquet([{file_list}], union_by_name = true)"
+        )
+        self._views[name] = (files, columns)
+        logger.info(f"已注册SQL视图: {name}, {len(files)} 个文件, {len(columns)} 列")
+
+    def register_all(self) -> List[str]:
+        """
+        注册全部存在的数据集视图
+
+        Returns:
+            已注册的逻辑名
+        """
+        with self._lock:
+            if self._connection is None:
+                self._connection = self._connect()
+            registered = []
+            for name in self.view_names():
+                try:
+                    self._register_view(name)
+                    registered.append(name)
+                except (FileNotFoundError, ValueError) as e:
+                    logger.warning(f"注册SQL视图失败: {name}, 错误: {str(e)}")
+            return registered
+
+    def query(self, sql: str, params: SQLParams = None) -> pd.DataFrame:
+        """
+        执行SQL查询
+
+        映射配置中的逻辑名可直接作为表名使用；名称包含“.”等特殊字符时需要加双引号，
+        例如 SELECT * FROM "宏观经济数据.csv"。
+
+        Args:
+            sql: SQL语句
+            params: 参数化查询的参数（? 占位符对应的列表，或 $name 占位符对应的字典）
+
+        Returns:
+            查询结果
+        """
+        with self._lock:
+            if self._connection is None:
+                self._connection = self._connect()
+            for name in self._referenced_views(sql):
+                try:
+                    self._register_view(name)
+                except FileNotFoundError as e:
+                    logger.warning(f"数据集 {name} 不可用，未注册SQL视图: {str(e)}")
+            cursor = self._connection.cursor()
+
+        try:
+            result = cursor.execute(sql, params).df() if params is not None else cursor.execute(sql).df()
+        finally:
+            cursor.close()
+        logger.info(f"SQL查询完成，结果形状: {result.shape}")
+        return result
+
+    def close(self) -> None:
+        """关闭DuckDB连接"""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+                self._views.clear()
@@ -0,0 +1,271 @@
+"""
+流式聚合模块，按数据块增量计算分组聚合、相关性矩阵和数据摘要，内存占用与数据行数无关
+"""
+
+import logging
+import warnings
+from typing import Dict, List, Any, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 可由部分结果合并得到的聚合函数
+STREAMABLE_AGG_FUNCS = {'sum', 'count', 'min', 'max', 'mean', 'std', 'var'}
+
+
+class GroupedAggregator:
+    """
+    分组聚合累加器
+
+    逐块累计每组的 sum/count/min/max，需要方差时同时累计离差平方和（M2），
+    合并时使用并行方差公式，避免大数值下平方和相减造成的精度损失。
+    """
+
+    def __init__(self, group_cols: List[str], agg_cols: List[str], agg_funcs: List[str]):
+        unsupported = [func for func in agg_funcs if func not in STREAMABLE_AGG_FUNCS]
+        if unsupported:
+            raise ValueError(f"流式聚合不支持的聚合函数: {unsupported}，"
+                             f"仅支持: {sorted(STREAMABLE_AGG_FUNCS)}")
+        self.group_cols = group_cols
+        self.agg_cols = agg_cols
+        self.agg_funcs = agg_funcs
+        self.need_m2 = any(func in ('std', 'var') for func in agg_funcs)
+        self.partial: Optional[Dict[str, pd.DataFrame]] = None
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        """累计一个数据块"""
+        if chunk.empty:
+            return
+        grouped = chunk.groupby(self.group_cols, observed=True)[self.agg_cols]
+        parts = {
+            'sum': grouped.sum(),
+            'count': grouped.count(),
+            'min': grouped.min(),
+            'max': grouped.max(),
+        }
+        if self.need_m2:
+            parts['m2'] = (grouped.var(ddof=0) * parts['count']).fillna(0.0)
+
+        if self.partial is None:
+            self.partial = parts
+        else:
+            self.partial = self._combine({
+                name: pd.concat([self.partial[name], part]) for name, part in parts.items()
+            })
+
+    def _combine(self, stacked: Dict[str, pd.DataFrame],
+                 levels: Optional[List[Any]] = None) -> Dict[str, pd.DataFrame]:
+        """按分组键（默认全部层级）合并多个部分结果"""
+        if levels is None:
+            levels = list(range(stacked['sum'].index.nlevels))
+        combined = {
+            'sum': stacked['sum'].groupby(level=levels).sum(),
+            'count': stacked['count'].groupby(level=levels).sum(),
+            'min': stacked['min'].groupby(level=levels).min(),
+            'max': stacked['max'].groupby(level=levels).max(),
+        }
+        if self.need_m2:
+            # M2 = Σ M2_i + Σ n_i * (mean_i - mean)^2
+            count = stacked['count']
+            part_mean = stacked['sum'] / count.where(count > 0)
+            total_mean = (stacked['sum'].groupby(level=levels).transform('sum')
+                          / count.groupby(level=levels).transform('sum'))
+            deviation = (count * (part_mean - total_mean) ** 2).fillna(0.0)
+            combined['m2'] = (stacked['m2'] + deviation).groupby(level=levels).sum()
+        return combined
+
+    def rollup(self, group_cols: List[str], agg_cols: List[str],
+               agg_funcs: List[str]) -> 'GroupedAggregator':
+        """
+        由当前的部分结果合并得到更粗分组的累加器，不需要重新读取原始数据
+
+        Args:
+            group_cols: 分组列，需要是当前分组列的子集
+            agg_cols: 聚合列，需要是当前聚合列的子集
+            agg_funcs: 聚合函数列表
+
+        Returns:
+            新的累加器，可继续 update 或调用 result
+        """
+        coarser = GroupedAggregator(group_cols, agg_cols, agg_funcs)
+        if self.partial is None:
+            return coarser
+        if coarser.need_m2 and 'm2' not in self.partial:
+            raise ValueError("当前部分结果不含离差平方和，无法汇总 std/var")
+        parts = {name: part[agg_cols] for name, part in self.partial.items()
+                 if name != 'm2' or coarser.need_m2}
+        coarser.partial = coarser._combine(parts, list(group_cols))
+        return coarser
+
+    def result(self) -> pd.DataFrame:
+        """计算最终聚合结果，列名格式与非流式模式一致"""
+        if self.partial is None:
+            columns = list(self.group_cols) + [f"{col}_{func}" for col in self.agg_cols for func in self.agg_funcs]
+            return pd.DataFrame(columns=columns)
+
+        partial = {name: part.sort_index() for name, part in self.partial.items()}
+        output = {}
+        for col in self.agg_cols:
+            total = partial['sum'][col]
+            count = partial['count'][col]
+            for func in self.agg_funcs:
+                if func in ('sum', 'count', 'min', 'max'):
+                    value = partial[func][col]
+                elif func == 'mean':
+                    value = total / count.where(count > 0)
+                else:
+                    value = partial['m2'][col] / (count - 1).where(count > 1)
+                    if func == 'std':
+                        value = np.sqrt(value)
+                output[f"{col}_{func}"] = value
+        result = pd.DataFrame(output, index=partial['sum'].index)
+        result.index.names = self.group_cols
+        return result.reset_index()
+
+
+def pairwise_moments(x: np.ndarray, y: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    计算两组列之间成对完整样本的矩
+
+    Args:
+        x: 形状为 (n, p) 的浮点数组，缺失值为NaN
+        y: 形状为 (n, q) 的浮点数组，缺失值为NaN
+
+    Returns:
+        包含 n, sx, sy, sxx, syy, sxy 的字典，每项形状均为 (p, q)，
+        只统计 x 列和 y 列同时非空的行
+    """
+    mx = (~np.isnan(x)).astype(np.float64)
+    my = (~np.isnan(y)).astype(np.float64)
+    x0 = np.nan_to_num(x, nan=0.0)
+    y0 = np.nan_to_num(y, nan=0.0)
+    return {
+        'n': mx.T @ my,
+        'sx': x0.T @ my,
+        'sy': mx.T @ y0,
+        'sxx': (x0 * x0).T @ my,
+        'syy': mx.T @ (y0 * y0),
+        'sxy': x0.T @ y0,
+    }
+
+
+def correlation_from_moments(moments: Dict[str, np.ndarray]) -> np.ndarray:
+    """由成对矩计算Pearson相关系数，样本不足或方差为零时为NaN"""
+    n = moments['n']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = moments['sxy'] - moments['sx'] * moments['sy'] / n
+        var_x = moments['sxx'] - moments['sx'] ** 2 / n
+        var_y = moments['syy'] - moments['sy'] ** 2 / n
+        corr = cov / np.sqrt(var_x * var_y)
+    corr[(n < 2) | (var_x <= 0) | (var_y <= 0)] = np.nan
+    return np.clip(corr, -1.0, 1.0)
+
+
+class CorrelationAccumulator:
+    """成对完整样本的Pearson相关性累加器，结果与 DataFrame.corr() 一致"""
+
+    def __init__(self, columns: List[str]):
+        self.columns = list(columns)
+        self.shift: Optional[np.ndarray] = None
+        self.moments: Optional[Dict[str, np.ndarray]] = None
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        """累计一个数据块"""
+        values = chunk[self.columns].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+        if len(values) == 0:
+            return
+        if self.shift is None:
+            # 以首个数据块的均值平移数据，减小平方和累加时的数值误差
+            with warnings.catch_warnings():
+                # 全为缺失值的列会触发 "Mean of empty slice" 警告，平移量取0即可
+                warnings.simplefilter('ignore', RuntimeWarning)
+                self.shift = np.nan_to_num(np.nanmean(values, axis=0))
+        values = values - self.shift
+        moments = pairwise_moments(values, values)
+        if self.moments is None:
+            self.moments = moments
+        else:
+            for key, value in moments.items():
+                self.moments[key] += value
+
+    def result(self) -> pd.DataFrame:
+        """计算相关性矩阵"""
+        if self.moments is None:
+            return pd.DataFrame(np.nan, index=self.columns, columns=self.columns)
+        corr = correlation_from_moments(self.moments)
+        np.fill_diagonal(corr, np.where(np.isnan(np.diag(corr)), np.nan, 1.0))
+        return pd.DataFrame(corr, index=self.columns, columns=self.columns)
+
+
+class SummaryAccumulator:
+    """数据摘要累加器，逐块统计缺失值、数值列统计量和分类列取值频次"""
+
+    def __init__(self, top_n: int = 10):
+        self.top_n = top_n
+        self.rows = 0
+        self.memory_usage = 0
+        self.columns: Optional[List[str]] = None
+        self.dtypes: Dict[str, Any] = {}
+        self.missing: Optional[pd.Series] = None
+        self.numeric: Dict[str, Dict[str, float]] = {}
+        self.value_counts: Dict[str, pd.Series] = {}
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        """累计一个数据块"""
+        if self.columns is None:
+            self.columns = chunk.columns.tolist()
+            self.dtypes = chunk.dtypes.to_dict()
+        self.rows += len(chunk)
+        self.memory_usage += int(chunk.memory_usage(deep=True).sum())
+
+        missing = chunk.isnull().sum()
+        self.missing = missing if self.missing is None else self.missing.add(missing, fill_value=0)
+
+        for col in chunk.select_dtypes(include=[np.number]).columns:
+            values = chunk[col].dropna().astype(float)
+            stats = self.numeric.setdefault(col, {'count': 0, 'mean': 0.0, 'm2': 0.0,
+                                                  'min': np.inf, 'max': -np.inf})
+            if values.empty:
+                continue
+            # 并行方差公式合并当前数据块
+            count = len(values)
+            mean = values.mean()
+            total = stats['count'] + count
+            delta = mean - stats['mean']
+            stats['m2'] += ((values - mean) ** 2).sum() + delta ** 2 * stats['count'] * count / total
+            stats['mean'] += delta * count / total
+            stats['count'] = total
+            stats['min'] = min(stats['min'], values.min())
+            stats['max'] = max(stats['max'], values.max())
+
+        for col in chunk.select_dtypes(include=['object', 'string', 'category']).columns:
+            counts = chunk[col].value_counts()
+            previous = self.value_counts.get(col)
+            self.value_counts[col] = counts if previous is None else previous.add(counts, fill_value=0)
+
+    def numeric_stats(self) -> Dict[str, Dict[str, float]]:
+        """数值列统计量（count/mean/std/min/max），流式模式下不计算分位数"""
+        result = {}
+        for col, stats in self.numeric.items():
+            count = stats['count']
+            result[col] = {
+                'count': float(count),
+                'mean': float(stats['mean']) if count else np.nan,
+                'std': float(np.sqrt(stats['m2'] / (count - 1))) if count > 1 else np.nan,
+                'min': float(stats['min']) if count else np.nan,
+                'max': float(stats['max']) if count else np.nan,
+            }
+        return result
+
+    def categorical_stats(self) -> Dict[str, Dict[str, Any]]:
+        """分类列的唯一值数量和高频取值"""
+        result = {}
+        for col, counts in self.value_counts.items():
+            counts = counts.astype(int).sort_values(ascending=False, kind='mergesort')
+            result[col] = {
+                'unique_count': int(len(counts)),
+                'top_values': counts.head(self.top_n).to_dict()
+            }
+        return result
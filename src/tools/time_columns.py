@@ -0,0 +1,183 @@
+"""
+时间列解析模块，推断时间列格式（包括“2023年第1季度”等中文形式）并一次性解析为datetime类型，
+并提供按时间排序、以二分查找读取时间范围的数据视图
+"""
+
+import re
+import logging
+from typing import Any, List, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 推断格式时检查的样本取值数量
+DEFAULT_SAMPLE_SIZE = 200
+
+# 季度格式的标识，对应“2023年第1季度”“2023年一季度”“2023Q1”“2023-Q1”等写法
+QUARTER_FORMAT = 'quarter'
+
+# 按优先级排列的候选格式
+CANDIDATE_FORMATS = [
+    '%Y-%m-%d',
+    '%Y/%m/%d',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y/%m/%d %H:%M:%S',
+    '%Y-%m',
+    '%Y/%m',
+    '%Y年%m月%d日',
+    '%Y年%m月',
+    '%Y年',
+    '%Y%m%d',
+    '%Y%m',
+    '%Y',
+    QUARTER_FORMAT,
+    'ISO8601',
+    'mixed',
+]
+
+_QUARTER_PATTERN = re.compile(r'^(\d{4})\s*(?:年\s*第?\s*([1-4一二三四])\s*季度?|-?\s*[Qq]([1-4]))$')
+_CN_DIGITS = {'一': '1', '二': '2', '三': '3', '四': '4'}
+
+
+def _as_text(series: pd.Series) -> Optional[pd.Series]:
+    """将候选时间列转换为去除首尾空白的字符串，浮点等不适用的类型返回None"""
+    if pd.api.types.is_integer_dtype(series.dtype):
+        return series.astype('string').astype(object)
+    if pd.api.types.is_object_dtype(series.dtype) or pd.api.types.is_string_dtype(series.dtype) \
+            or isinstance(series.dtype, pd.CategoricalDtype):
+        return series.astype(object).where(series.notna()).map(
+            lambda value: value.strip() if isinstance(value, str) else value)
+    return None
+
+
+def _parse_quarter(text: pd.Series) -> pd.Series:
+    """将季度字符串解析为季度首日"""
+    parts = text.str.extract(_QUARTER_PATTERN)
+    quarter = parts[1].fillna(parts[2]).replace(_CN_DIGITS)
+    year = pd.to_numeric(parts[0], errors='coerce')
+    month = (pd.to_numeric(quarter, errors='coerce') - 1) * 3 + 1
+    return pd.to_datetime(pd.DataFrame({'year': year, 'month': month, 'day': 1}), errors='coerce')
+
+
+def _parse_text(text: pd.Series, fmt: str, errors: str) -> pd.Series:
+    """按指定格式解析字符串序列"""
+    if fmt == QUARTER_FORMAT:
+        parsed = _parse_quarter(text.astype(str))
+        if errors == 'raise' and parsed.isna().any():
+            raise ValueError("存在无法解析的季度取值")
+        return parsed
+    return pd.to_datetime(text, format=fmt, errors=errors)
+
+
+def infer_datetime_format(series: pd.Series, sample_size: int = DEFAULT_SAMPLE_SIZE) -> Optional[str]:
+    """
+    根据样本取值推断时间列格式
+
+    Args:
+        series: 候选时间列
+        sample_size: 参与推断的唯一取值数量
+
+    Returns:
+        格式字符串（strftime格式、'quarter'、'ISO8601' 或 'mixed'），
+        已是datetime类型时返回 'datetime'，无法识别时返回None
+    """
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        return 'datetime'
+    text = _as_text(series)
+    if text is None:
+        return None
+    sample = pd.Series(text.dropna().unique()[:sample_size], dtype=object)
+    if sample.empty:
+        return None
+
+    for fmt in CANDIDATE_FORMATS:
+        try:
+            _parse_text(sample, fmt, errors='raise')
+        except (ValueError, TypeError, OverflowError):
+            continue
+        return fmt
+    return None
+
+
+def parse_datetime(series: pd.Series, fmt: str) -> pd.Series:
+    """
+    按已推断的格式解析时间列
+
+    Args:
+        series: 原始时间列
+        fmt: infer_datetime_format 返回的格式
+
+    Returns:
+        datetime64类型的序列，无法解析的取值为NaT
+    """
+    if fmt == 'datetime':
+        return series
+    text = _as_text(series)
+    if text is None:
+        raise ValueError(f"列 {series.name} 的类型 {series.dtype} 不能作为时间列")
+    parsed = _parse_text(text, fmt, errors='coerce')
+    failed = int(parsed.isna().sum() - text.isna().sum())
+    if failed > 0:
+        logger.warning(f"时间列 {series.name} 有 {failed} 个取值不符合格式 {fmt}，已置为NaT")
+    parsed.name = series.name
+    return parsed
+
+
+class SortedTimeView:
+    """
+    按时间列排序的数据视图
+
+    只保存按解析后的时间稳定排序（NaT排在最后）的行位置和排序后的时间取值，不复制数据；
+    时间范围查询通过二分查找确定行区间，再从原数据中取出这些行，不再逐行比较或重新排序。
+    """
+
+    def __init__(self, df: pd.DataFrame, time_col: str, parsed: pd.Series):
+        """
+        建立视图
+
+        Args:
+            df: 数据（通常为内存缓存中的数据，视图只引用不复制）
+            time_col: 时间列名
+            parsed: 解析为datetime64类型的时间列，与df的索引对齐
+        """
+        if not isinstance(parsed.dtype, np.dtype) or parsed.dtype.kind != 'M':
+            raise TypeError(f"时间列 {time_col} 需要是不带时区的datetime64类型")
+        values = parsed.to_numpy()
+        self.order = np.argsort(values, kind='stable')
+        self.times = values[self.order]
+        self.time_col = time_col
+        self.source = df
+        self.valid = int(parsed.notna().sum())
+        self.rows = len(df)
+        self.columns = set(df.columns)
+
+    @property
+    def nbytes(self) -> int:
+        """视图自身占用的字节数（行位置和时间取值，不含引用的数据）"""
+        return int(self.order.nbytes + self.times.nbytes)
+
+    def _position(self, bound: Any, side: str) -> int:
+        """时间边界在有效时间取值中的插入位置"""
+        key = pd.Timestamp(bound).to_datetime64().astype(self.times.dtype)
+        return int(np.searchsorted(self.times[:self.valid], key, side=side))
+
+    def slice(self, start: Any = None, end: Any = None, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        读取时间范围内的行
+
+        Args:
+            start: 起始时间（包含），为None时不限
+            end: 结束时间（包含），为None时不限
+            columns: 需要的列，为None时取全部列；时间列总是包含在内
+
+        Returns:
+            按时间排序的数据，时间列为解析后的取值；未指定范围时包含时间缺失的行，否则只包含范围内的行
+        """
+        lower = 0 if start is None else self._position(start, 'left')
+        upper = (self.rows if start is None else self.valid) if end is None else self._position(end, 'right')
+        upper = max(lower, upper)
+        frame = self.source if columns is None else \
+            self.source[list(dict.fromkeys([self.time_col] + [col for col in columns if col in self.columns]))]
+        return frame.take(self.order[lower:upper]).assign(**{self.time_col: self.times[lower:upper]})
@@ -0,0 +1,1445 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+MappedDataLoader 数据加载与缓存测试
+"""
+
+import io
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import warnings
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import yaml
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from src.tools.mapped_data_loader import MappedDataLoader, DataQuery, apply_filters, DEFAULT_CACHE_DIR
+from src.tools import secondary_index
+from src.tools.data_loader import DataLoader, DataQuery as BasicDataQuery
+from src.tools.filter_compiler import compile_filters, Predicate
+from src.tools import ratio_engine
+from src.tools.rollup_cubes import RollupCube
+from src.tools.encoding_detector import detect_encoding
+from src.tools.data_cache import DataCache
+from src.tools.file_index import FileIndex
+from src.tools.shared_store import SharedDatasetStore
+from src.tools import shared_store
+from src.tools.ingest_cache import IngestCache
+from src.tools.data_analyzer import DataAnalyzer, ChartGenerator
+from src.tools.correlation_service import find_high_correlations
+from src.tools import blocked_correlation
+from src.tools import data_query as simple_data_query
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+GDP_CSV = (
+    "季度,国内生产总值,第一产业增加值,第二产业增加值,第三产业增加值\n"
+    "2022年第1季度,270178,10954,106187,153037\n"
+    "2022年第2季度,292464,18183,122450,151831\n"
+    "2022年第3季度,307627,24899,121470,161258\n"
+    "2022年第4季度,335508,34863,133325,167320\n"
+)
+
+MAPPING = {
+    "宏观经济数据.csv": {"actual_file": "gdp.csv", "description": "国内生产总值数据"},
+    "macro_economic_data": {
+        "actual_file": "gdp.csv",
+        "description": "国内生产总值相关数据",
+        "columns": ["季度", "国内生产总值"]
+    },
+}
+
+
+class LoaderTestCase(unittest.TestCase):
+    """在临时目录中构造数据根目录、映射配置和缓存目录"""
+
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.data_root = self.tmp_dir / "data"
+        self.data_root.mkdir()
+        self.cache_dir = self.tmp_dir / "cache"
+        self.mapping_path = self.tmp_dir / "data_mapping.yaml"
+        with open(self.mapping_path, "w", encoding="utf-8") as f:
+            yaml.safe_dump(MAPPING, f, allow_unicode=True)
+        (self.data_root / "gdp.csv").write_text(GDP_CSV, encoding="utf-8")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def make_loader(self, **kwargs) -> MappedDataLoader:
+        kwargs.setdefault("cache_dir", str(self.cache_dir))
+        return MappedDataLoader(
+            data_root_path=str(self.data_root),
+            mapping_config_path=str(self.mapping_path),
+            **kwargs
+        )
+
+    def assert_no_source_parse(self):
+        """断言上下文中不会重新解析源文件"""
+        return mock.patch.object(MappedDataLoader, "_read_source",
+                                 side_effect=AssertionError("不应重新解析源文件"))
+
+
+class TestIngestCache(LoaderTestCase):
+    """测试列式摄取缓存"""
+
+    def test_second_loader_reads_columnar_copy(self):
+        """第二个加载器实例应从列式缓存读取，而非重新解析CSV"""
+        first = self.make_loader().load_data("宏观经济数据.csv")
+        self.assertTrue(list(self.cache_dir.glob("*.parquet")))
+
+        with self.assert_no_source_parse():
+            second = self.make_loader().load_data("宏观经济数据.csv")
+        self.assertEqual(first.shape, second.shape)
+        self.assertEqual(first["国内生产总值"].tolist(), second["国内生产总值"].tolist())
+
+    def test_construction_creates_no_directories(self):
+        """构造加载器不创建缓存目录，各子目录在首次写入时才创建"""
+        self.make_loader()
+        self.assertFalse(self.cache_dir.exists())
+
+        self.make_loader().load_data("宏观经济数据.csv")
+        self.assertEqual([path.name for path in self.cache_dir.iterdir() if path.is_dir()], [])
+
+    def test_default_cache_dir_under_project_root(self):
+        """默认缓存目录位于项目根目录下，不随工作目录变化"""
+        self.assertTrue(os.path.isabs(DEFAULT_CACHE_DIR))
+        self.assertEqual(Path(DEFAULT_CACHE_DIR).parent.parent, project_root.resolve())
+        cwd = os.getcwd()
+        os.chdir(self.tmp_dir)
+        try:
+            loader = MappedDataLoader(data_root_path=str(self.data_root),
+                                      mapping_config_path=str(self.mapping_path))
+        finally:
+            os.chdir(cwd)
+        self.assertEqual(loader.cache_dir, DEFAULT_CACHE_DIR)
+        self.assertFalse((self.tmp_dir / ".cache").exists())
+
+    def test_source_change_invalidates_cache(self):
+        """源文件内容变化后应重新解析CSV"""
+        self.make_loader().load_data("宏观经济数据.csv")
+
+        gdp_path = self.data_root / "gdp.csv"
+        gdp_path.write_text(GDP_CSV + "2023年第1季度,284997,11575,107947,165475\n", encoding="utf-8")
+
+        df = self.make_loader().load_data("宏观经济数据.csv")
+        self.assertEqual(len(df), 5)
+
+    def test_in_place_edit_discards_projected_copy(self):
+        """源文件原地修改（行数不变）后，部分列的写入不会合并进旧副本中的过期列"""
+        path = self.data_root / "ab.csv"
+        path.write_text("a,b\n1,4\n2,5\n3,6\n", encoding="utf-8")
+        self.assertEqual(self.make_loader().load_data("ab.csv", columns=["a"])["a"].tolist(), [1, 2, 3])
+
+        path.write_text("a,b\n7,4\n8,5\n9,6\n", encoding="utf-8")
+        os.utime(path, ns=(0, 10 ** 18))
+        self.assertEqual(self.make_loader().load_data("ab.csv", columns=["b"])["b"].tolist(), [4, 5, 6])
+        self.assertEqual(self.make_loader().load_data("ab.csv", columns=["a"])["a"].tolist(), [7, 8, 9])
+        self.assertEqual(self.make_loader().load_data("ab.csv")["a"].tolist(), [7, 8, 9])
+
+    def test_touch_keeps_cache(self):
+        """仅修改时间变化、内容不变时继续使用缓存"""
+        self.make_loader().load_data("宏观经济数据.csv")
+        gdp_path = self.data_root / "gdp.csv"
+        os.utime(gdp_path, ns=(0, 10 ** 18))
+
+        with self.assert_no_source_parse():
+            self.assertEqual(len(self.make_loader().load_data("宏观经济数据.csv")), 4)
+
+
+class TestEncodingDetection(LoaderTestCase):
+    """测试编码探测"""
+
+    def write_gbk_file(self, name: str) -> Path:
+        """写入头部为纯ASCII、中文出现在文件后部的GBK文件"""
+        lines = ["code,name"] + [f"{i},company" for i in range(40000)] + ["40000,比亚迪"]
+        path = self.data_root / name
+        path.write_bytes(("\n".join(lines) + "\n").encode("gbk"))
+        return path
+
+    def test_detects_gbk_beyond_head(self):
+        """中文字符位于头部样本之外时仍应识别为GBK"""
+        path = self.write_gbk_file("brands.csv")
+        self.assertEqual(detect_encoding(path), "gbk")
+        self.assertEqual(detect_encoding(self.data_root / "gdp.csv"), "utf-8")
+
+    def test_encoding_recorded_in_manifest(self):
+        """探测结果写入清单，后续加载不再探测"""
+        path = self.write_gbk_file("brands.csv")
+        df = self.make_loader().load_data("brands.csv")
+        self.assertEqual(df["name"].iloc[-1], "比亚迪")
+
+        with mock.patch("src.tools.mapped_data_loader.detect_encoding",
+                        side_effect=AssertionError("不应重复探测编码")):
+            df = self.make_loader().load_data("brands.csv", usecols=["name"])
+        self.assertEqual(df["name"].iloc[-1], "比亚迪")
+
+    def test_transcode_to_utf8(self):
+        """开启转码时生成UTF-8副本"""
+        self.write_gbk_file("brands.csv")
+        loader = self.make_loader(transcode_sources=True)
+        df = loader.load_data("brands.csv")
+        self.assertEqual(df["name"].iloc[-1], "比亚迪")
+
+        copies = list(self.cache_dir.glob("*.utf8.csv"))
+        self.assertEqual(len(copies), 1)
+        self.assertIn("比亚迪", copies[0].read_text(encoding="utf-8"))
+
+
+class TestColumnProjection(LoaderTestCase):
+    """测试列投影下推"""
+
+    def test_default_columns_from_mapping(self):
+        """未指定列时使用映射配置中声明的columns"""
+        df = self.make_loader().load_data("macro_economic_data")
+        self.assertEqual(list(df.columns), ["季度", "国内生产总值"])
+
+    def test_extra_columns_merged_into_cache(self):
+        """请求更多列时只解析缺少的列并合并进缓存"""
+        loader = self.make_loader()
+        loader.load_data("macro_economic_data")
+
+        original_read = MappedDataLoader._read_source
+        parsed_columns = []
+
+        def recording_read(self, *args, **kwargs):
+            parsed_columns.append(kwargs.get("usecols"))
+            return original_read(self, *args, **kwargs)
+
+        with mock.patch.object(MappedDataLoader, "_read_source", recording_read):
+            df = loader.load_data("macro_economic_data", columns=["季度", "第三产业增加值"])
+        self.assertEqual(list(df.columns), ["季度", "第三产业增加值"])
+        self.assertEqual(parsed_columns, [["第三产业增加值"]])
+
+        # 新列同样合并进了磁盘上的列式副本
+        with self.assert_no_source_parse():
+            df = self.make_loader().load_data(
+                "macro_economic_data", columns=["国内生产总值", "第三产业增加值"]
+            )
+        self.assertEqual(df["第三产业增加值"].iloc[0], 153037)
+
+    def test_aliases_share_cache_entry(self):
+        """映射到同一物理文件的多个逻辑名共享一个缓存条目"""
+        loader = self.make_loader(cache_dir=None)
+        full = loader.load_data("宏观经济数据.csv")
+
+        with self.assert_no_source_parse():
+            df = loader.load_data("macro_economic_data")
+        self.assertEqual(list(df.columns), ["季度", "国内生产总值"])
+        self.assertEqual(df["国内生产总值"].tolist(), full["国内生产总值"].tolist())
+        self.assertEqual(loader.data_cache.keys(), [str((self.data_root / "gdp.csv").resolve())])
+
+    def test_missing_columns_ignored(self):
+        """源文件中不存在的列被忽略"""
+        df = self.make_loader().load_data("宏观经济数据.csv", columns=["季度", "不存在的列"])
+        self.assertEqual(list(df.columns), ["季度"])
+
+
+class TestStreamingLoad(LoaderTestCase):
+    """测试分块流式加载与流式聚合"""
+
+    def setUp(self):
+        super().setUp()
+        rng = np.random.default_rng(0)
+        rows = 500
+        panel = pd.DataFrame({
+            "厂商": rng.choice(["比亚迪", "特斯拉", "蔚来"], rows),
+            "年份": rng.integers(2019, 2023, rows),
+            "销量": rng.normal(1e6, 10, rows),
+            "产量": rng.normal(size=rows),
+        })
+        panel.loc[::7, "销量"] = np.nan
+        panel["库存"] = panel["产量"] * 2 + rng.normal(size=rows)
+        panel.to_csv(self.data_root / "sales.csv", index=False)
+        self.panel = panel
+
+    def test_load_data_iter_filters_chunks(self):
+        """分块加载时逐块应用过滤并只返回所需列"""
+        loader = self.make_loader()
+        chunks = list(loader.load_data_iter("sales.csv", chunksize=64, columns=["厂商", "销量"],
+                                            filters={"年份": {"eq": 2020}}))
+        self.assertGreater(len(chunks), 1)
+        result = pd.concat(chunks)
+        self.assertEqual(list(result.columns), ["厂商", "销量"])
+        self.assertEqual(len(result), int((self.panel["年份"] == 2020).sum()))
+        self.assertEqual(len(loader.data_cache), 0)
+
+    def test_streaming_matches_in_memory(self):
+        """流式聚合与相关性结果与一次性加载一致"""
+        query = DataQuery(self.make_loader())
+        funcs = ["sum", "mean", "count", "min", "max", "std"]
+        expected = query.aggregate_by_period("sales.csv", ["厂商", "年份"], ["销量", "产量"], funcs)
+        streamed = query.aggregate_by_period("sales.csv", ["厂商", "年份"], ["销量", "产量"], funcs,
+                                             streaming=True, chunksize=37)
+        pd.testing.assert_frame_equal(expected, streamed, check_dtype=False, rtol=1e-9)
+
+        expected = pd.DataFrame(query.get_correlation_matrix("sales.csv")["correlation_matrix"])
+        # 新的加载器没有缓存的相关性矩阵，流式结果独立计算
+        streamed = pd.DataFrame(DataQuery(self.make_loader()).get_correlation_matrix(
+            "sales.csv", streaming=True, chunksize=37)["correlation_matrix"])
+        pd.testing.assert_frame_equal(expected, streamed, rtol=1e-9)
+
+
+class TestFileIndex(LoaderTestCase):
+    """测试文件解析索引"""
+
+    def test_resolution_without_directory_walk(self):
+        """索引建立后解析逻辑名不再遍历目录"""
+        (self.data_root / "新能源汽车销量.csv").write_text("a\n1\n", encoding="utf-8")
+        loader = self.make_loader()
+        self.assertEqual(loader._resolve_file_name("GDP.CSV"), "gdp.csv")
+
+        with mock.patch("os.scandir", side_effect=AssertionError("不应重新扫描目录")), \
+                mock.patch.object(Path, "glob", side_effect=AssertionError("不应遍历目录")):
+            self.assertEqual(loader._resolve_file_name("汽车销量"), "新能源汽车销量.csv")
+            self.assertEqual(loader._resolve_file_name("gdp.csv"), "gdp.csv")
+
+    def test_ambiguous_match_is_deterministic(self):
+        """子串匹配到多个文件时选择名称最短者，长度相同按字典序"""
+        for name in ["销量_2023.csv", "销量_2022.csv", "品牌销量_2022.csv"]:
+            (self.data_root / name).write_text("a\n1\n", encoding="utf-8")
+        index = FileIndex(self.data_root)
+        with self.assertLogs("src.tools.file_index", level="WARNING"):
+            self.assertEqual(index.resolve("销量"), "销量_2022.csv")
+
+    def test_refresh_on_directory_change(self):
+        """目录内容变化后索引自动刷新"""
+        index = FileIndex(self.data_root)
+        self.assertIsNone(index.resolve("charging"))
+        (self.data_root / "charging_piles.csv").write_text("a\n1\n", encoding="utf-8")
+        os.utime(self.data_root, ns=(0, 10 ** 18))
+        self.assertEqual(index.resolve("charging"), "charging_piles.csv")
+
+
+class TestPreload(LoaderTestCase):
+    """测试并行预加载"""
+
+    def setUp(self):
+        super().setUp()
+        for i in range(4):
+            pd.DataFrame({"年份": range(2000, 2100), "数值": np.arange(100) * i}).to_csv(
+                self.data_root / f"series_{i}.csv", index=False)
+        self.files = [f"series_{i}.csv" for i in range(4)] + ["宏观经济数据.csv", "macro_economic_data"]
+
+    def check_preloaded(self, loader: MappedDataLoader, results: dict):
+        self.assertEqual(list(results), self.files)
+        for result in results.values():
+            self.assertEqual(result["status"], "success")
+            self.assertGreaterEqual(result["load_time"], 0)
+        self.assertEqual(results["macro_economic_data"]["columns"], ["季度", "国内生产总值"])
+        with self.assert_no_source_parse():
+            for file_name in self.files:
+                loader.load_data(file_name)
+
+    def test_thread_preload(self):
+        """线程池预加载后数据均在内存缓存中"""
+        loader = self.make_loader(cache_dir=None)
+        self.check_preloaded(loader, loader.preload(self.files, max_workers=4))
+
+    def test_same_file_parsed_once(self):
+        """并行加载同一物理文件的多个别名时只解析一次"""
+        loader = self.make_loader(cache_dir=None)
+        original_read = MappedDataLoader._read_source
+        parsed = []
+
+        def recording_read(self, file_path, *args, **kwargs):
+            parsed.append(Path(file_path).name)
+            return original_read(self, file_path, *args, **kwargs)
+
+        with mock.patch.object(MappedDataLoader, "_read_source", recording_read):
+            results = loader.preload(["宏观经济数据.csv", "gdp.csv", "GDP.csv"], max_workers=3)
+        self.assertTrue(all(result["status"] == "success" for result in results.values()))
+        self.assertEqual(parsed, ["gdp.csv"])
+
+    def test_process_preload(self):
+        """进程池预加载通过Arrow格式回传数据"""
+        loader = self.make_loader()
+        results = loader.preload(self.files, max_workers=2, mode="process")
+        self.check_preloaded(loader, results)
+
+    def test_missing_file_reported(self):
+        """加载失败的文件在结果中标记为错误"""
+        results = self.make_loader().preload(["不存在的文件.csv"], max_workers=2)
+        self.assertEqual(results["不存在的文件.csv"]["status"], "error")
+
+
+class TestDtypeCompaction(LoaderTestCase):
+    """测试数据类型压缩"""
+
+    def setUp(self):
+        super().setUp()
+        rows = 1000
+        pd.DataFrame({
+            "公司名称": np.where(np.arange(rows) % 2, "比亚迪", "长城汽车"),
+            "证券代码": [f"{i:06d}" for i in range(rows)],
+            "年份": 2000 + np.arange(rows) % 20,
+            "营业收入": np.arange(rows) * 0.5,
+            "毛利率": np.linspace(0, 1, rows) / 3,
+        }).to_csv(self.data_root / "panel.csv", index=False)
+
+    def test_lossless_compaction(self):
+        """默认压缩不改变取值，并减少内存占用"""
+        raw = self.make_loader(cache_dir=None).load_data("panel.csv")
+        df = self.make_loader(cache_dir=None, compact=True).load_data("panel.csv")
+
+        self.assertEqual(df["公司名称"].dtype, "category")
+        self.assertNotEqual(df["证券代码"].dtype, "category")
+        self.assertEqual(df["年份"].dtype, np.int16)
+        self.assertEqual(df["营业收入"].dtype, np.float32)
+        self.assertEqual(df["毛利率"].dtype, np.float64)
+        self.assertLess(df.memory_usage(deep=True).sum(), raw.memory_usage(deep=True).sum())
+        pd.testing.assert_frame_equal(raw, df, check_dtype=False, check_categorical=False)
+
+    def test_float32_mode(self):
+        """float32模式下所有浮点列降级，聚合结果保持一致"""
+        loader = self.make_loader(cache_dir=None, compact=True, float32=True)
+        df = loader.load_data("panel.csv")
+        self.assertEqual(df["毛利率"].dtype, np.float32)
+
+        result = DataQuery(loader).aggregate_by_period("panel.csv", ["公司名称"], ["营业收入"], ["sum"])
+        self.assertEqual(len(result), 2)
+
+
+class TestDatetimeColumns(LoaderTestCase):
+    """测试时间列一次性解析"""
+
+    def test_quarter_column_parsed_once(self):
+        """季度列按推断的格式解析一次，格式写入清单供后续加载复用"""
+        loader = self.make_loader()
+        parsed = loader.get_datetime_column("宏观经济数据.csv", "季度")
+        self.assertEqual(parsed.tolist(), list(pd.to_datetime(
+            ["2022-01-01", "2022-04-01", "2022-07-01", "2022-10-01"])))
+        self.assertIs(loader.get_datetime_column("宏观经济数据.csv", "季度"), parsed)
+        self.assertIsNone(loader.get_datetime_column("宏观经济数据.csv", "国内生产总值"))
+
+        with mock.patch("src.tools.mapped_data_loader.infer_datetime_format",
+                        side_effect=AssertionError("不应重复推断格式")):
+            again = self.make_loader().get_datetime_column("macro_economic_data", "季度")
+        self.assertEqual(again.tolist(), parsed.tolist())
+
+    def test_analyzers_do_not_modify_cached_frame(self):
+        """分析方法复用已解析的时间列，不修改缓存中的原始数据"""
+        loader = self.make_loader(cache_dir=None)
+        analyzer = DataAnalyzer(simple_data_query.DataQuery(loader))
+        result = analyzer.analyze_seasonality("宏观经济数据.csv", "季度", "国内生产总值", period="quarter")
+        self.assertEqual(sorted(result["period_stats"]["mean"]), [1, 2, 3, 4])
+
+        with mock.patch("src.tools.time_columns.pd.to_datetime",
+                        side_effect=AssertionError("不应重新解析时间列")):
+            comparison = analyzer.compare_periods("宏观经济数据.csv", "季度", "国内生产总值",
+                                                  ("2022-01-01", "2022-06-30"), ("2022-07-01", "2022-12-31"))
+        self.assertEqual(comparison["period1"]["stats"]["min"], 270178)
+
+        cached = loader.load_data("宏观经济数据.csv")
+        self.assertNotIn("period", cached.columns)
+        self.assertEqual(cached["季度"].iloc[0], "2022年第1季度")
+
+        series = DataQuery(loader).get_time_series_data("宏观经济数据.csv", "季度", ["国内生产总值"],
+                                                        start_date="2022-04-01")
+        self.assertEqual(len(series), 3)
+
+
+def _attach_in_child(registry_dir: str, key: str, signature: dict) -> tuple:
+    """在子进程中连接共享数据，返回行数、销量合计与厂商列的前几项"""
+    df = SharedDatasetStore(registry_dir).attach(key, signature)
+    return len(df), float(df["销量"].sum()), df["厂商"].head(3).tolist()
+
+
+class TestSharedDatasetStore(LoaderTestCase):
+    """测试跨进程共享内存数据集存储"""
+
+    def setUp(self):
+        super().setUp()
+        pd.DataFrame({
+            "厂商": ["比亚迪", "特斯拉", None, "比亚迪"] * 250,
+            "年份": np.arange(1000) % 5 + 2018,
+            "销量": np.arange(1000, dtype=np.float64),
+        }).to_csv(self.data_root / "sales.csv", index=False)
+        self.store = SharedDatasetStore(str(self.tmp_dir / "shared"))
+
+    def tearDown(self):
+        self.store.cleanup()
+        super().tearDown()
+
+    def test_second_loader_attaches_without_parsing(self):
+        """第二个加载器直接连接共享内存中的数据，数值列为只读视图"""
+        first = self.make_loader(cache_dir=None, shared_store=self.store).load_data("sales.csv")
+
+        other_store = SharedDatasetStore(str(self.tmp_dir / "shared"))
+        with self.assert_no_source_parse():
+            second = self.make_loader(cache_dir=None, shared_store=other_store).load_data("sales.csv")
+        pd.testing.assert_frame_equal(first, second, check_dtype=False)
+        self.assertFalse(second["销量"].to_numpy().flags.writeable)
+
+    def test_attach_from_child_process(self):
+        """子进程连接并退出后，共享内存段仍然可用"""
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        loader = self.make_loader(cache_dir=None, shared_store=self.store)
+        loader.load_data("sales.csv")
+        key = loader.data_cache.keys()[0]
+        signature = IngestCache.file_signature(self.data_root / "sales.csv")
+
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            rows, total, names = executor.submit(
+                _attach_in_child, str(self.tmp_dir / "shared"), key, signature).result()
+        self.assertEqual((rows, total), (1000, float(np.arange(1000).sum())))
+        self.assertEqual(names[:2], ["比亚迪", "特斯拉"])
+        self.assertTrue(pd.isna(names[2]))
+
+        again = SharedDatasetStore(str(self.tmp_dir / "shared")).attach(key, signature)
+        self.assertEqual(len(again), 1000)
+
+    def test_republish_after_segment_removed(self):
+        """共享内存段被删除后（如 /dev/shm 被清空），再次发布时重新创建共享内存段"""
+        df = pd.read_csv(self.data_root / "sales.csv")
+        signature = IngestCache.file_signature(self.data_root / "sales.csv")
+        self.assertTrue(self.store.publish("sales", df, signature))
+        self.assertFalse(self.store.publish("sales", df, signature))
+
+        segment = self.store._read_registry("sales")["segment"]
+        self.store._unlink(segment)
+        self.assertFalse(SharedDatasetStore._segment_exists(segment))
+        self.assertTrue(self.store.publish("sales", df, signature))
+        self.assertTrue(SharedDatasetStore._segment_exists(segment))
+        self.assertEqual(SharedDatasetStore(str(self.tmp_dir / "shared")).attach("sales", signature)["销量"].sum(),
+                         df["销量"].sum())
+
+    def test_owner_release_removes_segments(self):
+        """所有者释放时删除全部共享内存段；所有者进程已退出时由新进程接管"""
+        import subprocess
+
+        exited = subprocess.Popen([sys.executable, "-c", "pass"])
+        exited.wait()
+        (self.tmp_dir / "shared").mkdir(exist_ok=True)
+        (self.tmp_dir / "shared" / "owner.pid").write_text(str(exited.pid), encoding="utf-8")
+        self.assertTrue(self.store.claim_ownership())
+        self.assertTrue(SharedDatasetStore(str(self.tmp_dir / "shared")).claim_ownership())
+
+        df = pd.read_csv(self.data_root / "sales.csv")
+        self.store.publish("sales", df, IngestCache.file_signature(self.data_root / "sales.csv"))
+        segment = self.store._read_registry("sales")["segment"]
+        self.store.release()
+        self.assertFalse(SharedDatasetStore._segment_exists(segment))
+        self.assertEqual(list((self.tmp_dir / "shared").iterdir()), [])
+
+    def test_round_trip_preserves_dtypes(self):
+        """加载器可能产生的各种类型经共享内存连接后类型和取值不变"""
+        df = pd.DataFrame({
+            "int64": [1, 2, 3],
+            "int8": pd.Series([1, 2, 3], dtype="int8"),
+            "float32": pd.Series([1.5, np.nan, 2.0], dtype="float32"),
+            "bool": [True, False, True],
+            "datetime": pd.to_datetime(["2021-01-01", None, "2022-03-04"]),
+            "datetime_tz": pd.to_datetime(["2021-01-01 08:00", None, "2022-03-04 00:00"]).tz_localize("Asia/Shanghai"),
+            "timedelta": pd.to_timedelta([1, 2, None], unit="D"),
+            "str": pd.Series(["比亚迪", None, "特斯拉"], dtype="str"),
+            "string": pd.Series(["a", None, "b"], dtype="string"),
+            "object": pd.Series(["a", None, "b"], dtype=object),
+            "category": pd.Series(["x", "y", "x"], dtype="category"),
+            "int_category": pd.Series([2018, 2019, 2018], dtype="category"),
+            "Int64": pd.Series([1, None, 3], dtype="Int64"),
+            "Float64": pd.Series([1.5, None, 3.0], dtype="Float64"),
+            "boolean": pd.Series([True, None, False], dtype="boolean"),
+        })
+        signature = {"size": 1, "mtime_ns": 1}
+        self.assertTrue(self.store.publish("dtypes", df, signature))
+        attached = SharedDatasetStore(str(self.tmp_dir / "shared")).attach("dtypes", signature)
+        self.assertEqual(attached.dtypes.map(str).tolist(), df.dtypes.map(str).tolist())
+        self.assertTrue(attached.equals(df))
+
+    def test_unreadable_owner_not_taken_over(self):
+        """所有者文件内容为空（写入未完成）时视为所有者仍在运行，不接管"""
+        owner_file = self.tmp_dir / "shared" / "owner.pid"
+        owner_file.parent.mkdir(exist_ok=True)
+        owner_file.write_text("", encoding="utf-8")
+        with mock.patch.object(shared_store, "OWNER_RETRY_DELAY", 0):
+            self.assertFalse(self.store.claim_ownership())
+        self.assertEqual(owner_file.read_text(encoding="utf-8"), "")
+        self.assertEqual(sorted(path.name for path in (self.tmp_dir / "shared").iterdir()), ["owner.pid"])
+        self.assertFalse(self.store.owner)
+
+    def test_source_change_not_attached(self):
+        """源文件变化后不再使用过期的共享数据"""
+        self.make_loader(cache_dir=None, shared_store=self.store).load_data("sales.csv")
+        path = self.data_root / "sales.csv"
+        path.write_text("厂商,年份,销量\n蔚来,2022,1\n", encoding="utf-8")
+        df = self.make_loader(cache_dir=None, shared_store=SharedDatasetStore(
+            str(self.tmp_dir / "shared"))).load_data("sales.csv")
+        self.assertEqual(len(df), 1)
+
+
+class TestColumnStore(LoaderTestCase):
+    """测试内存映射列存储"""
+
+    def setUp(self):
+        super().setUp()
+        rng = np.random.default_rng(1)
+        rows = 300
+        wide = pd.DataFrame({f"指标{i}": rng.normal(size=rows) for i in range(50)})
+        wide.insert(0, "证券简称", np.tile(["比亚迪", "长安汽车", "上汽集团"], rows // 3))
+        wide.insert(1, "会计年度", np.repeat(np.arange(2000, 2100), 3))
+        wide.to_csv(self.data_root / "indicators.csv", index=False)
+        self.wide = wide
+        mapping = dict(MAPPING, company_indicators={"actual_file": "indicators.csv", "storage": "mmap"})
+        with open(self.mapping_path, "w", encoding="utf-8") as f:
+            yaml.safe_dump(mapping, f, allow_unicode=True)
+
+    def test_select_reads_only_requested_columns(self):
+        """按列和行读取，结果与完整加载一致，且只打开所需列的文件"""
+        loader = self.make_loader()
+        opened = []
+        original_load = np.load
+
+        def recording_load(path, *args, **kwargs):
+            opened.append(Path(path).name)
+            return original_load(path, *args, **kwargs)
+
+        loader.select("company_indicators", ["会计年度"])
+        with mock.patch("src.tools.column_store.np.load", recording_load):
+            df = loader.select("company_indicators", ["证券简称", "指标7"], rows=[3, 4, 5])
+        expected = self.wide.loc[[3, 4, 5], ["证券简称", "指标7"]]
+        pd.testing.assert_frame_equal(df, expected, check_index_type=False)
+        self.assertEqual(len(opened), 4)
+
+    def test_full_load_not_cached(self):
+        """未指定列的加载和数据摘要从列存储读取，整表不写入内存缓存"""
+        loader = self.make_loader()
+        df = loader.load_data("company_indicators")
+        pd.testing.assert_frame_equal(df, self.wide, check_index_type=False)
+        summary = simple_data_query.DataQuery(loader).get_data_summary("company_indicators")
+        self.assertEqual(summary["data_shape"], self.wide.shape)
+        self.assertEqual(len(loader.data_cache), 0)
+        self.assertEqual(loader.data_cache.current_bytes, 0)
+
+    def test_query_data_uses_column_store(self):
+        """query_data 先按过滤列确定行，再读取输出列"""
+        query = DataQuery(self.make_loader())
+        result = query.query_data("company_indicators",
+                                  filters={"证券简称": "比亚迪", "会计年度": {"gte": 2090}},
+                                  columns=["会计年度", "指标3"])
+        expected = self.wide[(self.wide["证券简称"] == "比亚迪") & (self.wide["会计年度"] >= 2090)]
+        self.assertEqual(result["会计年度"].tolist(), expected["会计年度"].tolist())
+        np.testing.assert_allclose(result["指标3"], expected["指标3"])
+
+        with self.assert_no_source_parse():
+            df = self.make_loader().load_data("company_indicators", columns=["指标49"])
+        np.testing.assert_allclose(df["指标49"], self.wide["指标49"])
+
+
+class TestPartitionedStore(LoaderTestCase):
+    """测试按年份和公司代码分区的存储"""
+
+    def setUp(self):
+        super().setUp()
+        years = np.arange(2006, 2023)
+        codes = np.arange(1, 31)
+        panel = pd.DataFrame({
+            "证券代码": np.repeat([f"{code:06d}" for code in codes], len(years)),
+            "会计年度": np.tile(years, len(codes)),
+        })
+        panel["营业收入"] = np.arange(len(panel)) * 10.0
+        panel.to_csv(self.data_root / "panel.csv", index=False)
+        self.panel = pd.read_csv(self.data_root / "panel.csv")
+        mapping = dict(MAPPING, company_panel={
+            "actual_file": "panel.csv",
+            "storage": "partitioned",
+            "partition": {"year_col": "会计年度", "code_col": "证券代码", "buckets": 4}
+        })
+        with open(self.mapping_path, "w", encoding="utf-8") as f:
+            yaml.safe_dump(mapping, f, allow_unicode=True)
+
+    def record_reads(self):
+        opened = []
+        original = pd.read_parquet
+
+        def recording_read(path, *args, **kwargs):
+            if Path(path).parent.name.startswith("year="):
+                opened.append(f"{Path(path).parent.name}/{Path(path).name}")
+            return original(path, *args, **kwargs)
+
+        return opened, mock.patch("src.tools.partitioned_store.pd.read_parquet", recording_read)
+
+    def test_query_data_prunes_partitions(self):
+        """按年份和公司代码过滤时只读取相关分区，结果与全量过滤一致"""
+        query = DataQuery(self.make_loader())
+        query.query_data("company_panel", limit=1)
+        opened, patch = self.record_reads()
+        with patch:
+            result = query.query_data("company_panel",
+                                      filters={"证券代码": 3, "会计年度": {"gte": 2020}},
+                                      columns=["会计年度", "营业收入"])
+        expected = self.panel[(self.panel["证券代码"] == 3) & (self.panel["会计年度"] >= 2020)]
+        self.assertEqual(result.index.tolist(), expected.index.tolist())
+        self.assertEqual(result["营业收入"].tolist(), expected["营业收入"].tolist())
+        self.assertEqual(len(opened), 3)
+
+    def test_time_series_reads_year_range(self):
+        """时间列为分区年份列时只读取时间范围内的分区，只解析扫描到的行"""
+        query = DataQuery(self.make_loader())
+        opened, patch = self.record_reads()
+        with patch, mock.patch.object(MappedDataLoader, "get_datetime_column", side_effect=AssertionError):
+            result = query.get_time_series_data("company_panel", "会计年度", ["营业收入"],
+                                                start_date="2018", end_date="2019")
+        self.assertEqual(len(result), 60)
+        self.assertEqual(sorted(result["会计年度"].dt.year.unique().tolist()), [2018, 2019])
+        self.assertTrue(opened)
+        self.assertTrue(all(path.startswith(("year=2018/", "year=2019/")) for path in opened))
+
+    def test_repeated_scan_served_from_memory(self):
+        """相同分区集合的重复查询读取内存缓存，并使用二级索引筛选"""
+        query = DataQuery(self.make_loader())
+        filters = {"证券代码": 3, "会计年度": {"gte": 2020}}
+        first = query.query_data("company_panel", filters=filters, columns=["会计年度", "营业收入"])
+        opened, patch = self.record_reads()
+        with patch, mock.patch.object(secondary_index, "build_index", wraps=secondary_index.build_index) as build:
+            for _ in range(3):
+                result = query.query_data("company_panel", filters=filters, columns=["会计年度", "营业收入"])
+        self.assertEqual(opened, [])
+        self.assertTrue(build.called)
+        pd.testing.assert_frame_equal(result, first)
+
+    def test_missing_partition_columns_fall_back_once(self):
+        """表头缺少声明的分区列时回退为整表加载，并记录到清单，不再重复摄取"""
+        mapping = dict(MAPPING, company_panel={
+            "actual_file": "panel.csv",
+            "storage": "partitioned",
+            "partition": {"year_col": "年度", "code_col": "证券代码"}
+        })
+        with open(self.mapping_path, "w", encoding="utf-8") as f:
+            yaml.safe_dump(mapping, f, allow_unicode=True)
+        with self.assertLogs("src.tools.mapped_data_loader", level="ERROR"):
+            df = self.make_loader().scan("company_panel", ["营业收入"])
+        self.assertEqual(len(df), len(self.panel))
+        loader = self.make_loader()
+        with mock.patch.object(MappedDataLoader, "_ingest", side_effect=AssertionError), \
+                mock.patch.object(loader.partition_store, "build", side_effect=AssertionError):
+            self.assertIsNone(loader._partition_meta(
+                self.data_root / "panel.csv", "company_panel", "panel.csv"))
+
+
+@unittest.skipIf(duckdb is None, "未安装duckdb")
+class TestSQLEngine(LoaderTestCase):
+    """测试基于列式缓存的SQL查询"""
+
+    def test_join_window_and_group_by(self):
+        """逻辑名作为视图使用，映射声明的列限定视图的列"""
+        query = DataQuery(self.make_loader())
+        self.assertEqual(query.sql("SELECT * FROM macro_economic_data").columns.tolist(), ["季度", "国内生产总值"])
+
+        result = query.sql("""
+            SELECT m.季度, g.第一产业增加值,
+                   m.国内生产总值 - LAG(m.国内生产总值) OVER (ORDER BY m.季度) AS 增量
+            FROM macro_economic_data m JOIN "宏观经济数据.csv" g ON m.季度 = g.季度
+            ORDER BY m.季度
+        """)
+        expected = pd.read_csv(io.StringIO(GDP_CSV))
+        self.assertEqual(result["第一产业增加值"].tolist(), expected["第一产业增加值"].tolist())
+        self.assertEqual(result["增量"].tolist()[1:], expected["国内生产总值"].diff().tolist()[1:])
+
+        grouped = query.sql("SELECT COUNT(*) AS n, SUM(国内生产总值) AS total FROM macro_economic_data "
+                            "WHERE 国内生产总值 > ?", [280000])
+        self.assertEqual(grouped.iloc[0].tolist(), [3, 292464 + 307627 + 335508])
+
+    def test_view_follows_appends(self):
+        """源文件追加新行后视图包含新增的行"""
+        loader = self.make_loader()
+        query = simple_data_query.DataQuery(loader)
+        self.assertEqual(query.sql('SELECT COUNT(*) AS n FROM "宏观经济数据.csv"')["n"].iloc[0], 4)
+        with open(self.data_root / "gdp.csv", "a", encoding="utf-8") as f:
+            f.write("2023年第1季度,284997,11575,107947,165475\n")
+        with self.assert_no_source_parse():
+            self.assertEqual(query.sql('SELECT COUNT(*) AS n FROM "宏观经济数据.csv"')["n"].iloc[0], 5)
+
+
+class TestSecondaryIndex(LoaderTestCase):
+    """测试 query_data 使用的二级索引"""
+
+    def setUp(self):
+        super().setUp()
+        rng = np.random.default_rng(7)
+        rows = 2000
+        sales = pd.DataFrame({
+            "厂商": rng.choice(["比亚迪", "特斯拉", "蔚来", "理想", "小鹏"], rows),
+            "日期": pd.date_range("2018-12-01", periods=rows, freq="D").strftime("%Y-%m-%d"),
+            "销量": rng.integers(0, 1000, rows).astype(float),
+        })
+        sales.loc[rng.choice(rows, 50, replace=False), "销量"] = np.nan
+        sales.to_csv(self.data_root / "sales.csv", index=False)
+        self.sales = pd.read_csv(self.data_root / "sales.csv")
+        mapping = dict(MAPPING, production_sales={"actual_file": "sales.csv", "indexes": ["厂商"]})
+        with open(self.mapping_path, "w", encoding="utf-8") as f:
+            yaml.safe_dump(mapping, f, allow_unicode=True)
+
+    def test_results_match_scan(self):
+        """使用索引的结果与逐行过滤一致"""
+        query = DataQuery(self.make_loader())
+        cases = [
+            {"厂商": "比亚迪"},
+            {"厂商": {"in": ["蔚来", "小鹏", "不存在"]}, "日期": {"gte": "2020-01-01"}},
+            {"日期": {"lt": "2019-03-01"}, "销量": {"gt": 500}},
+            {"销量": {"lte": 10.0}, "厂商": {"eq": "理想"}},
+            {"销量": {"eq": np.nan}},
+            {"销量": {"ne": 3}},
+        ]
+        for _ in range(2):
+            for filters in cases:
+                result = query.query_data("production_sales", filters=filters)
+                expected = apply_filters(self.sales, filters)
+                pd.testing.assert_frame_equal(result, expected)
+
+    def test_index_built_once(self):
+        """声明的列首次过滤即建立索引，其他列多次过滤后建立，之后复用"""
+        query = DataQuery(self.make_loader())
+        with mock.patch.object(secondary_index, "build_index", wraps=secondary_index.build_index) as build:
+            query.query_data("production_sales", filters={"厂商": "特斯拉"})
+            self.assertEqual([call.args[0].name for call in build.call_args_list], ["厂商"])
+            for _ in range(3):
+                query.query_data("production_sales", filters={"厂商": "特斯拉", "销量": {"gte": 900}})
+        self.assertEqual([call.args[0].name for call in build.call_args_list], ["厂商", "销量"])
+
+
+class TestFilterCompiler(LoaderTestCase):
+    """测试过滤条件编译"""
+
+    def test_all_operators_and_groups(self):
+        """同一列的多个运算符同时生效，支持 $and/$or 嵌套"""
+        gdp = pd.read_csv(io.StringIO(GDP_CSV))
+        filters = {
+            "国内生产总值": {"gte": 280000, "lte": 320000},
+            "$or": [{"第一产业增加值": {"lt": 20000}}, {"季度": ["2022年第3季度"]}],
+        }
+        expected = gdp[gdp["国内生产总值"].between(280000, 320000)
+                       & ((gdp["第一产业增加值"] < 20000) | (gdp["季度"] == "2022年第3季度"))]
+        for result in (DataQuery(self.make_loader()).query_data("宏观经济数据.csv", filters=filters),
+                       BasicDataQuery(DataLoader(str(self.data_root))).query_data("gdp.csv", filters=filters)):
+            self.assertEqual(result.index.tolist(), expected.index.tolist())
+        self.assertEqual(expected["季度"].tolist(), ["2022年第2季度", "2022年第3季度"])
+
+    def test_or_branch_with_missing_columns_matches_nothing(self):
+        """$or 中条件列全部不存在的分支不匹配任何行，而不是匹配全部行"""
+        df = pd.DataFrame({"a": [1, 2, 3]})
+        self.assertEqual(apply_filters(df, {"$or": [{"a": 1}, {"missing": 5}]})["a"].tolist(), [1])
+        self.assertTrue(apply_filters(df, {"$or": [{"missing": 5}]}).empty)
+        self.assertEqual(len(apply_filters(df, {"missing": 5})), 3)
+
+    def test_selective_predicate_evaluated_first(self):
+        """AND组先求值选择性最高的条件，其余条件只在保留的行上求值"""
+        df = pd.DataFrame({"省份": ["广东", "江苏", "浙江", "广东"] * 250, "数量": np.arange(1000)})
+        stats = {"columns": {"省份": {"unique_count": 3}, "数量": {"min": 0, "max": 999}}}
+        evaluated = []
+        original = Predicate.evaluate
+
+        def recording(predicate, frame, positions):
+            evaluated.append((predicate.column, predicate.op, len(frame) if positions is None else len(positions)))
+            return original(predicate, frame, positions)
+
+        with mock.patch.object(Predicate, "evaluate", recording):
+            result = compile_filters({"省份": "广东", "数量": {"gte": 900, "ne": 901}}, df.columns, stats).apply(df)
+        self.assertEqual(evaluated[0], ("数量", "gte", 1000))
+        self.assertTrue(all(rows == 100 or rows == 50 for _, _, rows in evaluated[1:]))
+        expected = df[(df["省份"] == "广东") & (df["数量"] >= 900) & (df["数量"] != 901)]
+        pd.testing.assert_frame_equal(result, expected)
+
+
+class TestFinancialRatios(LoaderTestCase):
+    """测试向量化的财务比率计算"""
+
+    def setUp(self):
+        super().setUp()
+        rows = []
+        for code in ["000001", "000002", "000003"]:
+            for year in [2019, 2020, 2021, 2022]:
+                assets = 100.0 * int(code) + year - 2018
+                rows.append([code, year, assets * 0.3, 0.0 if (code, year) == ("000002", 2020) else assets])
+        panel = pd.DataFrame(rows, columns=["证券代码", "会计年度", "净利润", "总资产"])
+        panel.sample(frac=1, random_state=3).to_csv(self.data_root / "finance.csv", index=False)
+        mapping = dict(MAPPING, financial_data={"actual_file": "finance.csv"})
+        with open(self.mapping_path, "w", encoding="utf-8") as f:
+            yaml.safe_dump(mapping, f, allow_unicode=True)
+        self.definitions = {
+            "资产收益率": {"numerator": "净利润", "denominator": "总资产"},
+            "平均资产收益率": {"numerator": "净利润", "denominator": {"column": "总资产", "average": True}},
+            "资产增长率": {"growth": "总资产"},
+            "上年利润占比": {"numerator": {"column": "净利润", "lag": 1}, "denominator": "净利润"},
+        }
+
+    def test_matches_groupby_computation(self):
+        """结果与逐公司按期间计算一致，分母为零和缺少上一期时为NaN"""
+        result = DataQuery(self.make_loader()).compute_financial_ratios(
+            "financial_data", "证券代码", "会计年度", self.definitions)
+        panel = pd.read_csv(self.data_root / "finance.csv").sort_values(["证券代码", "会计年度"])
+        grouped = panel.groupby("证券代码")
+        assets = panel["总资产"].replace(0, np.nan)
+        average = (panel["总资产"] + grouped["总资产"].shift(1)) / 2
+        expected = {
+            "资产收益率": panel["净利润"] / assets,
+            "平均资产收益率": panel["净利润"] / average.replace(0, np.nan),
+            "资产增长率": panel["总资产"] / grouped["总资产"].shift(1).replace(0, np.nan) - 1,
+            "上年利润占比": grouped["净利润"].shift(1) / panel["净利润"].replace(0, np.nan),
+        }
+        self.assertEqual(result["会计年度"].tolist(), panel["会计年度"].tolist())
+        for name, values in expected.items():
+            np.testing.assert_allclose(result[name].to_numpy(), values.to_numpy(), err_msg=name)
+        self.assertTrue(np.isnan(result.loc[(result["证券代码"] == 2) & (result["会计年度"] == 2020), "资产收益率"]).all())
+        self.assertEqual(int(result["资产增长率"].isna().sum()), 3 + 1)
+
+    def test_lag_follows_period_value(self):
+        """滞后按期间取值对齐，缺少上一年或同一年有多行时为NaN，不取相邻行"""
+        panel = pd.DataFrame({
+            "证券代码": ["000001"] * 3 + ["000002"] * 3,
+            "会计年度": [2018, 2019, 2021, 2019, 2019, 2020],
+            "总资产": [100.0, 110.0, 200.0, 50.0, 60.0, 70.0],
+        })
+        result = ratio_engine.compute_ratios(panel, "证券代码", "会计年度", {
+            "资产增长率": {"growth": "总资产"},
+            "两年增长率": {"growth": "总资产", "periods": 2},
+            "平均资产": {"numerator": {"column": "总资产", "average": True}, "denominator": "总资产"},
+        })
+        first = result[result["证券代码"] == "000001"].set_index("会计年度")
+        self.assertAlmostEqual(first.loc[2019, "资产增长率"], 0.1)
+        self.assertTrue(np.isnan(first.loc[2021, "资产增长率"]))
+        self.assertTrue(np.isnan(first.loc[2021, "平均资产"]))
+        self.assertAlmostEqual(first.loc[2021, "两年增长率"], 200.0 / 110.0 - 1)
+        self.assertTrue(result.loc[result["证券代码"] == "000002", "资产增长率"].isna().all())
+
+    def test_cached_until_source_changes(self):
+        """相同定义再次计算时读取缓存，源文件追加新行后重新计算"""
+        loader = self.make_loader()
+        first = loader.financial_ratios("financial_data", "证券代码", "会计年度", self.definitions)
+        with mock.patch.object(ratio_engine.PanelColumns, "values", side_effect=AssertionError):
+            cached = self.make_loader().financial_ratios("financial_data", "证券代码", "会计年度", self.definitions)
+        pd.testing.assert_frame_equal(cached, first)
+
+        with open(self.data_root / "finance.csv", "a", encoding="utf-8") as f:
+            f.write("000001,2023,99.0,330.0\n")
+        updated = loader.financial_ratios("financial_data", "证券代码", "会计年度", self.definitions)
+        self.assertEqual(len(updated), len(first) + 1)
+        self.assertAlmostEqual(updated.loc[updated["会计年度"] == 2023, "资产增长率"].iloc[0], 330.0 / 104.0 - 1)
+
+
+class TestRollupCubes(LoaderTestCase):
+    """测试汇总立方体"""
+
+    FUNCS = ["sum", "mean", "count", "min", "max", "std"]
+
+    def setUp(self):
+        super().setUp()
+        rng = np.random.default_rng(11)
+        rows = 600
+        sales = pd.DataFrame({
+            "厂商": rng.choice(["比亚迪", "特斯拉", "蔚来"], rows),
+            "省份": rng.choice(["广东", "江苏", "浙江", "上海"], rows),
+            "年份": rng.choice([2020, 2021, 2022], rows),
+            "销量": rng.integers(0, 1000, rows).astype(float),
+        })
+        sales.loc[::9, "销量"] = np.nan
+        sales.to_csv(self.data_root / "sales.csv", index=False)
+        mapping = dict(MAPPING, production_sales={
+            "actual_file": "sales.csv",
+            "rollups": [{"dimensions": ["厂商", "省份", "年份"], "measures": ["销量"]}]
+        })
+        with open(self.mapping_path, "w", encoding="utf-8") as f:
+            yaml.safe_dump(mapping, f, allow_unicode=True)
+
+    def raw_aggregate(self, group_cols):
+        df = pd.read_csv(self.data_root / "sales.csv")
+        result = df.groupby(group_cols).agg({"销量": self.FUNCS}).reset_index()
+        result.columns = ["_".join(col).strip("_") for col in result.columns.values]
+        return result
+
+    def test_coarser_groupings_from_cube(self):
+        """较粗的分组由立方体再汇总，结果与原始数据聚合一致，不再读取原始数据"""
+        loader = self.make_loader()
+        query = DataQuery(loader)
+        for group_cols in (["厂商", "省份", "年份"], ["年份", "厂商"], ["省份"]):
+            result = query.aggregate_by_period("production_sales", group_cols, ["销量"], self.FUNCS)
+            pd.testing.assert_frame_equal(result, self.raw_aggregate(group_cols), check_dtype=False, rtol=1e-9)
+
+        with mock.patch.object(MappedDataLoader, "load_data", side_effect=AssertionError("不应读取原始数据")):
+            DataQuery(self.make_loader()).aggregate_by_period("production_sales", ["厂商"], ["销量"], ["sum"])
+            # 立方体不支持的聚合函数回退到原始数据
+            with self.assertRaises(AssertionError):
+                query.aggregate_by_period("production_sales", ["厂商"], ["销量"], ["median"])
+
+    def test_appended_rows_update_cube(self):
+        """源文件追加新行后立方体只累计新增的行"""
+        query = DataQuery(self.make_loader())
+        query.aggregate_by_period("production_sales", ["厂商"], ["销量"], self.FUNCS)
+        with open(self.data_root / "sales.csv", "a", encoding="utf-8") as f:
+            f.write("理想,北京,2023,500.0\n比亚迪,广东,2023,\n")
+
+        with mock.patch.object(RollupCube, "update", side_effect=RollupCube.update, autospec=True) as update:
+            self.assertIsNotNone(query.data_loader.refresh_dataset("production_sales"))
+            result = query.aggregate_by_period("production_sales", ["年份", "厂商"], ["销量"], self.FUNCS)
+        self.assertEqual([len(call.args[1]) for call in update.call_args_list], [2])
+        pd.testing.assert_frame_equal(result, self.raw_aggregate(["年份", "厂商"]), check_dtype=False, rtol=1e-9)
+
+        # 持久化的立方体在新的加载器中按追加的行追上最新版本
+        with open(self.data_root / "sales.csv", "a", encoding="utf-8") as f:
+            f.write("蔚来,上海,2023,120.0\n")
+        with mock.patch.object(RollupCube, "update", side_effect=RollupCube.update, autospec=True) as update:
+            result = DataQuery(self.make_loader()).aggregate_by_period(
+                "production_sales", ["省份"], ["销量"], self.FUNCS)
+        self.assertEqual([len(call.args[1]) for call in update.call_args_list], [1])
+        pd.testing.assert_frame_equal(result, self.raw_aggregate(["省份"]), check_dtype=False, rtol=1e-9)
+
+
+class TestTimeSortedView(LoaderTestCase):
+    """测试按时间排序的时间序列范围读取"""
+
+    def setUp(self):
+        super().setUp()
+        rng = np.random.default_rng(5)
+        rows = 500
+        series = pd.DataFrame({
+            "日期": pd.date_range("2020-01-01", periods=rows, freq="D").strftime("%Y-%m-%d"),
+            "销量": rng.integers(0, 1000, rows).astype(float),
+        }).sample(frac=1, random_state=5)
+        series.loc[series.index[:5], "日期"] = np.nan
+        series.to_csv(self.data_root / "daily.csv", index=False)
+        mapping = dict(MAPPING, daily_sales={"actual_file": "daily.csv"})
+        with open(self.mapping_path, "w", encoding="utf-8") as f:
+            yaml.safe_dump(mapping, f, allow_unicode=True)
+
+    def expected(self, start=None, end=None):
+        df = pd.read_csv(self.data_root / "daily.csv")
+        df["日期"] = pd.to_datetime(df["日期"], format="%Y-%m-%d", errors="coerce")
+        if start:
+            df = df[df["日期"] >= pd.Timestamp(start)]
+        if end:
+            df = df[df["日期"] <= pd.Timestamp(end)]
+        return df.sort_values("日期", kind="stable")[["日期", "销量"]]
+
+    def test_ranges_match_mask_and_sort(self):
+        """二分查找切片的结果与逐行比较并排序一致，时间列只排序一次"""
+        loader = self.make_loader()
+        query = DataQuery(loader)
+        query.get_time_series_data("daily_sales", "日期", ["销量"])
+        cases = [(None, None), ("2020-03-01", None), (None, "2020-02-15"),
+                 ("2020-06-01", "2020-06-30"), ("2021-01-01", "2020-12-01"), ("2030-01-01", None)]
+        with mock.patch.object(pd.DataFrame, "sort_values", side_effect=AssertionError("不应重新排序")), \
+                mock.patch("src.tools.time_columns.np.argsort", side_effect=AssertionError("不应重新排序")):
+            results = [query.get_time_series_data("daily_sales", "日期", ["销量"], start_date=start, end_date=end)
+                       for start, end in cases]
+        for (start, end), result in zip(cases, results):
+            expected = self.expected(start, end)
+            self.assertEqual(result.index.tolist(), expected.index.tolist())
+            self.assertEqual(result["销量"].tolist(), expected["销量"].tolist())
+        self.assertEqual(len(query.get_time_series_data("daily_sales", "日期", ["销量"])), 500)
+
+    def test_view_keeps_no_sorted_copy(self):
+        """视图只保存行位置和排序后的时间，切片时从缓存数据中取行"""
+        loader = self.make_loader()
+        view = loader.time_view("daily_sales", "日期")
+        self.assertIs(view.source, loader.load_data("daily_sales"))
+        self.assertEqual(view.nbytes, 500 * 16)
+        result = view.slice("2020-06-01", "2020-06-30", ["销量"])
+        self.assertEqual(result.columns.tolist(), ["日期", "销量"])
+        self.assertEqual(result.index.tolist(), self.expected("2020-06-01", "2020-06-30").index.tolist())
+
+    def test_view_rebuilt_after_append(self):
+        """源文件追加新行后视图包含新增的行"""
+        loader = self.make_loader()
+        query = DataQuery(loader)
+        self.assertEqual(len(query.get_time_series_data("daily_sales", "日期", ["销量"], start_date="2021-06-01")), 0)
+        with open(self.data_root / "daily.csv", "a", encoding="utf-8") as f:
+            f.write("2021-06-20,7.0\n")
+        loader.refresh_dataset("daily_sales")
+        result = query.get_time_series_data("daily_sales", "日期", ["销量"], start_date="2021-06-01")
+        self.assertEqual(result["销量"].tolist(), [7.0])
+
+
+class TestFrequencyAlignment(LoaderTestCase):
+    """测试不同频率序列的对齐"""
+
+    def setUp(self):
+        super().setUp()
+        months = pd.period_range("2022-01", "2022-12", freq="M")
+        cpi = pd.DataFrame({"统计期间": months.strftime("%Y-%m"), "数据频率": "M",
+                            "CPI当月同比": np.arange(1.0, 13.0)})
+        quarterly = pd.DataFrame({"统计期间": ["2022-03", "2022-06"], "数据频率": "Q", "CPI当月同比": [99.0, 99.0]})
+        pd.concat([cpi, quarterly]).to_csv(self.data_root / "cpi.csv", index=False)
+        mapping = dict(MAPPING, cpi_data={"actual_file": "cpi.csv"})
+        with open(self.mapping_path, "w", encoding="utf-8") as f:
+            yaml.safe_dump(mapping, f, allow_unicode=True)
+        self.series = [
+            {"file": "macro_economic_data", "time_col": "季度", "value_col": "国内生产总值", "how": "sum"},
+            {"file": "cpi_data", "time_col": "统计期间", "value_col": "CPI当月同比", "how": "mean",
+             "filters": {"数据频率": "M"}},
+        ]
+
+    def test_resample_allocate_and_asof(self):
+        """月度序列降频取均值，季度流量升频平均分摊，asof只使用期末已可得的观测"""
+        query = simple_data_query.DataQuery(self.make_loader())
+        gdp = [270178.0, 292464.0, 307627.0, 335508.0]
+
+        quarterly = query.align_series(self.series, target_freq="Q")
+        self.assertEqual(quarterly.index.astype(str).tolist(), ["2022Q1", "2022Q2", "2022Q3", "2022Q4"])
+        self.assertEqual(quarterly["国内生产总值"].tolist(), gdp)
+        self.assertEqual(quarterly["CPI当月同比"].tolist(), [2.0, 5.0, 8.0, 11.0])
+
+        monthly = query.align_series(self.series, target_freq="M", end="2023-02-01")
+        self.assertEqual(len(monthly), 14)
+        np.testing.assert_allclose(monthly["国内生产总值"].iloc[:12], np.repeat(gdp, 3) / 3)
+        self.assertTrue(monthly["国内生产总值"].iloc[12:].isna().all())
+        self.assertEqual(monthly["CPI当月同比"].iloc[:12].tolist(), list(np.arange(1.0, 13.0)))
+
+        asof = query.align_series([dict(self.series[0], how="asof", name="GDP")], target_freq="M",
+                                  start="2022-01-01", end="2023-02-01")
+        # 季度值在季末月份才可得，之后沿用到下一个季末
+        np.testing.assert_array_equal(asof["GDP"].to_numpy(), [np.nan, np.nan] + list(np.repeat(gdp, 3)))
+
+    def test_panel_cached_until_append(self):
+        """同一序列组合和目标频率的面板直接复用，源文件追加新行后重新对齐"""
+        loader = self.make_loader()
+        query = DataQuery(loader)
+        first = query.align_series(self.series, target_freq="Q")
+        with mock.patch.object(MappedDataLoader, "load_data", side_effect=AssertionError("不应重新加载")):
+            pd.testing.assert_frame_equal(query.align_series(self.series, target_freq="Q"), first)
+
+        with open(self.data_root / "cpi.csv", "a", encoding="utf-8") as f:
+            f.write("2023-01,M,20.0\n")
+        updated = query.align_series(self.series, target_freq="Q")
+        self.assertEqual(updated["CPI当月同比"].iloc[-1], 20.0)
+        self.assertTrue(np.isnan(updated["国内生产总值"].iloc[-1]))
+
+
+class TestEntityIndex(LoaderTestCase):
+    """测试按证券代码跨文件连接的实体索引"""
+
+    def setUp(self):
+        super().setUp()
+        pd.DataFrame({"证券代码": ["000001", "600104", "002594"], "证券简称": ["平安银行", "上汽集团", "比亚迪"],
+                      "公司全称": ["平安银行股份有限公司", "上海汽车集团股份有限公司", "比亚迪股份有限公司"],
+                      "省份": ["广东", "上海", "广东"]}).to_csv(self.data_root / "basic.csv", index=False)
+        pd.DataFrame({"证券代码": [2594, 600104, 2594, 600104, 300750],
+                      "会计年度": [2021, 2021, 2022, 2022, 2022],
+                      "营业收入": [2161.4, 7599.2, 4240.6, 7209.9, 3286.0]}).to_csv(self.data_root / "summary.csv",
+                                                                                   index=False)
+        pd.DataFrame({"证券代码": ["002594", "600104", "002594"], "会计年度": [2022, 2022, 2021],
+                      "研发投入": [202.2, 183.7, 106.3]}).to_csv(self.data_root / "rd.csv", index=False)
+        mapping = dict(MAPPING,
+                       company_basic={"actual_file": "basic.csv",
+                                      "entity": {"short_name_col": "证券简称", "full_name_col": "公司全称"}},
+                       company_summary={"actual_file": "summary.csv"},
+                       company_rd={"actual_file": "rd.csv"})
+        with open(self.mapping_path, "w", encoding="utf-8") as f:
+            yaml.safe_dump(mapping, f, allow_unicode=True)
+
+    def test_join_by_code_and_period(self):
+        """数值代码与带前导零的代码视为同一实体，按代码或代码和年度连接，没有匹配时为缺失值"""
+        query = DataQuery(self.make_loader())
+        joined = query.join_companies("company_summary", {"company_basic": ["证券简称", "省份"],
+                                                          "company_rd": ["研发投入"]}, period_col="会计年度")
+        self.assertEqual(joined["证券简称"].tolist()[:4], ["比亚迪", "上汽集团", "比亚迪", "上汽集团"])
+        self.assertTrue(pd.isna(joined["证券简称"].iloc[4]))
+        np.testing.assert_array_equal(joined["研发投入"].to_numpy(), [106.3, np.nan, 202.2, 183.7, np.nan])
+        self.assertEqual(joined["营业收入"].tolist(), [2161.4, 7599.2, 4240.6, 7209.9, 3286.0])
+
+        simple = simple_data_query.DataQuery(self.make_loader()).join_companies(
+            "company_summary", {"company_basic": ["省份"]})
+        self.assertEqual(simple["省份"].tolist()[:4], ["广东", "上海", "广东", "上海"])
+
+        index = query.data_loader.entity_index
+        self.assertEqual(index.rows("company_summary", ["比亚迪"]).tolist(), [0, 2])
+        self.assertEqual(index.rows("company_summary", ["上海汽车集团股份有限公司", "300750"]).tolist(), [1, 3, 4])
+
+    def test_positions_persisted_until_append(self):
+        """实体行位置持久化后不再读取源数据，源文件追加新行后重新计算"""
+        DataQuery(self.make_loader()).join_companies("company_summary", {"company_basic": ["证券简称"]})
+        loader = self.make_loader()
+        loader.entity_index.dictionary()
+        with mock.patch.object(MappedDataLoader, "load_data", side_effect=AssertionError("不应重新加载")):
+            positions = loader.entity_index.positions("company_summary")
+        self.assertEqual(len(positions.ids), 5)
+        self.assertEqual(loader.entity_index.dictionary().resolve("比亚迪"), loader.entity_index.dictionary().resolve(2594))
+
+        with open(self.data_root / "summary.csv", "a", encoding="utf-8") as f:
+            f.write("000001,2022,1799.0\n")
+        joined = loader.entity_index.join("company_summary", {"company_basic": ["证券简称"]})
+        self.assertEqual(joined["证券简称"].iloc[-1], "平安银行")
+
+
+class TestCorrelationService(LoaderTestCase):
+    """测试共用的相关性矩阵缓存"""
+
+    def setUp(self):
+        super().setUp()
+        rng = np.random.default_rng(7)
+        base = rng.normal(size=200)
+        pd.DataFrame({"月份": np.arange(200), "销量": base, "产量": base * 2 + rng.normal(scale=0.1, size=200),
+                      "价格": -base + rng.normal(scale=0.2, size=200), "噪声": rng.normal(size=200),
+                      "厂商": "比亚迪"}).to_csv(self.data_root / "sales.csv", index=False)
+
+    def test_shared_across_callers_until_append(self):
+        """数据查询、数据分析和热力图共用同一矩阵，源文件追加新行后重新计算"""
+        loader = self.make_loader()
+        query = DataQuery(loader)
+        result = query.get_correlation_matrix("sales.csv")
+        self.assertEqual(list(result["correlation_matrix"]), ["月份", "销量", "产量", "价格", "噪声"])
+
+        analyzer = DataAnalyzer(simple_data_query.DataQuery(loader))
+        charts = ChartGenerator(output_dir=str(self.tmp_dir / "output"), correlation_service=loader.correlations)
+        with mock.patch.object(pd.DataFrame, "corr", side_effect=AssertionError("不应重新计算")):
+            self.assertEqual(query.get_correlation_matrix("sales.csv"), result)
+            strong = analyzer.generate_correlation_matrix("sales.csv")["strong_correlations"]
+            charts.generate_correlation_heatmap("sales.csv", save_path=str(self.tmp_dir / "heatmap.html"))
+        self.assertEqual([(pair["var1"], pair["var2"], pair["strength"]) for pair in strong],
+                         [("销量", "产量", "强正相关"), ("销量", "价格", "强负相关"), ("产量", "价格", "强负相关")])
+
+        spearman = query.get_correlation_matrix("sales.csv", columns=["销量", "价格"], method="spearman")
+        self.assertLess(spearman["correlation_matrix"]["销量"]["价格"], -0.7)
+
+        with open(self.data_root / "sales.csv", "a", encoding="utf-8") as f:
+            f.write("200,100.0,-100.0,0.0,0.0,比亚迪\n")
+        updated = query.get_correlation_matrix("sales.csv")
+        self.assertLess(updated["correlation_matrix"]["销量"]["产量"], 0)
+
+    def test_logical_and_actual_name_share_entry(self):
+        """逻辑名与实际文件名共用同一缓存条目，缓存超出预算时淘汰最久未使用的矩阵"""
+        mapping = dict(MAPPING, sales_data={"actual_file": "sales.csv"})
+        with open(self.mapping_path, "w", encoding="utf-8") as f:
+            yaml.safe_dump(mapping, f, allow_unicode=True)
+        loader = self.make_loader()
+        first = loader.correlations.matrix("sales_data")
+        with mock.patch.object(pd.DataFrame, "corr", side_effect=AssertionError("不应重新计算")):
+            pd.testing.assert_frame_equal(loader.correlations.matrix("sales.csv"), first)
+        self.assertEqual(len(loader.correlations._cache), 1)
+
+        matrix_bytes = int(first.memory_usage(deep=True).sum())
+        loader.correlations._cache.max_bytes = matrix_bytes * 2
+        for method in ("spearman", "kendall"):
+            loader.correlations.matrix("sales.csv", method=method)
+        self.assertEqual(len(loader.correlations._cache), 2)
+        self.assertEqual(len(loader.correlations._versions), 2)
+
+    def test_high_correlations_match_pairwise_scan(self):
+        """上三角掩码筛出的变量对与逐对扫描的结果和顺序一致"""
+        rng = np.random.default_rng(3)
+        corr = pd.DataFrame(rng.normal(size=(100, 12))).cumsum(axis=1).corr()
+        corr.iloc[2, 5] = corr.iloc[5, 2] = np.nan
+        expected = [(corr.columns[i], corr.columns[j], corr.iloc[i, j])
+                    for i in range(len(corr)) for j in range(i + 1, len(corr)) if abs(corr.iloc[i, j]) >= 0.5]
+        pairs = find_high_correlations(corr, 0.5)
+        self.assertEqual([(pair["var1"], pair["var2"], pair["correlation"]) for pair in pairs], expected)
+        self.assertEqual(find_high_correlations(corr.iloc[:1, :1]), [])
+
+
+class TestBlockedCorrelation(LoaderTestCase):
+    """测试分块并行的相关性计算"""
+
+    def setUp(self):
+        super().setUp()
+        rng = np.random.default_rng(11)
+        factors = rng.normal(size=(150, 3))
+        values = factors @ rng.normal(size=(3, 10)) + rng.normal(scale=0.5, size=(150, 10))
+        self.frame = pd.DataFrame(values, columns=[f"指标{i}" for i in range(10)])
+        self.frame.iloc[rng.integers(0, 150, size=40), rng.integers(0, 10, size=40)] = np.nan
+        self.frame.to_csv(self.data_root / "indicators.csv", index=False)
+
+    def test_matches_dataframe_corr(self):
+        """分块结果与 DataFrame.corr 一致，结果为float32"""
+        values = blocked_correlation.prepare_values(self.frame)
+        corr = blocked_correlation.blocked_correlation(values, tile_size=3, workers=2)
+        self.assertEqual(corr.dtype, np.float32)
+        np.testing.assert_allclose(corr, self.frame.corr().to_numpy(), atol=1e-6)
+
+        complete = self.frame.dropna()
+        spearman = blocked_correlation.blocked_correlation(
+            blocked_correlation.prepare_values(complete, "spearman"), tile_size=4)
+        np.testing.assert_allclose(spearman, complete.corr(method="spearman").to_numpy(), atol=1e-6)
+
+        loader = self.make_loader()
+        loader.correlations.blocked_min_columns = 5
+        loader.correlations.tile_size = 4
+        matrix = loader.correlations.matrix("indicators.csv")
+        self.assertTrue((matrix.dtypes == np.float32).all())
+        np.testing.assert_allclose(matrix.to_numpy(), self.frame.corr().to_numpy(), atol=1e-6)
+
+    def test_top_k_without_dense_matrix(self):
+        """top_k 模式为每列保留相关性最强的k个变量，不调用完整矩阵的计算"""
+        expected = self.frame.corr()
+        loader = self.make_loader()
+        loader.correlations.tile_size = 3
+        with mock.patch.object(blocked_correlation, "blocked_correlation",
+                               side_effect=AssertionError("不应生成完整矩阵")):
+            result = DataQuery(loader).get_correlation_matrix("indicators.csv", top_k=3)
+        top = pd.DataFrame(result["top_correlations"])
+        self.assertEqual(len(top), 30)
+        for column, group in top.groupby("var1", sort=False):
+            reference = expected[column].drop(column).abs().sort_values(ascending=False)
+            self.assertEqual(group["var2"].tolist(), reference.index[:3].tolist())
+            np.testing.assert_allclose(group["correlation"], expected.loc[column, group["var2"]], atol=1e-6)
+        pairs = {frozenset((pair["var1"], pair["var2"])) for pair in result["high_correlations"]}
+        self.assertEqual(len(pairs), len(result["high_correlations"]))
+        with self.assertRaises(ValueError):
+            DataQuery(loader).get_correlation_matrix("indicators.csv", top_k=3, method="kendall")
+
+
+class TestDatasetStats(LoaderTestCase):
+    """测试清单中的数据集统计信息"""
+
+    def setUp(self):
+        super().setUp()
+        pd.DataFrame({
+            "省份": ["广东", "江苏", None, "广东", "浙江"] * 20,
+            "充电桩数量": np.arange(100) * 1.5,
+            "年份": np.arange(100) % 4 + 2019,
+        }).to_csv(self.data_root / "charging.csv", index=False)
+
+    def test_info_and_summary_from_manifest(self):
+        """信息和摘要与直接计算一致，且新的加载器不读取数据"""
+        reference = self.make_loader(cache_dir=None)
+        expected_info = reference.get_data_info("charging.csv")
+        with warnings.catch_warnings():
+            # 字符串列按 object/string/category 选取，不依赖pandas将str类型归入object的兼容行为
+            warnings.simplefilter("error", DeprecationWarning)
+            expected_summary = reference.get_data_summary("charging.csv")
+
+        self.make_loader().load_data("charging.csv")
+        with mock.patch.object(MappedDataLoader, "_ingest", side_effect=AssertionError("不应读取数据")):
+            loader = self.make_loader()
+            info = loader.get_data_info("charging.csv")
+            summary = loader.get_data_summary("charging.csv")
+            files = loader.list_available_files()
+
+        self.assertEqual(info["shape"], expected_info["shape"])
+        self.assertEqual(info["null_counts"], expected_info["null_counts"])
+        self.assertEqual(info["memory_usage"], expected_info["memory_usage"])
+        self.assertEqual(info["dtypes"], expected_info["dtypes"])
+        self.assertEqual(summary["categorical_summary"], expected_summary["categorical_summary"])
+        self.assertEqual(list(expected_summary["categorical_summary"]), ["省份"])
+        pd.testing.assert_frame_equal(pd.DataFrame(summary["numeric_summary"]),
+                                      pd.DataFrame(expected_summary["numeric_summary"]))
+        self.assertIn("charging.csv", files["actual_files"])
+
+    def test_projection_and_rebuild_on_change(self):
+        """映射声明的列只返回这些列的信息，源文件变化后重新计算"""
+        loader = self.make_loader()
+        info = loader.get_data_info("macro_economic_data")
+        self.assertEqual(info["columns"], ["季度", "国内生产总值"])
+        self.assertEqual(loader.list_available_files()["mapped_files"]["macro_economic_data"]["rows"], 4)
+
+        (self.data_root / "gdp.csv").write_text(
+            GDP_CSV + "2023年第1季度,284997,11575,107947,165475\n", encoding="utf-8")
+        self.assertEqual(self.make_loader().get_data_info("macro_economic_data")["shape"], (5, 2))
+
+
+class TestIncrementalAppend(LoaderTestCase):
+    """测试源文件追加新行时的增量摄取"""
+
+    NEW_ROW = "2023年第1季度,284997,11575,107947,165475\n"
+
+    def append_row(self):
+        with open(self.data_root / "gdp.csv", "a", encoding="utf-8") as f:
+            f.write(self.NEW_ROW)
+
+    def test_append_parses_only_tail(self):
+        """追加后只解析新增的行，并可查询版本之后的增量"""
+        loader = self.make_loader()
+        loader.load_data("宏观经济数据.csv")
+        version = loader.get_dataset_version("宏观经济数据.csv")
+        self.append_row()
+
+        with self.assert_no_source_parse():
+            second = self.make_loader()
+            df = second.load_data("宏观经济数据.csv")
+            self.assertEqual(len(df), 5)
+            self.assertEqual(df["国内生产总值"].tolist()[-1], 284997)
+            self.assertEqual(second.get_dataset_version("宏观经济数据.csv"), version + 1)
+            changes = second.get_changes_since("宏观经济数据.csv", version, columns=["国内生产总值"])
+        self.assertEqual(changes.index.tolist(), [4])
+        self.assertEqual(changes["国内生产总值"].tolist(), [284997])
+        self.assertTrue(second.get_changes_since("宏观经济数据.csv", version + 1).empty)
+
+    def test_refresh_extends_memory_cache(self):
+        """refresh_dataset 将新增的行拼接到内存缓存并通知回调"""
+        loader = self.make_loader()
+        loader.load_data("宏观经济数据.csv")
+        loader.load_data("macro_economic_data")
+        events = []
+        loader.add_append_listener(lambda name, delta, old, new: events.append((name, len(delta), old, new)))
+        self.append_row()
+
+        with self.assert_no_source_parse():
+            result = loader.refresh_dataset("宏观经济数据.csv")
+            self.assertEqual(result["rows"], 1)
+            self.assertEqual(len(loader.load_data("宏观经济数据.csv")), 5)
+            self.assertEqual(len(loader.load_data("macro_economic_data")), 5)
+        self.assertEqual(events, [("gdp.csv", 1, result["from_version"], result["version"])])
+
+    def test_rewrite_requires_full_reload(self):
+        """源文件内容被修改（非追加）时增量不可用，刷新后全量重新摄取"""
+        loader = self.make_loader()
+        loader.load_data("宏观经济数据.csv")
+        version = loader.get_dataset_version("宏观经济数据.csv")
+        (self.data_root / "gdp.csv").write_text(
+            GDP_CSV.replace("270178", "270000") + self.NEW_ROW, encoding="utf-8")
+
+        self.assertIsNone(loader.get_changes_since("宏观经济数据.csv", version))
+        self.assertIsNone(loader.refresh_dataset("宏观经济数据.csv"))
+        df = loader.load_data("宏观经济数据.csv")
+        self.assertEqual(df["国内生产总值"].tolist()[0], 270000)
+        self.assertEqual(len(df), 5)
+        self.assertGreater(loader.get_dataset_version("宏观经济数据.csv"), version)
+
+
+class TestDataCache(unittest.TestCase):
+    """测试内存预算缓存"""
+
+    @staticmethod
+    def frame(rows: int) -> pd.DataFrame:
+        return pd.DataFrame({"value": np.zeros(rows)})
+
+    def test_lru_eviction_and_pinning(self):
+        """超出预算时淘汰最久未使用且未固定的条目"""
+        entry_size = int(self.frame(1000).memory_usage(deep=True).sum())
+        cache = DataCache(max_bytes=entry_size * 2 + 10)
+        cache.pin("a")
+        cache["a"] = self.frame(1000)
+        cache["b"] = self.frame(1000)
+        cache.get("b")
+        cache["c"] = self.frame(1000)
+
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertIn("c", cache)
+        self.assertIsNone(cache.get("b"))
+
+        stats = cache.stats()
+        self.assertEqual(stats["evictions"], 1)
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertLessEqual(stats["current_bytes"], stats["max_bytes"])
+
+    def test_lfu_keeps_frequent_entries(self):
+        """LFU策略淘汰访问次数最少的条目"""
+        entry_size = int(self.frame(1000).memory_usage(deep=True).sum())
+        cache = DataCache(max_bytes=entry_size * 2 + 10, policy="lfu")
+        cache["a"] = self.frame(1000)
+        cache["b"] = self.frame(1000)
+        for _ in range(3):
+            cache.get("a")
+        cache.get("b")
+        cache["c"] = self.frame(1000)
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+
+
+if __name__ == "__main__":
+    unittest.main()